@@ -0,0 +1,226 @@
+"""
+SnowAtlas.py
+
+Packing the snowflake texture sequence of SnowWorld, snow.1 to snow.N, into
+one atlas image with a UV rectangle per frame, so sprites index a single
+texture instead of cycling through N files. Packed atlases are cached on disk
+by the content hashes of their images; the hash of a file is remembered by
+its path, size and mtime, so an unchanged sequence is never read again.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import numpy as np
+import SnowImage
+
+HASH_INDEX = 'hashes.json'
+SEQUENCE_NAME = re.compile(r'^(.*\.)(\d+)(\.[^.]*)?$')
+
+def sequenceFiles(firstPath, count):
+    '''
+    This function lists the files of a texture sequence named like 'image.n', as SnowWorld expects.
+
+    Args:
+        firstPath: the first file of the sequence, for example '/textures/snow.1.png'
+        count: number of files in the sequence
+
+    Returns:
+        list of file paths
+    '''
+    folder, name = os.path.split(firstPath)
+    match = SEQUENCE_NAME.match(name)
+    if match is None:
+        raise ValueError('%s is not named like image.n' % name)
+    prefix, number, extension = match.groups()
+    start = int(number)
+    return [os.path.join(folder, '%s%d%s' % (prefix, start + i, extension or '')) for i in range(count)]
+
+def toRgba(pixels):
+    ### any image read by SnowImage as 8 bit RGBA
+    if pixels.dtype == np.uint16:
+        pixels = (pixels >> 8).astype(np.uint8)
+    channels = pixels.shape[2]
+    if channels < 3:
+        color = np.repeat(pixels[:, :, :1], 3, axis = 2)
+        alpha = pixels[:, :, 1:] if channels == 2 else np.full(pixels.shape[:2] + (1,), 255, dtype = np.uint8)
+        pixels = np.concatenate([color, alpha], axis = 2)
+    elif channels == 3:
+        pixels = np.concatenate([pixels, np.full(pixels.shape[:2] + (1,), 255, dtype = np.uint8)], axis = 2)
+    return pixels
+
+def packRects(sizes, padding = 2):
+    '''
+    This function places rectangles on shelves, tallest first, in a power of two atlas.
+
+    Args:
+        sizes: (width, height) of every rectangle
+        padding: free pixels around every rectangle
+
+    Returns:
+        ((x, y) of every rectangle, atlas width, atlas height)
+    '''
+    padded = [(w + 2 * padding, h + 2 * padding) for w, h in sizes]
+    area = sum([w * h for w, h in padded])
+    width = 1
+    while width * width < area or width < max([w for w, h in padded]):
+        width *= 2
+
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    for index in sorted(range(len(sizes)), key = lambda i: -padded[i][1]):
+        w, h = padded[index]
+        if x + w > width:
+            x = 0
+            y += shelf
+            shelf = 0
+        positions[index] = (x + padding, y + padding)
+        x += w
+        shelf = max(shelf, h)
+    height = 1
+    while height < y + shelf:
+        height *= 2
+    return positions, width, height
+
+def buildAtlas(paths, padding = 2):
+    '''
+    This function packs images into one RGBA atlas.
+
+    The padding repeats the border pixels of every image, so filtering near the
+    edge of a rectangle does not bleed in its neighbours.
+
+    Args:
+        paths: the image files, one per frame
+        padding: pixels around every image
+
+    Returns:
+        (atlas pixels, list of (x, y, width, height) pixel rects, uv rects of shape (n, 4))
+    '''
+    images = [toRgba(SnowImage.readPng(path)) for path in paths]
+    positions, width, height = packRects([(image.shape[1], image.shape[0]) for image in images], padding)
+    atlas = np.zeros((height, width, 4), dtype = np.uint8)
+    rects = []
+    for image, (x, y) in zip(images, positions):
+        h, w = image.shape[:2]
+        atlas[y - padding:y + h + padding, x - padding:x + w + padding] = np.pad(image, ((padding, padding), (padding, padding), (0, 0)), 'edge')
+        rects.append((x, y, w, h))
+    ### uv (u0, v0, u1, v1), v goes up from the bottom row of the image
+    corners = np.array(rects, dtype = np.float64).reshape(-1, 4)
+    uvs = np.stack([corners[:, 0] / width, 1.0 - (corners[:, 1] + corners[:, 3]) / height,
+                    (corners[:, 0] + corners[:, 2]) / width, 1.0 - corners[:, 1] / height], axis = 1)
+    return atlas, rects, uvs
+
+def spriteUvs(spriteNum, uvs):
+    '''
+    This function looks the uv rect of every particle up from its spriteNum.
+
+    Args:
+        spriteNum: frame of the sequence of every particle, from 1 like spriteNumPP
+        uvs: uv rects of the atlas, shape (n, 4)
+
+    Returns:
+        uv rects of the particles, shape (particles, 4)
+    '''
+    return uvs[np.clip(np.asarray(spriteNum, dtype = np.int64) - 1, 0, len(uvs) - 1)]
+
+class AtlasCache(object):
+    '''
+    Folder of packed atlases, a PNG and a json of its rects for every atlas.
+
+    Args:
+        cacheDir: the cache folder
+    '''
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        self.hashes = {}
+        indexPath = os.path.join(cacheDir, HASH_INDEX)
+        if os.path.isfile(indexPath):
+            try:
+                with open(indexPath, 'r') as f:
+                    self.hashes = json.load(f)
+            except ValueError:
+                self.hashes = {}
+
+    def fileHash(self, path):
+        ### content hash of a file, read again only when its size or mtime changed
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.hashes.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.hashes[path] = [stat.st_size, stat.st_mtime, digest]
+        return digest
+
+    def atlas(self, paths, padding = 2):
+        '''
+        This function returns the cached atlas of some images, and packs it on a miss.
+
+        Args:
+            paths: the image files, one per frame
+            padding: pixels around every image
+
+        Returns:
+            dictionary of the 'image' path, atlas 'size', pixel 'rects' and 'uvs' of every frame
+        '''
+        digest = hashlib.sha1()
+        for path in paths:
+            digest.update(self.fileHash(path).encode('ascii'))
+        digest.update(repr(int(padding)).encode('ascii'))
+        key = digest.hexdigest()
+        self._writeJson(os.path.join(self.cacheDir, HASH_INDEX), self.hashes)
+
+        imagePath = os.path.join(self.cacheDir, key + '.png')
+        infoPath = os.path.join(self.cacheDir, key + '.json')
+        if os.path.isfile(imagePath) and os.path.isfile(infoPath):
+            with open(infoPath, 'r') as f:
+                return json.load(f)
+
+        pixels, rects, uvs = buildAtlas(paths, padding)
+        fd, tmpPath = tempfile.mkstemp(suffix = '.tmp', dir = self.cacheDir)
+        os.close(fd)
+        SnowImage.writePng(tmpPath, pixels)
+        os.rename(tmpPath, imagePath)
+        info = {'image': imagePath, 'size': [pixels.shape[1], pixels.shape[0]],
+                'files': [os.path.abspath(path) for path in paths],
+                'rects': [list(rect) for rect in rects], 'uvs': uvs.tolist()}
+        self._writeJson(infoPath, info)
+        return info
+
+    def _writeJson(self, path, data):
+        ### write through a temporary file, readers never see half a file
+        fd, tmpPath = tempfile.mkstemp(suffix = '.tmp', dir = self.cacheDir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent = 2)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Pack a snowflake texture sequence into one atlas.')
+    parser.add_argument('first', help = 'first file of the sequence, like snow.1.png')
+    parser.add_argument('count', type = int, help = 'number of files in the sequence')
+    parser.add_argument('-o', '--out', default = 'snow_atlas', help = 'cache folder of the atlases')
+    parser.add_argument('--padding', type = int, default = 2, help = 'pixels around every image')
+    args = parser.parse_args(argv)
+
+    info = AtlasCache(args.out).atlas(sequenceFiles(args.first, args.count), args.padding)
+    print('%d frames packed into %s, %dx%d' % (len(info['rects']), info['image'], info['size'][0], info['size'][1]))
+
+if __name__ == '__main__':
+    main()
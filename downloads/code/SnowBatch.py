@@ -0,0 +1,211 @@
+"""
+SnowBatch.py
+
+Generating many snow pieces at once, each with its own scale, angle and level.
+The snow pieces are built with SnowGeometry across a process pool and every
+worker writes its own OBJ/PLY file, so only file names travel between processes.
+
+usage:
+    python SnowBatch.py seed.obj 2 --scale 0.4 0.5 --angle 0 15 --level 4 6 -o flakes
+    python SnowBatch.py seed.obj 2 --manifest flakes.json -o flakes --format ply
+
+    the manifest is a json list of {"name": ..., "scale": ..., "angle": ..., "level": ...}
+    entries, or an object with such a list under "flakes"
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabaixuan@gmail.com"
+__status__ = "Practise"
+
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import SnowCache
+import SnowGeometry
+import SnowMeshIO
+
+### state of a worker process, set once by init_worker
+_worker = {}
+
+def make_grid(scales, angles, levels):
+    '''
+    This function makes one snow piece entry for every combination of the values.
+
+    Args:
+        scales: list of scale values
+        angles: list of angle values
+        levels: list of level values
+
+    Returns:
+        list of {"name", "scale", "angle", "level"} dictionaries
+    '''
+    flakes = []
+    for scale, angle, level in itertools.product(scales, angles, levels):
+        flakes.append({'name': 'snow_s%g_a%g_l%d' % (scale, angle, level),
+                       'scale': scale,
+                       'angle': angle,
+                       'level': level})
+    return flakes
+
+def read_manifest(path):
+    '''
+    This function reads the snow piece entries of a json manifest.
+
+    Args:
+        path: the manifest file path
+
+    Returns:
+        list of {"name", "scale", "angle", "level"} dictionaries
+
+    Raises:
+        ValueError: an entry misses one of the values
+    '''
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest['flakes']
+
+    flakes = []
+    for i, entry in enumerate(manifest):
+        for key in ('scale', 'angle', 'level'):
+            if key not in entry:
+                raise ValueError('Manifest entry %d has no %s' % (i, key))
+        flake = dict(entry)
+        flake.setdefault('name', 'snow_%04d' % i)
+        flakes.append(flake)
+    return flakes
+
+def init_worker(seed_path, to_point_index, out_dir, file_format, cache_dir = None, weld = None, lod = False):
+    ### load the seed once per worker process, workers share the disk tier of the cache
+    _worker['seed'] = SnowMeshIO.read_obj(seed_path)
+    _worker['cache'] = SnowCache.SnowCache(cache_dir)
+    _worker['to_point_index'] = to_point_index
+    _worker['out_dir'] = out_dir
+    _worker['file_format'] = file_format
+    _worker['weld'] = weld
+    _worker['lod'] = lod
+
+def generate_one(flake):
+    '''
+    This function builds one snow piece in a worker and writes it to a file.
+
+    Args:
+        flake: {"name", "scale", "angle", "level"} dictionary
+
+    Returns:
+        (name, file path, vertex count, face count)
+    '''
+    ### the levels of detail are cut from the level ordered snow piece, so it is the one built for them
+    kind = 'flake_levels' if _worker['lod'] else 'flake'
+    built = _worker['cache'].build(kind, _worker['seed'], _worker['to_point_index'],
+                                   flake['scale'], flake['angle'], flake['level'])
+    mesh = built
+    if _worker['weld'] is not None:
+        mesh, report = SnowGeometry.weld_mesh(built, _worker['weld'])
+    path = os.path.join(_worker['out_dir'], '%s.%s' % (flake['name'], _worker['file_format']))
+    SnowMeshIO.write_mesh(path, mesh)
+    if _worker['lod']:
+        write_lod_chain(flake, built, mesh)
+    return flake['name'], path, len(mesh.points), len(mesh.counts)
+
+def write_lod_chain(flake, built, mesh):
+    '''
+    This function writes the reduced and billboard levels of detail, and a json file describing all of them.
+
+    Args:
+        flake: {"name", "scale", "angle", "level"} dictionary
+        built: the snow piece as build_flake_levels makes it, the levels of detail are cut from it
+        mesh: the snow piece written to the file, welded or not
+    '''
+    lods = SnowGeometry.lod_chain(built, _worker['seed'], _worker['to_point_index'], flake['level'])
+    entries = []
+    for lod in lods:
+        if lod.name == 'full':
+            name = flake['name']
+            lod_mesh = mesh
+        else:
+            name = '%s_%s' % (flake['name'], lod.name)
+            lod_mesh = lod.mesh
+            if _worker['weld'] is not None and lod.name == 'reduced':
+                lod_mesh, report = SnowGeometry.weld_mesh(lod_mesh, _worker['weld'])
+            SnowMeshIO.write_mesh(os.path.join(_worker['out_dir'], '%s.%s' % (name, _worker['file_format'])), lod_mesh)
+        entries.append({'name': lod.name,
+                        'level': lod.level,
+                        'file': '%s.%s' % (name, _worker['file_format']),
+                        'triangles': SnowGeometry.triangle_count(lod_mesh),
+                        'error': lod.error})
+    with open(os.path.join(_worker['out_dir'], '%s_lod.json' % flake['name']), 'w') as f:
+        json.dump(entries, f, indent = 2)
+
+def generate_batch(seed_path, to_point_index, flakes, out_dir, file_format = 'obj', workers = None, cache_dir = None, weld = None, lod = False):
+    '''
+    This function generates all snow pieces across a process pool.
+
+    Args:
+        seed_path: OBJ file of the seed mesh
+        to_point_index: index of the destination point of the seed
+        flakes: list of {"name", "scale", "angle", "level"} dictionaries
+        out_dir: the folder the files are written to
+        file_format: 'obj' or 'ply'
+        workers: number of processes, all cores by default, 1 runs in this process
+        cache_dir: folder of the SnowCache disk tier, no disk cache by default
+        weld: tolerance for welding the vertices, no welding by default
+        lod: also write the reduced and billboard levels of detail of every snow piece
+
+    Returns:
+        list of (name, file path, vertex count, face count), in the order of flakes
+    '''
+    if file_format not in SnowMeshIO.MESH_FORMATS:
+        raise ValueError('Unsupported mesh format: %s' % file_format)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    init_args = (seed_path, to_point_index, out_dir, file_format, cache_dir, weld, lod)
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        init_worker(*init_args)
+        return [generate_one(flake) for flake in flakes]
+
+    pool = multiprocessing.Pool(workers, initializer = init_worker, initargs = init_args)
+    try:
+        ### several flakes per task keep the pool overhead low for small flakes
+        chunk = max(1, len(flakes) // (workers * 4))
+        return pool.map(generate_one, flakes, chunksize = chunk)
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Generate snow pieces from a seed mesh.')
+    parser.add_argument('seed', help = 'OBJ file of the seed mesh')
+    parser.add_argument('to_point_index', type = int, help = 'index of the destination point of the seed')
+    parser.add_argument('--manifest', help = 'json manifest of the snow pieces')
+    parser.add_argument('--scale', type = float, nargs = '+', default = [0.5])
+    parser.add_argument('--angle', type = float, nargs = '+', default = [0.0])
+    parser.add_argument('--level', type = int, nargs = '+', default = [4])
+    parser.add_argument('-o', '--out', default = 'snow_pieces', help = 'output folder')
+    parser.add_argument('--format', default = 'obj', choices = SnowMeshIO.MESH_FORMATS)
+    parser.add_argument('-j', '--workers', type = int, default = None, help = 'number of processes')
+    parser.add_argument('--cache', default = None, help = 'folder of the snow piece cache')
+    parser.add_argument('--weld', type = float, default = None, help = 'tolerance for welding the vertices')
+    parser.add_argument('--lod', action = 'store_true', help = 'also write the levels of detail')
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        flakes = read_manifest(args.manifest)
+    else:
+        flakes = make_grid(args.scale, args.angle, args.level)
+
+    start = time.time()
+    results = generate_batch(args.seed, args.to_point_index, flakes, args.out, args.format, args.workers, args.cache, args.weld, args.lod)
+    print('%d snow pieces written to %s in %.2fs' % (len(results), args.out, time.time() - start))
+
+if __name__ == '__main__':
+    main()
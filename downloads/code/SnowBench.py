@@ -0,0 +1,460 @@
+"""
+SnowBench.py
+
+Benchmarks of SnowPiece and SnowWorld without Maya. A recording stand-in for
+pymel.core, maya.OpenMaya and maya.OpenMayaFX is installed before the modules
+are imported; it counts every call and adds a simulated latency for each one
+instead of touching a scene. SnowPiece.on_click_run runs for levels 1 to 10,
+SnowWorld.run for every combination of its checkboxes, and the newborn
+particles of a shot get their attributes from the creation expressions or
+from SnowWorld.initNewborns, the per frame expression of batch mode. Each
+case reports wall time, calls into Maya, commands run inside MEL batches,
+simulated Maya time and peak memory. The call counts are compared with a stored baseline and
+any increase fails the run.
+
+usage:
+    python SnowBench.py                    compare with SnowBenchBaseline.json
+    python SnowBench.py --update-baseline  store the current counts as the baseline
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SnowBenchBaseline.json')
+DEFAULT_LATENCY = 50e-6  # simulated seconds of a call into Maya
+LATENCY = {'MFnMesh.create': 2e-3, 'instance': 1e-3, 'emitter': 1e-3, 'particle': 1e-3,
+           'dynExpression': 1e-3, 'expression': 1e-3, 'collision': 1e-3, 'gravity': 1e-3,
+           'creationExpression': 20e-6}  # a creation expression run for one newborn particle
+
+class CallRecorder(object):
+    '''
+    Counts the calls into the stand-in Maya modules and their simulated latency.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = collections.Counter()
+        self.latency = 0.0
+        self.melCommands = 0
+
+    def record(self, name):
+        self.counts[name] += 1
+        self.latency += LATENCY.get(name, DEFAULT_LATENCY)
+
+recorder = CallRecorder()
+
+class Point(object):
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+class FakeNode(object):
+    '''
+    Stand-in for a pymel node, its name formats like the node name.
+    '''
+
+    def __init__(self, name, mesh = None):
+        self.name = name
+        self.mesh = mesh
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return 'FakeNode(%r)' % self.name
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return recordedCall(name, self)
+
+    ### the node queries SnowPiece reads the seed mesh with
+    def getShape(self):
+        recorder.record('getShape')
+        return self
+
+    def getTranslation(self, space = 'object'):
+        recorder.record('getTranslation')
+        return Point(0.0, 0.0, 0.0)
+
+    def getPoints(self, space = 'object'):
+        recorder.record('getPoints')
+        return [Point(*p) for p in self.mesh[0]]
+
+    def getVertices(self):
+        recorder.record('getVertices')
+        return self.mesh[1], self.mesh[2]
+
+    def index(self):
+        return 0
+
+class Control(object):
+    ### a UI control holding one value
+    def __init__(self, value):
+        self.value = value
+
+    def getValue(self):
+        return self.value
+
+    def getText(self):
+        return str(self.value)
+
+    def delete(self):
+        recorder.record('deleteUI')
+
+nodeCount = itertools.count(1)
+
+def recordedCall(name, owner = None):
+    ### a call that is only counted, and gives back new nodes where Maya would
+    def call(*args, **kwargs):
+        recorder.record(name)
+        if name in ('particle',):
+            index = next(nodeCount)
+            return [FakeNode('particle%d' % index), FakeNode('particleShape%d' % index)]
+        if name in ('instance',):
+            return [FakeNode('%s%d' % (args[0], next(nodeCount)))]
+        if name in ('rename',):
+            return args[0] if isinstance(args[0], FakeNode) and args[0].mesh else FakeNode(args[1])
+        if name in ('PyNode',):
+            return args[0] if isinstance(args[0], FakeNode) else FakeNode(str(args[0]))
+        if name in ('internalVar',):
+            return os.getcwd()
+        if name in ('getAttr',):
+            shape, attribute = str(args[0]).split('.', 1) if args else ('', '')
+            if shape in particleShapes and attribute == 'particleId':
+                return [float(i) for i in particleShapes[shape]['ids']]
+            return []
+        if name in ('window',):
+            return False if kwargs.get('exists') else Control(None)
+        if owner is not None:
+            return None
+        return FakeNode('%s%d' % (name, next(nodeCount)))
+    return call
+
+class FakePymel(types.ModuleType):
+    ### pymel.core, every attribute is a recorded command
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return recordedCall(name)
+
+class FakeMel(object):
+    ### pymel.core.mel, a MEL batch is one call however many commands it has
+    def eval(self, script):
+        recorder.record('mel.eval')
+        recorder.melCommands += len(script.splitlines()) - 2
+
+class RecordedObject(object):
+    ### maya.OpenMaya objects, every method call is recorded
+    def __init__(self, kind, *args):
+        self.kind = kind
+        recorder.record('%s()' % kind)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        kind = self.kind
+        def call(*args):
+            recorder.record('%s.%s' % (kind, name))
+            if name == 'create':
+                return RecordedObject('MObject')
+            if name == 'fullPathName':
+                return '|polySurface%d' % next(nodeCount)
+        return call
+
+class RecordedArray(RecordedObject):
+    ### maya.OpenMaya arrays, holding their values, made empty or from a pointer and a length
+    def __init__(self, kind, *args):
+        RecordedObject.__init__(self, kind)
+        self.values = list(args[0])[:args[1]] if len(args) == 2 else []
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        recorder.record('%s[]' % self.kind)
+        return self.values[index]
+
+    def append(self, value):
+        recorder.record('%s.append' % self.kind)
+        self.values.append(value)
+
+    def set(self, value, index):
+        recorder.record('%s.set' % self.kind)
+        self.values[index] = value
+
+    def setLength(self, length):
+        recorder.record('%s.setLength' % self.kind)
+        self.values = (self.values + [None] * length)[:length]
+
+    def length(self):
+        recorder.record('%s.length' % self.kind)
+        return len(self.values)
+
+class RecordedScriptUtil(RecordedObject):
+    ### maya.OpenMaya.MScriptUtil, its pointer is the list it was made from
+    def __init__(self, *args):
+        RecordedObject.__init__(self, 'MScriptUtil')
+        self.values = []
+
+    def createFromList(self, values, length):
+        recorder.record('MScriptUtil.createFromList')
+        self.values = list(values)[:length]
+
+    def asDoublePtr(self):
+        recorder.record('MScriptUtil.asDoublePtr')
+        return self.values
+
+    def asIntPtr(self):
+        recorder.record('MScriptUtil.asIntPtr')
+        return [int(v) for v in self.values]
+
+    def asFloat4Ptr(self):
+        recorder.record('MScriptUtil.asFloat4Ptr')
+        return list(zip(*[iter(self.values)] * 4))
+
+## particles of the particle shapes MFnParticleSystem reads: name to live ids and per particle values by id
+particleShapes = {}
+
+class RecordedSelection(RecordedObject):
+    ### maya.OpenMaya.MSelectionList, its node takes the name of the selected shape
+    def __init__(self, *args):
+        RecordedObject.__init__(self, 'MSelectionList')
+        self.names = []
+
+    def add(self, name):
+        recorder.record('MSelectionList.add')
+        self.names.append(name)
+
+    def getDependNode(self, index, node):
+        recorder.record('MSelectionList.getDependNode')
+        node.name = self.names[index]
+
+class RecordedParticleSystem(RecordedObject):
+    ### maya.OpenMayaFX.MFnParticleSystem of a shape in particleShapes
+    def __init__(self, node):
+        RecordedObject.__init__(self, 'MFnParticleSystem')
+        self.particles = particleShapes[node.name]
+
+    def particleIds(self, array):
+        recorder.record('MFnParticleSystem.particleIds')
+        array.values = list(self.particles['ids'])
+
+    def getPerParticleAttribute(self, name, array):
+        recorder.record('MFnParticleSystem.getPerParticleAttribute')
+        values = self.particles['attributes'].get(name, {})
+        array.values = [values.get(i) for i in self.particles['ids']]
+
+    def setPerParticleAttribute(self, name, array):
+        recorder.record('MFnParticleSystem.setPerParticleAttribute')
+        self.particles['attributes'][name] = dict(zip(self.particles['ids'], array.values))
+
+def installFakeMaya():
+    '''
+    This function puts the stand-in modules in sys.modules, before SnowPiece or SnowWorld are imported.
+    '''
+    pymel = types.ModuleType('pymel')
+    core = FakePymel('pymel.core')
+    core.optionVar = {}
+    core.mel = FakeMel()
+    pymel.core = core
+    maya = types.ModuleType('maya')
+    openMaya = types.ModuleType('maya.OpenMaya')
+    for kind in ('MFloatPoint', 'MFnMesh', 'MFnDagNode', 'MObject', 'MVector', 'MDagPath'):
+        setattr(openMaya, kind, (lambda k: lambda *args: RecordedObject(k, *args))(kind))
+    for kind in ('MFloatPointArray', 'MIntArray', 'MDoubleArray', 'MVectorArray'):
+        setattr(openMaya, kind, (lambda k: lambda *args: RecordedArray(k, *args))(kind))
+    openMaya.MSelectionList = RecordedSelection
+    openMaya.MScriptUtil = RecordedScriptUtil
+    openMayaFX = types.ModuleType('maya.OpenMayaFX')
+    openMayaFX.MFnParticleSystem = RecordedParticleSystem
+    maya.OpenMaya = openMaya
+    maya.OpenMayaFX = openMayaFX
+    sys.modules.update({'pymel': pymel, 'pymel.core': core, 'maya': maya, 'maya.OpenMaya': openMaya,
+                        'maya.OpenMayaFX': openMayaFX})
+
+def seedNode():
+    ### a thin box as the seed of a snow piece, its point 4 is the destination point
+    points = [(0.0, 0.0, -0.1), (1.0, 0.0, -0.1), (1.0, 0.2, -0.1), (0.0, 0.2, -0.1),
+              (0.0, 0.0, 0.1), (1.0, 0.0, 0.1), (1.0, 0.2, 0.1), (0.0, 0.2, 0.1)]
+    counts = [4] * 6
+    connects = [0, 3, 2, 1, 4, 5, 6, 7, 0, 1, 5, 4, 1, 2, 6, 5, 2, 3, 7, 6, 3, 0, 4, 7]
+    return FakeNode('seed', (points, counts, connects))
+
+def measure(function, *args, **kwargs):
+    ### wall time, calls, simulated latency and peak memory of one call
+    recorder.reset()
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    function(*args, **kwargs)
+    wall = time.time() - start
+    peak = None
+    if tracemalloc:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'wall': wall, 'calls': sum(recorder.counts.values()), 'latency': recorder.latency,
+            'peak': peak, 'commands': dict(recorder.counts), 'batched': recorder.melCommands}
+
+def benchSnowPiece(levels = range(1, 11)):
+    '''
+    This function runs SnowPiece.on_click_run for every level, whole and instanced,
+    and for a whole snow piece whose level is raised or lowered by one.
+
+    Returns:
+        dictionary of case name to its measures
+    '''
+    import SnowPiece
+    SnowPiece.snow_cache = None
+    SnowPiece.snow_builder = None
+    results = collections.OrderedDict()
+    def run(level, instance, lod = False):
+        SnowPiece.snow_obj = [seedNode()]
+        SnowPiece.to_point_index = 4
+        ### a fresh cache, so every case builds its snow piece
+        SnowPiece.snow_cache = None
+        return measure(SnowPiece.on_click_run, Control(0.5), Control(15.0), Control(level),
+                       Control(instance), Control(True), Control(lod), Control(None))
+    for instance in (False, True):
+        for level in levels:
+            ### no snow piece of an earlier run, so every case creates its mesh
+            SnowPiece.snow_piece = None
+            results['SnowPiece level=%d instance=%d' % (level, instance)] = run(level, instance)
+    ### the snow piece of the run before is updated in place
+    for before, after in ((levels[-1] - 1, levels[-1]), (levels[-1], levels[-1] - 1)):
+        for lod in (False, True):
+            SnowPiece.snow_piece = None
+            run(before, False, lod)
+            results['SnowPiece level=%d->%d lod=%d' % (before, after, lod)] = run(after, False, lod)
+    return results
+
+def benchSnowWorld():
+    '''
+    This function runs SnowWorld.run for every combination of texture, sequence, collision and batch.
+
+    Returns:
+        dictionary of case name to its measures
+    '''
+    import SnowWorld
+    SnowWorld.startArea = FakeNode('startPlane')
+    SnowWorld.coverObj = [FakeNode('cover%d' % i) for i in range(3)]
+    results = collections.OrderedDict()
+    for texture, sequence, cover, batch in itertools.product((False, True), repeat = 4):
+        if sequence and not texture:
+            continue
+        name = 'SnowWorld texture=%d sequence=%d cover=%d batch=%d' % (texture, sequence, cover, batch)
+        results[name] = measure(SnowWorld.run, Control(1.0), Control(100.0), Control(10.0), Control(8),
+                                Control(texture), Control(sequence), Control(cover), Control(batch),
+                                Control(0.0), Control(-1.0), Control(0.0), Control('snow.1.png' if texture else ''))
+    return results
+
+def playNewborns(SnowWorld, shape, frames, rate, lifespan, texture, sequence, batch):
+    '''
+    This function plays a shot of rate births a frame, the particles live lifespan frames.
+
+    In batch mode the expression of SnowWorld runs initNewborns once a frame, otherwise
+    the creation expressions run once for every newborn particle.
+    '''
+    SnowWorld.particleValues.pop(shape, None)
+    particleShapes[shape] = {'ids': [], 'attributes': {}}
+    for frame in range(1, frames + 1):
+        particleShapes[shape]['ids'] = list(range(max(frame - lifespan, 0) * rate, frame * rate))
+        if batch:
+            recorder.record('expression.run')
+            SnowWorld.initNewborns(shape, 0.7, 1.3, 8 if sequence else 0, int(texture), frame,
+                                   len(particleShapes[shape]['ids']))
+        else:
+            for particle in range(rate):
+                recorder.record('creationExpression')
+
+def benchNewborns(frames = 48, rate = 100, lifespan = 24):
+    '''
+    This function gives the newborn particles of a shot their attributes, with the creation
+    expressions or with the expression of batch mode running SnowWorld.initNewborns.
+
+    Returns:
+        dictionary of case name to its measures
+    '''
+    import SnowWorld
+    results = collections.OrderedDict()
+    for texture, sequence in ((False, False), (True, False), (True, True)):
+        for batch in (False, True):
+            name = 'SnowWorld newborns texture=%d sequence=%d batch=%d' % (texture, sequence, batch)
+            results[name] = measure(playNewborns, SnowWorld, 'particleShape%d' % next(nodeCount), frames, rate,
+                                    lifespan, texture, sequence, batch)
+    return results
+
+def compareBaseline(results, baseline):
+    ### cases whose calls into Maya went up since the baseline
+    regressions = []
+    for name in results:
+        if name in baseline and results[name]['calls'] > baseline[name]:
+            regressions.append((name, baseline[name], results[name]['calls']))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark SnowPiece and SnowWorld with a stand-in for Maya.')
+    parser.add_argument('--baseline', default = BASELINE_FILE, help = 'json file of the call counts of every case')
+    parser.add_argument('--update-baseline', action = 'store_true', help = 'store the current call counts as the baseline')
+    args = parser.parse_args(argv)
+
+    ### run in a temporary folder, SnowWorld writes its log to the current folder
+    home = os.getcwd()
+    workDir = tempfile.mkdtemp(prefix = 'snowBench')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workDir)
+    try:
+        installFakeMaya()
+        results = collections.OrderedDict()
+        results.update(benchSnowPiece())
+        results.update(benchSnowWorld())
+        results.update(benchNewborns())
+    finally:
+        os.chdir(home)
+        shutil.rmtree(workDir, ignore_errors = True)
+
+    print('%-50s %10s %8s %8s %12s %10s' % ('case', 'wall ms', 'calls', 'batched', 'maya ms', 'peak KB'))
+    for name, result in results.items():
+        peak = '%10d' % (result['peak'] // 1024) if result['peak'] is not None else '%10s' % '-'
+        print('%-50s %10.2f %8d %8d %12.2f %s' % (name, result['wall'] * 1000, result['calls'], result['batched'],
+                                                  result['latency'] * 1000, peak))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(collections.OrderedDict([(name, result['calls']) for name, result in results.items()]), f, indent = 2)
+        print('baseline written to %s' % args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print('no baseline at %s, run with --update-baseline first' % args.baseline)
+        return 1
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compareBaseline(results, baseline)
+    for name, before, after in regressions:
+        print('REGRESSION %s: %d -> %d calls' % (name, before, after))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+SnowCache.py
+
+Content addressed cache for snow pieces built by SnowGeometry. The key is a
+hash of the seed mesh and of the build parameters. Finished meshes are kept
+in a small in-memory LRU tier and in an on-disk tier of .npz files that is
+trimmed by total size, least recently used files first.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabaixuan@gmail.com"
+__status__ = "Practise"
+
+"""
+
+import collections
+import hashlib
+import os
+import tempfile
+import numpy as np
+import SnowGeometry
+
+### what can be built and cached, and the SnowGeometry function building it
+### 'flake' is ordered part by part and 'flake_levels' level by level, so they never share a key
+BUILDERS = {'flake': SnowGeometry.build_flake,
+            'flake_levels': SnowGeometry.build_flake_levels,
+            'branch': SnowGeometry.build_branch}
+
+def mesh_key(kind, seed, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function hashes the seed geometry and the build parameters.
+
+    Args:
+        kind: a name in BUILDERS
+        seed: SnowMesh of the seed
+        to_point_index, scale, angle, level, origin: see SnowGeometry.level_matrices
+
+    Returns:
+        hex digest string
+    '''
+    digest = hashlib.sha1()
+    digest.update(kind.encode('ascii'))
+    for array in (seed.points.astype('<f8'), seed.counts.astype('<i8'), seed.connects.astype('<i8')):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    params = (int(to_point_index), float(scale), float(angle), max(int(level), 1),
+              None if origin is None else tuple(float(o) for o in origin))
+    digest.update(repr(params).encode('ascii'))
+    return digest.hexdigest()
+
+class SnowCache(object):
+    '''
+    Two tier cache of SnowMesh objects.
+
+    Args:
+        cache_dir: folder of the disk tier, None keeps the cache in memory only
+        memory_items: number of meshes kept in memory
+        disk_bytes: total size of the disk tier before old files are deleted
+    '''
+
+    def __init__(self, cache_dir = None, memory_items = 32, disk_bytes = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.memory = collections.OrderedDict()
+        self.disk_used = 0
+        if cache_dir:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            self.disk_used = sum([size for path, mtime, size in self._disk_files()])
+
+    def get(self, key):
+        '''
+        This function looks a mesh up, memory first, then disk.
+
+        Returns:
+            SnowMesh, or None if the key is not cached
+        '''
+        mesh = self.memory.pop(key, None)
+        if mesh is not None:
+            self.memory[key] = mesh
+            return mesh
+
+        path = self._disk_path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                mesh = SnowGeometry.SnowMesh(data['points'], data['counts'], data['connects'])
+        except (IOError, OSError, KeyError, ValueError):
+            ### another process may be replacing or evicting the file
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            ### evicted by another process right after the load, a miss like the file being gone
+            return None
+        self._remember(key, mesh)
+        return mesh
+
+    def put(self, key, mesh):
+        ### store a mesh in both tiers
+        self._remember(key, mesh)
+
+        path = self._disk_path(key)
+        if path is None:
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix = '.tmp', dir = self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, points = mesh.points, counts = mesh.counts, connects = mesh.connects)
+        try:
+            if os.path.exists(path):
+                ### another process cached the same mesh first
+                raise OSError(path)
+            os.rename(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            return
+        try:
+            self.disk_used += os.path.getsize(path)
+        except OSError:
+            ### already evicted by another process, it takes no space
+            return
+        if self.disk_used > self.disk_bytes:
+            self._evict()
+
+    def build(self, kind, seed, to_point_index, scale, angle, level, origin = None):
+        '''
+        This function returns the cached mesh, and builds and caches it on a miss.
+
+        Args:
+            kind: a name in BUILDERS
+            seed, to_point_index, scale, angle, level, origin: see SnowGeometry.level_matrices
+
+        Returns:
+            SnowMesh
+        '''
+        key = mesh_key(kind, seed, to_point_index, scale, angle, level, origin)
+        mesh = self.get(key)
+        if mesh is None:
+            mesh = BUILDERS[kind](seed, to_point_index, scale, angle, level, origin)
+            self.put(key, mesh)
+        return mesh
+
+    def clear(self):
+        ### empty both tiers
+        self.memory.clear()
+        for path, mtime, size in self._disk_files():
+            os.remove(path)
+        self.disk_used = 0
+
+    def _remember(self, key, mesh):
+        ### cached arrays are shared by every caller, so they become read only
+        for array in mesh:
+            array.flags.writeable = False
+        self.memory.pop(key, None)
+        self.memory[key] = mesh
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last = False)
+
+    def _disk_path(self, key):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _evict(self):
+        ### delete the least recently used files until the disk tier fits again
+        files = sorted(self._disk_files(), key = lambda f: f[1])
+        self.disk_used = sum([size for path, mtime, size in files])
+        for path, mtime, size in files:
+            if self.disk_used <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_used -= size
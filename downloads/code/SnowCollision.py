@@ -0,0 +1,272 @@
+"""
+SnowCollision.py
+
+Collisions of snow particles with the cover objects for SnowSim. The triangles
+of all cover objects go into one bounding volume hierarchy, and the moves of a
+whole particle batch are tested against it together, level by level, so each
+move only meets O(log n) of the scene triangles. The hierarchy is only rebuilt
+when the geometry of a cover object changes.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import collections
+import hashlib
+import numpy as np
+
+LEAF_SIZE = 4  # largest number of triangles in a leaf
+BRUTE_FORCE_CHUNK = 1 << 22  # particle-triangle pairs tested at once without a hierarchy
+
+def triangleNormals(triangles):
+    ### unit normals, counterclockwise triangles seen from the front
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.sqrt((normals ** 2).sum(axis = 1))
+    return normals / np.maximum(lengths, 1e-12)[:, None]
+
+def pairHits(origins, directions, triangles):
+    '''
+    This function intersects segments with triangles pair by pair, Moller-Trumbore.
+
+    Args:
+        origins: segment starts, shape (..., 3)
+        directions: segment end minus start, shape (..., 3)
+        triangles: one triangle per segment, shape (..., 3, 3)
+
+    Returns:
+        hit parameter along each segment, inf where the pair does not cross
+    '''
+    edge1 = triangles[..., 1, :] - triangles[..., 0, :]
+    edge2 = triangles[..., 2, :] - triangles[..., 0, :]
+    pvec = np.cross(directions, edge2)
+    det = (edge1 * pvec).sum(axis = -1)
+    valid = np.abs(det) > 1e-12
+    invDet = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    tvec = origins - triangles[..., 0, :]
+    u = (tvec * pvec).sum(axis = -1) * invDet
+    qvec = np.cross(tvec, edge1)
+    v = (directions * qvec).sum(axis = -1) * invDet
+    t = (edge2 * qvec).sum(axis = -1) * invDet
+    valid &= (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0) & (t <= 1)
+    return np.where(valid, t, np.inf)
+
+def segmentTriangleHits(starts, ends, triangles):
+    '''
+    This function finds the first triangle every segment crosses, testing all triangles.
+
+    Args:
+        starts: segment starts, shape (n, 3)
+        ends: segment ends, shape (n, 3)
+        triangles: shape (t, 3, 3)
+
+    Returns:
+        (triangle index or -1, hit parameter along the segment), both of shape (n,)
+    '''
+    count = len(starts)
+    hitIndex = np.full(count, -1, dtype = np.int64)
+    hitT = np.full(count, np.inf)
+    if count == 0 or len(triangles) == 0:
+        return hitIndex, hitT
+
+    chunk = max(1, BRUTE_FORCE_CHUNK // len(triangles))
+    for first in range(0, count, chunk):
+        last = min(first + chunk, count)
+        origins = starts[first:last, None, :]
+        t = pairHits(origins, ends[first:last, None, :] - origins, triangles[None])
+        nearest = t.argmin(axis = 1)
+        nearestT = t[np.arange(last - first), nearest]
+        hit = np.isfinite(nearestT)
+        hitIndex[first:last][hit] = nearest[hit]
+        hitT[first:last][hit] = nearestT[hit]
+    return hitIndex, hitT
+
+class TriangleBVH(object):
+    '''
+    Bounding volume hierarchy over triangles, stored as flat node arrays.
+
+    Args:
+        triangles: shape (t, 3, 3)
+    '''
+
+    def __init__(self, triangles):
+        self.triangles = np.asarray(triangles, dtype = np.float64).reshape(-1, 3, 3)
+        count = len(self.triangles)
+        lows = self.triangles.min(axis = 1)
+        highs = self.triangles.max(axis = 1)
+        centers = (lows + highs) / 2
+
+        ### top down, each node splits its triangles at the median of its longest axis
+        order = np.arange(count)
+        nodeLow = []
+        nodeHigh = []
+        nodeChildren = []
+        nodeRange = []
+        stack = [(0, count, -1, 0)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(nodeLow)
+            if parent >= 0:
+                nodeChildren[parent][side] = node
+            items = order[start:end]
+            nodeLow.append(lows[items].min(axis = 0) if end > start else np.zeros(3))
+            nodeHigh.append(highs[items].max(axis = 0) if end > start else np.zeros(3))
+            nodeChildren.append([-1, -1])
+            nodeRange.append((start, end))
+            if end - start <= LEAF_SIZE:
+                continue
+            spread = centers[items].max(axis = 0) - centers[items].min(axis = 0)
+            axis = int(spread.argmax())
+            middle = (end - start) // 2
+            order[start:end] = items[np.argpartition(centers[items, axis], middle)]
+            stack.append((start + middle, end, node, 1))
+            stack.append((start, start + middle, node, 0))
+
+        self.order = order
+        self.nodeLow = np.array(nodeLow).reshape(-1, 3)
+        self.nodeHigh = np.array(nodeHigh).reshape(-1, 3)
+        self.nodeChildren = np.array(nodeChildren, dtype = np.int64).reshape(-1, 2)
+        self.nodeRange = np.array(nodeRange, dtype = np.int64).reshape(-1, 2)
+        self.isLeaf = self.nodeChildren[:, 0] < 0
+
+    def query(self, starts, ends):
+        '''
+        This function finds the first triangle every segment crosses.
+
+        All segments walk down the hierarchy together. At each level the pairs of
+        segment and node whose boxes overlap are kept, and leaves test their triangles.
+
+        Args:
+            starts: segment starts, shape (n, 3)
+            ends: segment ends, shape (n, 3)
+
+        Returns:
+            (triangle index or -1, hit parameter along the segment), both of shape (n,)
+        '''
+        count = len(starts)
+        hitIndex = np.full(count, -1, dtype = np.int64)
+        hitT = np.full(count, np.inf)
+        if count == 0 or len(self.triangles) == 0:
+            return hitIndex, hitT
+
+        directions = ends - starts
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            inverse = 1.0 / directions
+        segments = np.arange(count)
+        nodes = np.zeros(count, dtype = np.int64)
+        while len(segments):
+            ### slab test of the segment against the node box, closer than the best hit so far
+            with np.errstate(invalid = 'ignore'):
+                t0 = (self.nodeLow[nodes] - starts[segments]) * inverse[segments]
+                t1 = (self.nodeHigh[nodes] - starts[segments]) * inverse[segments]
+            ### a zero direction with the start on the slab gives nan, the slab does not limit it
+            near = np.minimum(t0, t1)
+            far = np.maximum(t0, t1)
+            near = np.where(np.isnan(near), -np.inf, near).max(axis = 1)
+            far = np.where(np.isnan(far), np.inf, far).min(axis = 1)
+            overlap = (near <= far) & (far >= 0) & (near <= np.minimum(hitT[segments], 1.0))
+            segments = segments[overlap]
+            nodes = nodes[overlap]
+
+            ### leaves test their triangles, the first hit of each segment wins
+            leaf = self.isLeaf[nodes]
+            if leaf.any():
+                leafSegments = segments[leaf]
+                ranges = self.nodeRange[nodes[leaf]]
+                sizes = ranges[:, 1] - ranges[:, 0]
+                pairSegments = np.repeat(leafSegments, sizes)
+                offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+                pairTriangles = self.order[np.repeat(ranges[:, 0], sizes) + offsets]
+                t = pairHits(starts[pairSegments], directions[pairSegments], self.triangles[pairTriangles])
+                better = t < hitT[pairSegments]
+                if better.any():
+                    pairSegments = pairSegments[better]
+                    pairTriangles = pairTriangles[better]
+                    t = t[better]
+                    np.minimum.at(hitT, pairSegments, t)
+                    winner = t == hitT[pairSegments]
+                    hitIndex[pairSegments[winner]] = pairTriangles[winner]
+
+            ### the other pairs go on with both children
+            inner = ~leaf
+            segments = np.repeat(segments[inner], 2)
+            nodes = self.nodeChildren[nodes[inner]].ravel()
+        return hitIndex, hitT
+
+class CollisionScene(object):
+    '''
+    Cover objects the snow collides with, and one hierarchy over all their triangles.
+
+    Args:
+        objects: list of triangle arrays or dictionary of name to triangle array
+    '''
+
+    def __init__(self, objects = None):
+        self.objects = collections.OrderedDict()
+        self.hashes = {}
+        self.bvh = None
+        self.triangleObject = np.zeros(0, dtype = np.int64)
+        self.normals = np.zeros((0, 3))
+        self.names = []
+        if objects is not None:
+            if not isinstance(objects, dict):
+                objects = collections.OrderedDict([('cover%d' % i, tri) for i, tri in enumerate(objects)])
+            for name in objects:
+                self.setObject(name, objects[name])
+
+    def setObject(self, name, triangles):
+        '''
+        This function adds or updates a cover object.
+
+        Returns:
+            True if the geometry changed and the hierarchy will be rebuilt
+        '''
+        triangles = np.ascontiguousarray(triangles, dtype = np.float64).reshape(-1, 3, 3)
+        digest = hashlib.sha1(triangles.tobytes()).hexdigest()
+        if self.hashes.get(name) == digest:
+            return False
+        self.objects[name] = triangles
+        self.hashes[name] = digest
+        self.bvh = None
+        return True
+
+    def removeObject(self, name):
+        if name in self.objects:
+            del self.objects[name]
+            del self.hashes[name]
+            self.bvh = None
+
+    def build(self):
+        ### rebuild the hierarchy if a cover object changed since the last build
+        if self.bvh is not None:
+            return self.bvh
+        self.names = list(self.objects.keys())
+        arrays = [self.objects[name] for name in self.names]
+        if arrays:
+            triangles = np.concatenate(arrays)
+        else:
+            triangles = np.zeros((0, 3, 3))
+        self.triangleObject = np.repeat(np.arange(len(arrays)), [len(a) for a in arrays]).astype(np.int64)
+        self.normals = triangleNormals(triangles)
+        self.bvh = TriangleBVH(triangles)
+        return self.bvh
+
+    def query(self, starts, ends):
+        '''
+        This function finds where every particle move first hits a cover object.
+
+        Args:
+            starts: positions before the move, shape (n, 3)
+            ends: positions after the move, shape (n, 3)
+
+        Returns:
+            (triangle index or -1, hit parameter along the move)
+        '''
+        return self.build().query(starts, ends)
+
+    def triangleCount(self):
+        return sum([len(tri) for tri in self.objects.values()])
@@ -0,0 +1,149 @@
+"""
+SnowCommandBuffer.py
+
+Deferred scene commands for SnowWorld and SnowPiece. Commands that change
+nodes which already exist, like addAttr, setAttr and connectAttr, are
+recorded as MEL instead of being run one by one, and flush runs them all in
+one mel.eval inside one undo chunk. Setting a scene up then costs one round
+trip into Maya and leaves one undo entry, instead of one for every command.
+
+Commands whose result is needed right away, like creating a node whose name
+is used next, still go through pymel directly. A function decorated with
+undoable runs in one outer undo chunk, so those commands and the flushed
+batches inside it are undone together.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import functools
+import numbers
+import pymel.core as pm
+
+## flags that are switched on by being there, instead of taking a value
+SWITCH_FLAGS = set(['e', 'edit', 'q', 'query', 'c', 'creation', 'rad', 'runtimeAfterDynamics',
+                    'rbd', 'runtimeBeforeDynamics', 'force', 'r', 'relative', 'a', 'absolute'])
+
+## commands that take their values before the objects in MEL, pymel takes them after
+VALUES_FIRST = set(['move', 'rotate', 'scale'])
+
+def melValue(value):
+    ### one argument of a MEL command
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    if isinstance(value, (list, tuple)):
+        return ' '.join([melValue(v) for v in value])
+    text = ('%s' % value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+    return '"%s"' % text
+
+def melCommand(command, args, kwargs):
+    '''
+    This function writes a pymel style call as one MEL command.
+
+    Args:
+        command: the command name, like 'setAttr'
+        args: the positional arguments, nodes and plugs are written by name
+        kwargs: the flags, in short or long form as pymel takes them
+
+    Returns:
+        the MEL command string
+    '''
+    words = [command]
+    for flag in sorted(kwargs):
+        value = kwargs[flag]
+        if flag in SWITCH_FLAGS and isinstance(value, bool):
+            if value:
+                words.append('-%s' % flag)
+            continue
+        words.append('-%s %s' % (flag, melValue(value)))
+    if command in VALUES_FIRST:
+        args = [arg for arg in args if isinstance(arg, numbers.Number)] + [arg for arg in args if not isinstance(arg, numbers.Number)]
+    words.extend([melValue(arg) for arg in args])
+    return ' '.join(words) + ';'
+
+def undoable(function):
+    '''
+    This function decorates a function so that everything it does in the scene is one undo entry.
+
+    The chunks of CommandBuffer.flush nest inside the one of the function.
+
+    Args:
+        function: the function to decorate
+
+    Returns:
+        the decorated function
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        pm.undoInfo(openChunk = True)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            pm.undoInfo(closeChunk = True)
+    return wrapper
+
+class CommandBuffer(object):
+    '''
+    Records scene commands and runs them together.
+
+    Any pymel command can be recorded by calling it on the buffer, like
+    buffer.setAttr('lambert2.ambientColor', 1.0, 1.0, 1.0, type = 'double3').
+    Used in a with block, the buffer is flushed at the end of the block,
+    unless the block raised an error.
+    '''
+
+    def __init__(self):
+        self.commands = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __getattr__(self, command):
+        if command.startswith('_'):
+            raise AttributeError(command)
+        def record(*args, **kwargs):
+            self.commands.append(melCommand(command, args, kwargs))
+        return record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.flush()
+        else:
+            self.commands = []
+        return False
+
+    def mel(self):
+        ### the recorded commands as one MEL script
+        return '\n'.join(self.commands)
+
+    def flush(self):
+        '''
+        This function runs the recorded commands in one mel.eval and one undo chunk.
+
+        Returns:
+            number of commands run
+        '''
+        count = len(self.commands)
+        if count == 0:
+            return 0
+        ### the chunk opens and closes inside the batch, it is only closed from here when the batch failed
+        script = 'undoInfo -openChunk;\n%s\nundoInfo -closeChunk;' % self.mel()
+        self.commands = []
+        try:
+            pm.mel.eval(script)
+        except Exception:
+            pm.undoInfo(closeChunk = True)
+            raise
+        return count
@@ -0,0 +1,344 @@
+"""
+SnowCrystal.py
+
+Growing snow crystals with Reiter's cellular automaton on a hexagonal lattice,
+as an alternative to building snow pieces from a hand made seed mesh. Every
+cell holds an amount of water; cells that reach 1 are ice, ice and its
+neighbours take in vapour, and the vapour everywhere else diffuses. A crystal
+keeps the twelve symmetries of the hexagon, so only one twelfth of the lattice
+is stepped, and many crystals are stepped together in the same numpy arrays.
+Grown crystals become SnowGeometry meshes or sprite images, like the snow.N
+texture sequence of SnowWorld.
+
+usage:
+    python SnowCrystal.py 200 -o flakes                   write flakes/snow.1.png to snow.200.png
+    python SnowCrystal.py 20 -o flakes --mesh obj         also write every crystal as a mesh
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabaixuan@gmail.com"
+__status__ = "Practise"
+
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import SnowGeometry
+import SnowImage
+import SnowMeshIO
+
+### axial (q, r) steps to the six neighbours, the direction of step k is at 60 * k degrees
+HEX_DIRECTIONS = np.array([(1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1), (1, -1)], dtype = np.int64)
+
+### corners of a cell in half units, x in sqrt(3) / 2 and y in 1 / 2, corner k is at 60 * k - 30 degrees
+HEX_CORNERS = np.array([(1, -1), (1, 1), (0, 2), (-1, 1), (-1, -1), (0, -2)], dtype = np.int64)
+
+### the ranges random crystals are drawn from: diffusion alpha, background vapour beta, vapour addition gamma
+ALPHA_RANGE = (0.8, 2.0)
+BETA_RANGE = (0.3, 0.8)
+GAMMA_RANGE = (1e-4, 1e-2)
+
+### the symmetry maps of every lattice radius, built once
+_wedges = {}
+
+def hex_cells(radius):
+    '''
+    This function lists the cells of a hexagon of the lattice.
+
+    Args:
+        radius: number of cells from the center cell to the edge
+
+    Returns:
+        axial (q, r) of every cell, shape (n, 2)
+    '''
+    q, r = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1), indexing = 'ij')
+    q = q.ravel()
+    r = r.ravel()
+    inside = np.maximum(np.maximum(np.abs(q), np.abs(r)), np.abs(q + r)) <= radius
+    return np.stack([q[inside], r[inside]], axis = 1)
+
+def cell_index_grid(cells, radius):
+    ### index of every cell by its (q + radius, r + radius), -1 outside the hexagon
+    grid = np.full((2 * radius + 1, 2 * radius + 1), -1, dtype = np.int64)
+    grid[cells[:, 0] + radius, cells[:, 1] + radius] = np.arange(len(cells))
+    return grid
+
+def symmetry_images(cells):
+    '''
+    This function maps cells by the twelve symmetries of the hexagon.
+
+    Args:
+        cells: axial (q, r), shape (n, 2)
+
+    Returns:
+        the images of the cells, shape (12, n, 2)
+    '''
+    images = []
+    for start in (cells, cells[:, ::-1]):
+        q, r = start[:, 0], start[:, 1]
+        for k in range(6):
+            images.append(np.stack([q, r], axis = 1))
+            ### a turn by 60 degrees
+            q, r = -r, q + r
+    return np.array(images)
+
+def wedge_map(radius):
+    '''
+    This function splits the lattice into classes of cells the symmetries map onto each other.
+
+    Args:
+        radius: radius of the lattice
+
+    Returns:
+        (cells, class of every cell, neighbour classes of every class, classes at the edge), the
+        neighbour classes have shape (classes, 6) and use the class count for cells off the lattice
+    '''
+    if radius in _wedges:
+        return _wedges[radius]
+    cells = hex_cells(radius)
+    grid = cell_index_grid(cells, radius)
+    size = 2 * radius + 1
+    keys = symmetry_images(cells) + radius
+    keys = (keys[:, :, 0] * size + keys[:, :, 1]).min(axis = 0)
+    unique, first, classes = np.unique(keys, return_index = True, return_inverse = True)
+    classes = classes.ravel()
+
+    ### the neighbours of one cell of a class stand for the neighbours of all of its cells
+    steps = cells[first][:, None, :] + HEX_DIRECTIONS[None, :, :]
+    inside = np.all((steps >= -radius) & (steps <= radius), axis = 2)
+    neighbours = np.full(inside.shape, len(unique), dtype = np.int64)
+    found = grid[np.clip(steps[:, :, 0] + radius, 0, size - 1), np.clip(steps[:, :, 1] + radius, 0, size - 1)]
+    inside &= found >= 0
+    neighbours[inside] = classes[found[inside]]
+    edge = np.maximum(np.maximum(np.abs(cells[first, 0]), np.abs(cells[first, 1])), np.abs(cells[first].sum(axis = 1))) >= radius - 1
+    _wedges[radius] = (cells, classes, neighbours, edge)
+    return _wedges[radius]
+
+def random_params(count, seed = 0):
+    '''
+    This function draws the alpha, beta and gamma of random crystals.
+
+    Returns:
+        (alpha, beta, gamma) arrays of shape (count,)
+    '''
+    rng = np.random.RandomState(seed)
+    alpha = rng.uniform(ALPHA_RANGE[0], ALPHA_RANGE[1], count)
+    beta = rng.uniform(BETA_RANGE[0], BETA_RANGE[1], count)
+    gamma = np.exp(rng.uniform(np.log(GAMMA_RANGE[0]), np.log(GAMMA_RANGE[1]), count))
+    return alpha, beta, gamma
+
+def grow_crystals(alpha, beta, gamma, radius = 64, max_steps = 3000):
+    '''
+    This function grows crystals with Reiter's automaton, one row of the arrays per crystal.
+
+    A crystal stops growing once its ice reaches the edge of the lattice.
+
+    Args:
+        alpha: diffusion of the vapour, one per crystal
+        beta: vapour the lattice starts with and is fed from its edge, one per crystal
+        gamma: vapour added to the cells that take it in at every step, one per crystal
+        radius: radius of the lattice in cells
+        max_steps: most steps of any crystal
+
+    Returns:
+        (water of every cell class, shape (crystals, classes), number of steps of every crystal)
+    '''
+    alpha, beta, gamma = [np.atleast_1d(np.asarray(value, dtype = np.float64)) for value in (alpha, beta, gamma)]
+    cells, classes, neighbours, edge = wedge_map(radius)
+    count = len(alpha)
+    water = np.repeat(beta[:, None], len(edge), axis = 1)
+    water[:, classes[np.flatnonzero((cells == 0).all(axis = 1))[0]]] = 1.0
+    steps = np.zeros(count, dtype = np.int64)
+
+    ### the growing crystals are stepped with one column each, so the neighbours are whole rows
+    active = np.arange(count)
+    s = water.T.copy()
+    a, b, g = alpha[None, :], beta[None, :], gamma[None, :]
+    columns = [neighbours[:, k] for k in range(6)]
+    for step in range(max_steps):
+        if len(active) == 0:
+            break
+        ice = s >= 1.0
+        ### cells off the lattice are vapour at beta and never ice
+        ice_out = np.concatenate([ice, np.zeros((1, len(active)), dtype = bool)])
+        receptive = ice.copy()
+        for column in columns:
+            receptive |= ice_out[column]
+        u = np.where(receptive, 0.0, s)
+        v = np.where(receptive, s + g, 0.0)
+        u_out = np.concatenate([u, b])
+        total = u_out[columns[0]]
+        for column in columns[1:]:
+            total += u_out[column]
+        u += a * 0.5 * (total / 6.0 - u)
+        s = u + v
+        steps[active] += 1
+
+        done = (s[edge] >= 1.0).any(axis = 0)
+        if done.any():
+            water[active[done]] = s[:, done].T
+            keep = ~done
+            active = active[keep]
+            s, a, b, g = s[:, keep], a[:, keep], b[:, keep], g[:, keep]
+    water[active] = s.T
+    return water, steps
+
+def crystal_cells(water, radius):
+    ### the water of every cell of the lattice, from the water of the classes
+    cells, classes, neighbours, edge = wedge_map(radius)
+    return water[..., classes]
+
+def crystal_image(water, radius, size = 128, supersample = 2):
+    '''
+    This function draws a crystal as a sprite, white ice on a transparent background.
+
+    Args:
+        water: water of the cell classes of one crystal
+        radius: radius of the lattice
+        size: width and height of the image in pixels
+        supersample: samples per pixel along x and y, for smooth edges
+
+    Returns:
+        uint8 pixels of shape (size, size, 2), gray and alpha
+    '''
+    cells = wedge_map(radius)[0]
+    grid = cell_index_grid(cells, radius)
+    state = crystal_cells(water, radius)
+    samples = size * supersample
+    extent = np.sqrt(3.0) * (radius + 1)
+    axis = (np.arange(samples) + 0.5) / samples * 2.0 * extent - extent
+    x, y = np.meshgrid(axis, -axis)
+
+    ### pixel to the nearest cell, by rounding the cube coordinates
+    q = np.sqrt(3.0) / 3.0 * x - y / 3.0
+    r = 2.0 / 3.0 * y
+    cube = np.stack([q, -q - r, r])
+    rounded = np.round(cube)
+    error = np.abs(rounded - cube)
+    worst = error.argmax(axis = 0)
+    for k in range(3):
+        others = [rounded[i] for i in range(3) if i != k]
+        rounded[k] = np.where(worst == k, -others[0] - others[1], rounded[k])
+    cq = rounded[0].astype(np.int64)
+    cr = rounded[2].astype(np.int64)
+    inside = (np.abs(cq) <= radius) & (np.abs(cr) <= radius) & (np.abs(cq + cr) <= radius)
+    index = np.where(inside, grid[np.clip(cq + radius, 0, 2 * radius), np.clip(cr + radius, 0, 2 * radius)], -1)
+
+    ### thicker ice is more opaque
+    ice = np.where(index >= 0, state[np.maximum(index, 0)], 0.0)
+    alpha = np.where(ice >= 1.0, np.clip(0.55 + 0.45 * (ice - 1.0) / max(float(ice.max()) - 1.0, 1e-6), 0.0, 1.0), 0.0)
+    alpha = alpha.reshape(size, supersample, size, supersample).mean(axis = (1, 3))
+    gray = np.full(alpha.shape, 255, dtype = np.uint8)
+    return np.stack([gray, np.round(alpha * 255).astype(np.uint8)], axis = 2)
+
+def crystal_mesh(water, radius, size = 1.0, thickness = 0.02):
+    '''
+    This function builds the ice of a crystal as a thin closed mesh, one hexagonal prism per ice cell.
+
+    Corners shared by cells are shared vertices, and only the walls between ice and vapour are kept.
+
+    Args:
+        water: water of the cell classes of one crystal
+        radius: radius of the lattice
+        size: radius of the mesh, the edge of the lattice
+        thickness: thickness of the mesh along z
+
+    Returns:
+        SnowMesh in the x-y plane
+    '''
+    cells = wedge_map(radius)[0]
+    grid = cell_index_grid(cells, radius)
+    ice = crystal_cells(water, radius) >= 1.0
+    ice_cells = cells[ice]
+    if len(ice_cells) == 0:
+        return SnowGeometry.make_mesh(np.zeros((0, 3)), [], [])
+
+    ### corners on the integer half unit lattice, so shared corners get the same key
+    centers = np.stack([2 * ice_cells[:, 0] + ice_cells[:, 1], 3 * ice_cells[:, 1]], axis = 1)
+    corners = centers[:, None, :] + HEX_CORNERS[None, :, :]
+    span = 4 * radius + 8
+    keys = (corners[:, :, 0] + span) * (2 * span + 1) + (corners[:, :, 1] + span)
+    unique, first, corner_index = np.unique(keys.ravel(), return_index = True, return_inverse = True)
+    corner_index = corner_index.reshape(-1, 6)
+    flat = corners.reshape(-1, 2)[first]
+    scale = size / (np.sqrt(3.0) * (radius + 1))
+    xy = np.stack([flat[:, 0] * np.sqrt(3.0) / 2.0, flat[:, 1] * 0.5], axis = 1) * scale
+    half = thickness / 2.0
+    top = np.concatenate([xy, np.full((len(xy), 1), half)], axis = 1)
+    bottom = np.concatenate([xy, np.full((len(xy), 1), -half)], axis = 1)
+    points = np.concatenate([top, bottom])
+    below = len(xy)
+
+    ### a wall on every side of an ice cell whose neighbour is vapour or off the lattice
+    steps = ice_cells[:, None, :] + HEX_DIRECTIONS[None, :, :]
+    inside = np.all(np.abs(np.concatenate([steps, steps.sum(axis = 2)[:, :, None]], axis = 2)) <= radius, axis = 2)
+    neighbour = np.where(inside, grid[np.clip(steps[:, :, 0] + radius, 0, 2 * radius), np.clip(steps[:, :, 1] + radius, 0, 2 * radius)], -1)
+    open_side = ~np.where(neighbour >= 0, ice[np.maximum(neighbour, 0)], False)
+    cell, side = np.nonzero(open_side)
+    a = corner_index[cell, side]
+    b = corner_index[cell, (side + 1) % 6]
+    walls = np.stack([a + below, b + below, b, a], axis = 1)
+
+    faces = [corner_index, corner_index[:, ::-1] + below, walls]
+    counts = np.concatenate([np.full(len(corner_index), 6), np.full(len(corner_index), 6), np.full(len(walls), 4)])
+    return SnowGeometry.make_mesh(points, counts, np.concatenate([face.ravel() for face in faces]))
+
+def write_sequence(out_dir, count, size = 128, radius = 64, seed = 0, prefix = 'snow', mesh_format = None,
+                   batch = 256, max_steps = 3000):
+    '''
+    This function grows random crystals and writes them as a texture sequence named like SnowWorld expects.
+
+    Args:
+        out_dir: the folder the files are written to
+        count: number of crystals
+        size: width and height of the images
+        radius: radius of the lattice in cells
+        seed: seed of the crystal parameters
+        prefix: file names are prefix.1.png to prefix.count.png
+        mesh_format: also write every crystal as an 'obj' or 'ply' mesh, no meshes by default
+        batch: number of crystals grown together
+        max_steps: most steps of any crystal
+
+    Returns:
+        list of the image paths
+    '''
+    if mesh_format is not None and mesh_format not in SnowMeshIO.MESH_FORMATS:
+        raise ValueError('Unsupported mesh format: %s' % mesh_format)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    alpha, beta, gamma = random_params(count, seed)
+    paths = []
+    for start in range(0, count, batch):
+        chunk = slice(start, min(start + batch, count))
+        water, steps = grow_crystals(alpha[chunk], beta[chunk], gamma[chunk], radius, max_steps)
+        for i in range(len(water)):
+            number = start + i + 1
+            path = os.path.join(out_dir, '%s.%d.png' % (prefix, number))
+            SnowImage.writePng(path, crystal_image(water[i], radius, size))
+            if mesh_format is not None:
+                SnowMeshIO.write_mesh(os.path.join(out_dir, '%s.%d.%s' % (prefix, number, mesh_format)),
+                                      crystal_mesh(water[i], radius))
+            paths.append(path)
+    return paths
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Grow snow crystals and write them as a texture sequence.')
+    parser.add_argument('count', type = int, help = 'number of crystals')
+    parser.add_argument('-o', '--out', default = 'snow_crystals', help = 'output folder')
+    parser.add_argument('--size', type = int, default = 128, help = 'width and height of the images')
+    parser.add_argument('--radius', type = int, default = 64, help = 'radius of the lattice in cells')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--prefix', default = 'snow', help = 'files are named prefix.n.png')
+    parser.add_argument('--mesh', default = None, choices = SnowMeshIO.MESH_FORMATS, help = 'also write the meshes')
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    paths = write_sequence(args.out, args.count, args.size, args.radius, args.seed, args.prefix, args.mesh)
+    print('%d snow crystals written to %s in %.2fs' % (len(paths), args.out, time.time() - start))
+
+if __name__ == '__main__':
+    main()
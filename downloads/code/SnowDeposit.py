@@ -0,0 +1,200 @@
+"""
+SnowDeposit.py
+
+Snow building up on the cover objects of SnowSim. Every particle that lands
+on a cover object adds its volume to a sparse heightfield of that object: a
+hashed grid of square cells on the x-z plane, holding the snow depth and the
+height of the surface under it. The maps grow frame by frame with the hits of
+that frame only, and export a displacement map or a merged snow-cap mesh.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import collections
+import numpy as np
+import SnowGeometry
+import SnowImage
+
+CELL_BITS = 31  # bits of one cell coordinate in a hashed cell key
+CELL_OFFSET = 1 << (CELL_BITS - 1)
+
+def cellKeys(cx, cz):
+    ### pack two cell coordinates into one sortable int64, cells outside of the key range would collide
+    cx = np.asarray(cx, dtype = np.int64)
+    cz = np.asarray(cz, dtype = np.int64)
+    for cells in (cx, cz):
+        if cells.size and (cells.min() < -CELL_OFFSET or cells.max() >= CELL_OFFSET):
+            raise ValueError('Deposit cell %d is out of the range of %d cells from the origin'
+                             % (cells.min() if cells.min() < -CELL_OFFSET else cells.max(), CELL_OFFSET))
+    return ((cx + CELL_OFFSET) << CELL_BITS) | (cz + CELL_OFFSET)
+
+def keyCells(keys):
+    ### the cell coordinates of packed keys
+    return (keys >> CELL_BITS) - CELL_OFFSET, (keys & ((1 << CELL_BITS) - 1)) - CELL_OFFSET
+
+class DepositMap(object):
+    '''
+    Sparse snow heightfield of one cover object, cells sorted by key.
+
+    Args:
+        cellSize: edge length of a cell on the x-z plane
+    '''
+
+    def __init__(self, cellSize):
+        self.cellSize = float(cellSize)
+        self.keys = np.zeros(0, dtype = np.int64)
+        self.depth = np.zeros(0)
+        self.surface = np.zeros(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, points, depths):
+        '''
+        This function adds snow to the cells under some points.
+
+        Args:
+            points: where the snow landed, shape (n, 3)
+            depths: snow depth every point adds to its cell, shape (n,)
+        '''
+        if len(points) == 0:
+            return
+        cells = np.floor(points[:, [0, 2]] / self.cellSize).astype(np.int64)
+        hitKeys, inverse = np.unique(cellKeys(cells[:, 0], cells[:, 1]), return_inverse = True)
+        addDepth = np.bincount(inverse, weights = depths, minlength = len(hitKeys))
+        top = np.full(len(hitKeys), -np.inf)
+        np.maximum.at(top, inverse, points[:, 1])
+
+        ### merge the cells of this frame into the sorted cells so far
+        keys = np.union1d(self.keys, hitKeys)
+        depth = np.zeros(len(keys))
+        surface = np.full(len(keys), -np.inf)
+        old = np.searchsorted(keys, self.keys)
+        depth[old] = self.depth
+        surface[old] = self.surface
+        new = np.searchsorted(keys, hitKeys)
+        depth[new] += addDepth
+        surface[new] = np.maximum(surface[new], top)
+        self.keys = keys
+        self.depth = depth
+        self.surface = surface
+
+    def displacementMap(self):
+        '''
+        This function rasterizes the snow depth over the bounding box of the covered cells.
+
+        Returns:
+            (depth image of shape (rows along z, columns along x), x and z of its first cell corner)
+        '''
+        if len(self.keys) == 0:
+            return np.zeros((0, 0)), (0.0, 0.0)
+        cx, cz = keyCells(self.keys)
+        image = np.zeros((cz.max() - cz.min() + 1, cx.max() - cx.min() + 1))
+        image[cz - cz.min(), cx - cx.min()] = self.depth
+        return image, (cx.min() * self.cellSize, cz.min() * self.cellSize)
+
+    def capMesh(self):
+        '''
+        This function builds the snow cap, one quad per covered cell sharing its corners.
+
+        A corner rises above the surface by the average depth of its four cells, so
+        the cap thins out to the surface at its border.
+
+        Returns:
+            SnowMesh
+        '''
+        if len(self.keys) == 0:
+            return SnowGeometry.make_mesh(np.zeros((0, 3)), [], [])
+        cx, cz = keyCells(self.keys)
+        ### corner (i, j) is the low corner of cell (i, j), quads go around counterclockwise seen from above
+        cornerX = np.stack([cx, cx, cx + 1, cx + 1], axis = 1)
+        cornerZ = np.stack([cz, cz + 1, cz + 1, cz], axis = 1)
+        corners, connects = np.unique(cellKeys(cornerX, cornerZ).ravel(), return_inverse = True)
+        depth = np.bincount(connects, weights = np.repeat(self.depth, 4), minlength = len(corners)) / 4
+        touching = np.bincount(connects, minlength = len(corners))
+        surface = np.bincount(connects, weights = np.repeat(self.surface, 4), minlength = len(corners)) / touching
+        x, z = keyCells(corners)
+        points = np.stack([x * self.cellSize, surface + depth, z * self.cellSize], axis = 1)
+        return SnowGeometry.make_mesh(points, np.full(len(self.keys), 4), connects)
+
+class SnowAccumulator(object):
+    '''
+    Deposit maps of all cover objects of a collision scene.
+
+    Args:
+        cellSize: edge length of a cell on the x-z plane
+        volumeScale: fraction of the sprite volume of a particle that settles as snow
+        minUp: surfaces whose normal points up less than this shed their snow
+    '''
+
+    def __init__(self, cellSize = 0.1, volumeScale = 0.01, minUp = 0.3):
+        self.cellSize = float(cellSize)
+        self.volumeScale = float(volumeScale)
+        self.minUp = float(minUp)
+        self.maps = collections.OrderedDict()
+
+    def addHits(self, scene, points, triangles, radius):
+        '''
+        This function lets particles settle where they hit the cover objects.
+
+        Args:
+            scene: SnowCollision.CollisionScene the hits were found in
+            points: hit points, shape (n, 3)
+            triangles: hit triangle indices in the scene, shape (n,)
+            radius: radius of the particles, shape (n,)
+
+        Returns:
+            boolean mask of the hits that settled
+        '''
+        settle = np.abs(scene.normals[triangles, 1]) >= self.minUp
+        if not settle.any():
+            return settle
+        points = points[settle]
+        objects = scene.triangleObject[triangles[settle]]
+        depths = self.volumeScale * (4.0 / 3.0 * np.pi) * radius[settle] ** 3 / self.cellSize ** 2
+        for index in np.unique(objects):
+            name = scene.names[index]
+            if name not in self.maps:
+                self.maps[name] = DepositMap(self.cellSize)
+            mine = objects == index
+            self.maps[name].add(points[mine], depths[mine])
+        return settle
+
+    def capMesh(self):
+        ### the snow caps of all cover objects merged into one mesh
+        points = []
+        counts = []
+        connects = []
+        offset = 0
+        for name in self.maps:
+            mesh = self.maps[name].capMesh()
+            points.append(mesh.points)
+            counts.append(mesh.counts)
+            connects.append(mesh.connects + offset)
+            offset += len(mesh.points)
+        if not points:
+            return SnowGeometry.make_mesh(np.zeros((0, 3)), [], [])
+        return SnowGeometry.make_mesh(np.concatenate(points), np.concatenate(counts), np.concatenate(connects))
+
+    def writeDisplacement(self, name, path):
+        '''
+        This function writes the deposit map of one cover object as a 16 bit grayscale PNG.
+
+        Args:
+            name: the cover object
+            path: the PNG file path
+
+        Returns:
+            (depth of the white level, x and z of the first cell corner, cell size)
+        '''
+        image, corner = self.maps[name].displacementMap()
+        maxDepth = float(image.max()) if image.size else 0.0
+        scale = 65535.0 / maxDepth if maxDepth > 0 else 0.0
+        SnowImage.writePng(path, np.round(image * scale).astype(np.uint16))
+        return maxDepth, corner, self.cellSize
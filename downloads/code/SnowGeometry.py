@@ -0,0 +1,726 @@
+"""
+SnowGeometry.py
+
+Maya independent geometry kernel for SnowPiece. It builds the whole six-fold
+snow piece from a seed mesh with batched 4x4 transform matrices, so the
+generator can run and be measured without a Maya session.
+
+The Snow modules need numpy, which Maya does not ship and these scripts do not
+bundle. Install a numpy build made for the Python of mayapy, on Maya 2022 and
+later with "mayapy -m pip install numpy", before loading SnowPiece or SnowWorld.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabaixuan@gmail.com"
+__status__ = "Practise"
+
+"""
+
+import collections
+import numpy as np
+
+### a polygon mesh in the same layout as MFnMesh: points, face vertex counts and face vertex indices
+SnowMesh = collections.namedtuple('SnowMesh', ['points', 'counts', 'connects'])
+
+### one prototype mesh plus the matrices of all of its instances
+SnowInstances = collections.namedtuple('SnowInstances', ['prototype', 'matrices'])
+
+### one level of detail of a snow piece, error is the largest distance its geometry may be off
+SnowLod = collections.namedtuple('SnowLod', ['name', 'level', 'mesh', 'triangles', 'error'])
+
+ARM_COUNT = 6
+
+def make_mesh(points, counts, connects):
+    '''
+    This function wraps the mesh buffers into a SnowMesh of numpy arrays.
+
+    Args:
+        points: sequence of (x, y, z) vertex positions
+        counts: number of vertices of every face
+        connects: vertex indices of all faces, face after face
+
+    Returns:
+        SnowMesh
+    '''
+    return SnowMesh(np.asarray(points, dtype = np.float64).reshape(-1, 3),
+                    np.asarray(counts, dtype = np.int64).ravel(),
+                    np.asarray(connects, dtype = np.int64).ravel())
+
+def rotate_y_matrices(angles):
+    ### rotation matrices around the y axis, angles in degrees, same handedness as pm.rotate
+    rad = np.radians(np.asarray(angles, dtype = np.float64))
+    cos_a = np.cos(rad)
+    sin_a = np.sin(rad)
+    mats = np.zeros(rad.shape + (4, 4))
+    mats[..., 0, 0] = cos_a
+    mats[..., 0, 2] = sin_a
+    mats[..., 1, 1] = 1.0
+    mats[..., 2, 0] = -sin_a
+    mats[..., 2, 2] = cos_a
+    mats[..., 3, 3] = 1.0
+    return mats
+
+def scale_matrices(scales):
+    ### scale matrices for an array of (sx, sy, sz)
+    scales = np.asarray(scales, dtype = np.float64)
+    mats = np.zeros(scales.shape[:-1] + (4, 4))
+    mats[..., 0, 0] = scales[..., 0]
+    mats[..., 1, 1] = scales[..., 1]
+    mats[..., 2, 2] = scales[..., 2]
+    mats[..., 3, 3] = 1.0
+    return mats
+
+def translate_matrices(translates):
+    ### translate matrices for an array of (tx, ty, tz)
+    translates = np.asarray(translates, dtype = np.float64)
+    mats = np.zeros(translates.shape[:-1] + (4, 4))
+    mats[..., 0, 0] = 1.0
+    mats[..., 1, 1] = 1.0
+    mats[..., 2, 2] = 1.0
+    mats[..., 3, 3] = 1.0
+    mats[..., :3, 3] = translates
+    return mats
+
+def transform_points(matrices, points):
+    '''
+    This function applies a batch of 4x4 matrices to the same points.
+
+    Args:
+        matrices: array of shape (n, 4, 4)
+        points: array of shape (v, 3)
+
+    Returns:
+        array of shape (n, v, 3)
+    '''
+    return np.einsum('nij,vj->nvi', matrices[:, :3, :3], points) + matrices[:, None, :3, 3]
+
+def level_matrices(points, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function computes the world matrix of every level of the 1/6 snow piece.
+
+    Each level is the previous one rotated by angle and scaled by scale in x and z,
+    then moved so its origin sits on the destination point, on the y = 0 plane.
+
+    Args:
+        points: seed points relative to the seed origin, shape (v, 3)
+        to_point_index: index of the destination point
+        scale: scale of each level relative to the previous one
+        angle: rotation around y of each level relative to the previous one
+        level: number of levels
+        origin: world position of the seed, (0, 0, 0) by default
+
+    Returns:
+        array of shape (level, 4, 4)
+    '''
+    level = max(int(level), 1)
+    rotate_scale = rotate_scale_matrices(scale, angle, np.arange(level))
+    translates = np.zeros((level, 3))
+    if origin is not None:
+        translates[0] = origin
+    translates[1:] = follow_to_point(points, to_point_index, scale, angle, np.arange(1, level), translates[0])
+    return np.matmul(translate_matrices(translates), rotate_scale)
+
+def rotate_scale_matrices(scale, angle, steps):
+    ### rotation and scale of the given levels, without their translation
+    steps = np.asarray(steps)
+    factors = float(scale) ** steps
+    return np.matmul(rotate_y_matrices(steps * float(angle)),
+                     scale_matrices(np.stack([factors, np.ones(len(steps)), factors], axis = -1)))
+
+def follow_to_point(points, to_point_index, scale, angle, steps, translate):
+    '''
+    This function works out where the destination point puts each level, in closed form.
+
+    Rotating around y and scaling x and z never mix y into x and z, so on the y = 0
+    plane every level adds the destination point turned by angle and scaled by scale
+    once more. With the points of the plane as complex numbers x - iz, the offset of
+    level k is p * r^k with r = scale * e^(i * angle), and the translation of level k
+    is a geometric series of those offsets.
+
+    Args:
+        points: seed points relative to the seed origin, shape (v, 3)
+        to_point_index: index of the destination point
+        scale, angle: see level_matrices
+        steps: consecutive level numbers, all above 0
+        translate: translation of the level before the first one
+
+    Returns:
+        translations of the levels, shape (n, 3)
+    '''
+    steps = np.asarray(steps)
+    to_point = np.asarray(points, dtype = np.float64)[to_point_index]
+    ratio = float(scale) * np.exp(1j * np.radians(float(angle)))
+    if len(steps) == 0:
+        return np.zeros((0, 3))
+    offsets = complex(to_point[0], -to_point[2]) * (geometric_sum(ratio, steps) - geometric_sum(ratio, steps[0] - 1))
+    pos = complex(translate[0], -translate[2]) + offsets
+    return np.stack([pos.real, np.zeros(len(steps)), -pos.imag], axis = -1)
+
+def geometric_sum(ratio, n):
+    ### r + r^2 + ... + r^n
+    n = np.asarray(n)
+    if abs(1 - ratio) < 1e-12:
+        return n.astype(np.complex128)
+    return ratio * (1 - ratio ** n) / (1 - ratio)
+
+def arm_matrices():
+    ### rotations of the 6 parts of the snow piece
+    return rotate_y_matrices(np.arange(ARM_COUNT) * (360.0 / ARM_COUNT))
+
+def instance_mesh(mesh, matrices):
+    '''
+    This function copies a mesh once per matrix and merges all copies in one step.
+
+    Args:
+        mesh: SnowMesh to copy
+        matrices: array of shape (n, 4, 4)
+
+    Returns:
+        SnowMesh with n transformed copies of the mesh
+    '''
+    copies = len(matrices)
+    points = transform_points(matrices, mesh.points).reshape(-1, 3)
+    offsets = np.arange(copies) * len(mesh.points)
+    connects = (mesh.connects[None, :] + offsets[:, None]).ravel()
+    return SnowMesh(points, np.tile(mesh.counts, copies), connects)
+
+def build_branch(seed, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function builds the 1/6 snow piece.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, level, origin: see level_matrices
+
+    Returns:
+        SnowMesh
+    '''
+    return instance_mesh(seed, level_matrices(seed.points, to_point_index, scale, angle, level, origin))
+
+def build_flake(seed, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function builds the whole snow piece, 6 rotated copies of the 1/6 snow piece.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, level, origin: see level_matrices
+
+    Returns:
+        SnowMesh
+    '''
+    mats = level_matrices(seed.points, to_point_index, scale, angle, level, origin)
+    mats = np.matmul(arm_matrices()[:, None], mats[None, :]).reshape(-1, 4, 4)
+    return instance_mesh(seed, mats)
+
+def build_flake_instanced(seed, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function builds the 1/6 snow piece once and keeps the 6 parts as instances of it.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, level, origin: see level_matrices
+
+    Returns:
+        SnowInstances, expand it with expand_instances when real geometry is needed
+    '''
+    return SnowInstances(build_branch(seed, to_point_index, scale, angle, level, origin), arm_matrices())
+
+def expand_instances(instances):
+    ### turn the instances into one mesh with real geometry
+    return instance_mesh(instances.prototype, instances.matrices)
+
+class FlakeBuilder(object):
+    '''
+    Whole snow piece that keeps the geometry of every level, so changing the level
+    only builds the new levels or trims the old ones.
+
+    The points are stored level by level, each level holding its 6 parts, so the
+    snow piece of any level is a prefix of the buffers. The welded snow piece is kept
+    the same way, every new level is welded only against itself and the level before.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, origin: see level_matrices
+    '''
+
+    def __init__(self, seed, to_point_index, scale, angle, origin = None):
+        self.seed = seed
+        self.to_point_index = to_point_index
+        self.scale = scale
+        self.angle = angle
+        self.origin = origin
+        self.level = 0
+        self.built = 0
+        self.translates = np.zeros((0, 3))
+        self._reserve(1)
+        self._reset_weld(None)
+
+    def matches(self, seed, to_point_index, scale, angle, origin = None):
+        ### whether this builder can be reused for these parameters
+        same_origin = (self.origin is None and origin is None) or \
+                      (self.origin is not None and origin is not None and np.allclose(self.origin, origin))
+        return (same_origin and self.to_point_index == to_point_index and
+                self.scale == scale and self.angle == angle and
+                np.array_equal(self.seed.points, seed.points) and
+                np.array_equal(self.seed.counts, seed.counts) and
+                np.array_equal(self.seed.connects, seed.connects))
+
+    def set_level(self, level):
+        '''
+        This function moves the snow piece to a new level.
+
+        Raising the level builds only the new levels, lowering it only trims.
+
+        Args:
+            level: number of levels
+        '''
+        level = max(int(level), 1)
+        if level > self.built:
+            self._grow(level)
+        self.level = level
+
+    def adopt(self, mesh, level):
+        '''
+        This function takes a snow piece built in the layout of this builder, like one
+        from the cache, as its built levels.
+
+        Args:
+            mesh: SnowMesh of build_flake_levels for the parameters of this builder
+            level: number of levels of the mesh
+        '''
+        level = max(int(level), 1)
+        self.built = 0
+        self._reserve(level)
+        vertex_count = len(self.seed.points)
+        self.points[:level] = mesh.points.reshape(level, ARM_COUNT, vertex_count, 3)
+        self.counts[:level] = mesh.counts.reshape(level, ARM_COUNT, -1)
+        self.connects[:level] = mesh.connects.reshape(level, ARM_COUNT, -1)
+        if self.origin is not None:
+            self.translates[0] = self.origin
+        self.translates[1:level] = follow_to_point(self.seed.points, self.to_point_index, self.scale, self.angle, np.arange(1, level), self.translates[0])
+        self.built = level
+        self.level = level
+        self._reset_weld(None)
+
+    def mesh(self):
+        ### the snow piece of the current level, views of the level buffers
+        return SnowMesh(self.points[:self.level].reshape(-1, 3),
+                        self.counts[:self.level].ravel(),
+                        self.connects[:self.level].ravel())
+
+    def welded_mesh(self, tolerance = 1e-5):
+        '''
+        This function welds the snow piece of the current level like weld_mesh.
+
+        Only the levels not welded yet are welded, each one against itself and the
+        kept vertices of the level before, which hold the seam between them. A new
+        vertex welds into a kept vertex but never joins two kept vertices, so the
+        welded snow piece of a lower level stays a prefix of the higher one.
+
+        Args:
+            tolerance: the largest distance between two merged vertices
+
+        Returns:
+            (SnowMesh, report), see weld_mesh
+        '''
+        tolerance = float(tolerance)
+        if tolerance != self.weld_tolerance:
+            self._reset_weld(tolerance)
+        while len(self.weld_points) < self.level:
+            self._weld_level(len(self.weld_points))
+
+        level = self.level
+        counts = np.concatenate(self.weld_counts[:level])
+        connects = np.concatenate(self.weld_connects[:level])
+        report = {'vertices_before': self.points[:level, :, :, 0].size,
+                  'vertices_after': sum(len(p) for p in self.weld_points[:level]),
+                  'faces_before': self.counts[:level].size,
+                  'faces_after': len(counts),
+                  'degenerate_faces': sum(self.weld_dropped[:level]),
+                  'non_manifold_edges': non_manifold_edges(counts, connects)}
+        return SnowMesh(np.concatenate(self.weld_points[:level]), counts, connects), report
+
+    def _reset_weld(self, tolerance):
+        ### the welded levels, one array of kept points, counts and connects per level
+        self.weld_tolerance = tolerance
+        self.weld_points = []
+        self.weld_counts = []
+        self.weld_connects = []
+        self.weld_dropped = []
+
+    def _weld_level(self, step):
+        ### the kept vertices of the level before come first, so new vertices weld into them
+        seam = self.weld_points[step-1] if step else np.zeros((0, 3))
+        seam_start = sum(len(p) for p in self.weld_points[:step-1]) if step else 0
+        start = seam_start + len(seam)
+        points = self.points[step].reshape(-1, 3)
+        groups = weld_groups(np.concatenate([seam, points]), self.weld_tolerance)[len(seam):]
+        own = np.arange(len(seam), len(seam) + len(points))
+        kept = np.flatnonzero(groups == own)
+        remap = np.where(groups < len(seam), seam_start + groups, start + np.searchsorted(kept + len(seam), groups))
+
+        local = self.connects[step].ravel() - step * len(points)
+        counts, connects, dropped = clean_faces(self.counts[step].ravel(), remap[local])
+        self.weld_points.append(points[kept])
+        self.weld_counts.append(counts)
+        self.weld_connects.append(connects)
+        self.weld_dropped.append(dropped)
+
+    def _reserve(self, level):
+        ### level buffers grow by doubling, so raising the level is amortized O(new levels)
+        capacity = max(level, 2 * len(self.translates))
+        vertex_count = len(self.seed.points)
+        buffers = (('translates', (capacity, 3), np.float64),
+                   ('points', (capacity, ARM_COUNT, vertex_count, 3), np.float64),
+                   ('counts', (capacity, ARM_COUNT, len(self.seed.counts)), np.int64),
+                   ('connects', (capacity, ARM_COUNT, len(self.seed.connects)), np.int64))
+        for name, shape, dtype in buffers:
+            buffer = np.zeros(shape, dtype = dtype)
+            if self.built:
+                buffer[:self.built] = getattr(self, name)[:self.built]
+            setattr(self, name, buffer)
+
+    def _grow(self, level):
+        if level > len(self.translates):
+            self._reserve(level)
+        built = self.built
+        steps = np.arange(built, level)
+        rotate_scale = rotate_scale_matrices(self.scale, self.angle, steps)
+
+        ### translation of the new levels, starting from the last built one
+        translates = self.translates[built:level]
+        if built == 0:
+            if self.origin is not None:
+                translates[0] = self.origin
+            translates[1:] = follow_to_point(self.seed.points, self.to_point_index, self.scale, self.angle, steps[1:], translates[0])
+        else:
+            translates[:] = follow_to_point(self.seed.points, self.to_point_index, self.scale, self.angle, steps, self.translates[built-1])
+
+        ### every new level holds its 6 parts
+        mats = np.matmul(arm_matrices()[None, :], np.matmul(translate_matrices(translates), rotate_scale)[:, None])
+        vertex_count = len(self.seed.points)
+        self.points[built:level] = transform_points(mats.reshape(-1, 4, 4), self.seed.points).reshape(len(steps), ARM_COUNT, vertex_count, 3)
+        offsets = (steps[:, None] * ARM_COUNT + np.arange(ARM_COUNT)[None, :]) * vertex_count
+        self.connects[built:level] = self.seed.connects[None, None, :] + offsets[:, :, None]
+        self.counts[built:level] = self.seed.counts
+        self.built = level
+
+def build_flake_levels(seed, to_point_index, scale, angle, level, origin = None):
+    '''
+    This function builds the whole snow piece level by level, in the layout of FlakeBuilder.
+
+    It has the same geometry as build_flake, but the points and faces are ordered
+    level first, so the snow piece of a lower level is a prefix of its buffers.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, level, origin: see level_matrices
+
+    Returns:
+        SnowMesh
+    '''
+    builder = FlakeBuilder(seed, to_point_index, scale, angle, origin)
+    builder.set_level(level)
+    return SnowMesh(*[a.copy() for a in builder.mesh()])
+
+def triangle_count(mesh):
+    ### number of triangles of the mesh once its faces are triangulated
+    return int(np.maximum(mesh.counts - 2, 0).sum())
+
+def billboard_mesh(mesh, samples = 32):
+    '''
+    This function makes a quadrilateral on the y plane that covers the whole mesh.
+
+    The error bounds the distance between the quadrilateral and the mesh both ways:
+    every vertex is at most its height away from the quadrilateral, and every point
+    of the quadrilateral is at most the distance of the nearest vertex to the nearest
+    of samples x samples grid points, plus half a grid cell diagonal, from the mesh.
+
+    Args:
+        mesh: SnowMesh to cover
+        samples: grid points along each side of the quadrilateral
+
+    Returns:
+        (SnowMesh, error)
+    '''
+    low = mesh.points.min(axis = 0)
+    high = mesh.points.max(axis = 0)
+    center = (low + high) / 2
+    half = max(high[0] - low[0], high[2] - low[2]) / 2
+    points = [(center[0] - half, center[1], center[2] - half),
+              (center[0] - half, center[1], center[2] + half),
+              (center[0] + half, center[1], center[2] + half),
+              (center[0] + half, center[1], center[2] - half)]
+    height_error = float(np.abs(mesh.points[:, 1] - center[1]).max())
+
+    ### grid points at the cell centers, every point of the quadrilateral is within half a cell diagonal of one
+    cell = 2.0 * half / samples
+    axis = (np.arange(samples) + 0.5) * cell - half
+    x, z = np.meshgrid(center[0] + axis, center[2] + axis)
+    grid = np.stack([x.ravel(), np.full(x.size, center[1]), z.ravel()], axis = 1)
+    nearest = np.empty(len(grid))
+    chunk = max(1, 2 ** 22 // max(len(mesh.points), 1))
+    for start in range(0, len(grid), chunk):
+        offsets = grid[start:start + chunk, None, :] - mesh.points[None, :, :]
+        nearest[start:start + chunk] = np.sqrt((offsets ** 2).sum(axis = 2).min(axis = 1))
+    cover_error = float(nearest.max()) + cell * np.sqrt(2.0) / 2.0
+    return make_mesh(points, [4], [0, 1, 2, 3]), float(max(height_error, cover_error))
+
+def build_lod_chain(seed, to_point_index, scale, angle, level, origin = None, reduced_level = None):
+    '''
+    This function builds the levels of detail of a snow piece in one run.
+
+    Args:
+        seed: SnowMesh of the seed, points relative to the seed origin
+        to_point_index, scale, angle, level, origin: see level_matrices
+        reduced_level: level of the reduced snow piece, half of level by default
+
+    Returns:
+        list of SnowLod: full level, reduced level, billboard quadrilateral
+    '''
+    full = build_flake_levels(seed, to_point_index, scale, angle, level, origin)
+    return lod_chain(full, seed, to_point_index, level, reduced_level)
+
+def lod_chain(full, seed, to_point_index, level, reduced_level = None):
+    '''
+    This function makes the levels of detail of an already built snow piece.
+
+    The reduced snow piece keeps the first levels of the full one, so every removed
+    vertex is at most as far from the geometry as it is from the destination point
+    of the last kept level, which gives its error bound.
+
+    Args:
+        full: SnowMesh of the whole snow piece ordered level by level, as build_flake_levels makes it
+        seed: SnowMesh of the seed the snow piece was built from
+        to_point_index: index of the destination point
+        level: level of the snow piece
+        reduced_level: level of the reduced snow piece, half of level by default
+
+    Returns:
+        list of SnowLod: full level, reduced level, billboard quadrilateral
+    '''
+    level = max(int(level), 1)
+    if reduced_level is None:
+        reduced_level = (level + 1) // 2
+    reduced_level = min(max(int(reduced_level), 1), level)
+
+    ### the snow piece of a lower level is a prefix of the level ordered buffers
+    kept = reduced_level * ARM_COUNT
+    reduced = SnowMesh(full.points[:kept * len(seed.points)].copy(),
+                       full.counts[:kept * len(seed.counts)].copy(),
+                       full.connects[:kept * len(seed.connects)].copy())
+
+    ### the 6 parts are the same, so the removed levels of the first part are enough
+    levels = full.points.reshape(level, ARM_COUNT, len(seed.points), 3)
+    removed = levels[reduced_level:level, 0].reshape(-1, 3)
+    if len(removed):
+        tip = levels[reduced_level-1, 0, to_point_index]
+        reduced_error = float(np.sqrt(((removed - tip) ** 2).sum(axis = 1)).max())
+    else:
+        reduced_error = 0.0
+    billboard, billboard_error = billboard_mesh(full)
+
+    return [SnowLod('full', level, full, triangle_count(full), 0.0),
+            SnowLod('reduced', reduced_level, reduced, triangle_count(reduced), reduced_error),
+            SnowLod('billboard', 0, billboard, triangle_count(billboard), billboard_error)]
+
+def cell_keys(cells):
+    '''
+    This function packs integer (x, y, z) cells into sortable int64 keys.
+
+    The cells are packed exactly when the grid fits into 62 bits, then the key of
+    the neighbour cell (i, j, k) of any cell is its own key plus one shift. A larger
+    grid is hashed, and different cells may then share a key.
+
+    Args:
+        cells: int64 array of shape (n, 3)
+
+    Returns:
+        (keys, function giving the keys of the neighbour cells at an offset)
+    '''
+    if len(cells) == 0:
+        return np.zeros(0, dtype = np.int64), lambda offset: np.zeros(0, dtype = np.int64)
+    ### one cell of padding around the grid, so no neighbour wraps around to the other side
+    low = cells.min(axis = 0) - 1
+    size = cells.max(axis = 0) - low + 2
+    if float(size[0]) * float(size[1]) * float(size[2]) < 2.0 ** 62:
+        strides = np.array([size[1] * size[2], size[2], 1], dtype = np.int64)
+        keys = ((cells - low) * strides).sum(axis = 1)
+        return keys, lambda offset: keys + int(np.dot(offset, strides))
+    def hashed(offset):
+        shifted = (cells + np.array(offset, dtype = np.int64)).astype(np.uint64)
+        with np.errstate(over = 'ignore'):
+            hashes = (shifted[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ shifted[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F) ^
+                      shifted[:, 2] * np.uint64(0x165667B19E3779F9))
+        return hashes.view(np.int64)
+    return hashed((0, 0, 0)), hashed
+
+def weld_groups(points, tolerance):
+    '''
+    This function finds the vertex every vertex is welded into.
+
+    The vertices are keyed by their tolerance sized cell and the occupied cells are
+    sorted, so the neighbour cells of all cells are found with one binary search per
+    neighbour offset. Vertices closer than tolerance, and chains of such vertices,
+    weld into the first one of them.
+
+    Args:
+        points: vertex positions, shape (n, 3)
+        tolerance: the largest distance between two welded vertices
+
+    Returns:
+        int64 array, the index of the vertex every vertex is welded into
+    '''
+    count = len(points)
+    keys, neighbour_keys = cell_keys(np.floor(points / tolerance).astype(np.int64))
+    cell_list, cell_of, cell_size = np.unique(keys, return_inverse = True, return_counts = True)
+    cell_of = cell_of.ravel()
+    order = np.argsort(cell_of, kind = 'mergesort')
+    cell_start = np.cumsum(cell_size) - cell_size
+    first = order[cell_start]
+
+    ### the own cell and the 13 neighbour offsets after it, each pair of cells is met once
+    offsets = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)][13:]
+    pairs_a = []
+    pairs_b = []
+    for offset in offsets:
+        wanted = neighbour_keys(offset)[first]
+        found = np.minimum(np.searchsorted(cell_list, wanted), len(cell_list) - 1)
+        neighbour = np.where(cell_list[found] == wanted, found, -1)[cell_of]
+        a = np.flatnonzero(neighbour >= 0)
+        cells = neighbour[a]
+        sizes = cell_size[cells]
+        starts = np.cumsum(sizes) - sizes
+        b = order[np.repeat(cell_start[cells], sizes) + np.arange(sizes.sum()) - np.repeat(starts, sizes)]
+        a = np.repeat(a, sizes)
+        close = ((points[a] - points[b]) ** 2).sum(axis = 1) <= tolerance * tolerance
+        if offset == (0, 0, 0):
+            close &= b < a
+        pairs_a.append(a[close])
+        pairs_b.append(b[close])
+    a = np.concatenate(pairs_a) if pairs_a else np.zeros(0, dtype = np.int64)
+    b = np.concatenate(pairs_b) if pairs_b else np.zeros(0, dtype = np.int64)
+
+    ### every vertex takes the smallest index of its group, by label propagation and pointer jumping
+    labels = np.arange(count)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, a, labels[b])
+        np.minimum.at(labels, b, labels[a])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+def clean_faces(counts, connects):
+    '''
+    This function removes what welding left degenerate from the faces.
+
+    Repeated consecutive vertices of a face are merged, a face pinched at a vertex it
+    goes through twice is split into its loops, and loops of less than 3 distinct
+    vertices are dropped.
+
+    Args:
+        counts: number of vertices of every face
+        connects: vertex indices of all faces, face after face
+
+    Returns:
+        (counts, connects, number of faces dropped)
+    '''
+    faces = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    ### the corner before every corner of its face, the first one wraps around to the last
+    before = np.arange(len(connects)) - 1
+    before[starts[counts > 0]] += counts[counts > 0]
+    keep = connects != connects[before]
+    faces = faces[keep]
+    connects = connects[keep]
+    counts = np.bincount(faces, minlength = len(counts))
+
+    ### faces that still go through a vertex twice are rare, they are split one by one
+    order = np.lexsort((connects, faces))
+    repeated = np.zeros(len(counts), dtype = bool)
+    same = (faces[order][1:] == faces[order][:-1]) & (connects[order][1:] == connects[order][:-1])
+    repeated[faces[order][1:][same]] = True
+    starts = np.cumsum(counts) - counts
+    piece_faces = [np.flatnonzero(~repeated & (counts >= 3))]
+    piece_counts = [counts[piece_faces[0]]]
+    piece_connects = [connects[~repeated[faces] & (counts[faces] >= 3)]]
+    split_faces = []
+    split_counts = []
+    split_connects = []
+    for face in np.flatnonzero(repeated).tolist():
+        for loop in split_loops(connects[starts[face]:starts[face] + counts[face]].tolist()):
+            if len(set(loop)) >= 3:
+                split_faces.append(face)
+                split_counts.append(len(loop))
+                split_connects.extend(loop)
+    piece_faces.append(np.array(split_faces, dtype = np.int64))
+    piece_counts.append(np.array(split_counts, dtype = np.int64))
+    piece_connects.append(np.array(split_connects, dtype = np.int64))
+    piece_faces = np.concatenate(piece_faces)
+    piece_counts = np.concatenate(piece_counts)
+    piece_connects = np.concatenate(piece_connects)
+    dropped = len(counts) - len(np.unique(piece_faces))
+
+    ### the loops of a split face take its place in the face order
+    order = np.argsort(piece_faces, kind = 'mergesort')
+    piece_starts = np.cumsum(piece_counts) - piece_counts
+    new_counts = piece_counts[order]
+    corners = np.repeat(piece_starts[order], new_counts) + np.arange(new_counts.sum()) - np.repeat(np.cumsum(new_counts) - new_counts, new_counts)
+    return new_counts, piece_connects[corners], dropped
+
+def split_loops(face):
+    ### split a face at the vertices it goes through twice, into loops that do not
+    loops = []
+    stack = []
+    for vertex in face:
+        if vertex in stack:
+            index = stack.index(vertex)
+            loops.append(stack[index:])
+            stack = stack[:index]
+        stack.append(vertex)
+    loops.append(stack)
+    return loops
+
+def non_manifold_edges(counts, connects):
+    ### number of edges shared by more than two faces
+    if len(connects) == 0:
+        return 0
+    starts = np.cumsum(counts) - counts
+    after = np.arange(len(connects)) + 1
+    after[starts + counts - 1] = starts
+    low = np.minimum(connects, connects[after])
+    high = np.maximum(connects, connects[after])
+    edges, uses = np.unique(low * (int(connects.max()) + 1) + high, return_counts = True)
+    return int((uses > 2).sum())
+
+def weld_mesh(mesh, tolerance = 1e-5):
+    '''
+    This function merges the vertices that are closer than tolerance.
+
+    The vertices are grouped by weld_groups in O(n) expected time, then clean_faces
+    removes the faces welding collapsed. Edges shared by more than two faces can not
+    be fixed by welding, the report counts them.
+
+    Args:
+        mesh: SnowMesh to weld
+        tolerance: the largest distance between two merged vertices
+
+    Returns:
+        (SnowMesh, report), the report holds the vertex and face counts before and after,
+        the degenerate faces dropped and the non manifold edges left
+    '''
+    groups = weld_groups(mesh.points, float(tolerance))
+    kept = np.flatnonzero(groups == np.arange(len(groups)))
+    remap = np.searchsorted(kept, groups)
+    counts, connects, dropped = clean_faces(mesh.counts, remap[mesh.connects])
+
+    report = {'vertices_before': len(mesh.points),
+              'vertices_after': len(kept),
+              'faces_before': len(mesh.counts),
+              'faces_after': len(counts),
+              'degenerate_faces': dropped,
+              'non_manifold_edges': non_manifold_edges(counts, connects)}
+    return make_mesh(mesh.points[kept], counts, connects), report
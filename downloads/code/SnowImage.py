@@ -0,0 +1,163 @@
+"""
+SnowImage.py
+
+Reading and writing images of the snow tools as PNG files, with zlib from
+the standard library only, so maps and textures can be made without Maya or
+an image library.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import struct
+import zlib
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+## PNG color type of each channel count
+COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+CHANNELS = dict([(colorType, channels) for channels, colorType in COLOR_TYPES.items()] + [(3, 1)])
+
+def pngChunk(kind, data):
+    ### length, type, data and crc of the type and data
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+def unfilterRows(data, height, stride, bpp):
+    ### undo the per row filters of the PNG scanlines
+    rows = np.frombuffer(data, dtype = np.uint8).reshape(height, stride + 1)
+    kinds = rows[:, 0]
+    if kinds.max() > 4:
+        raise ValueError('Unknown PNG filter type %d' % kinds.max())
+    if kinds.max() >= 3:
+        return unfilterDiagonals(rows[:, 1:], kinds, bpp)
+    image = np.zeros((height, stride), dtype = np.uint8)
+    previous = np.zeros(stride, dtype = np.int64)
+    for y in range(height):
+        kind = kinds[y]
+        line = rows[y, 1:].astype(np.int64)
+        if kind == 0:
+            current = line
+        elif kind == 1:
+            ### sub, a running sum of every byte column of the pixels
+            current = np.cumsum(np.concatenate([line, np.zeros((-stride) % bpp, np.int64)]).reshape(-1, bpp), axis = 0).ravel()[:stride]
+        else:
+            current = line + previous
+        previous = current & 0xff
+        image[y] = previous
+    return image
+
+def unfilterDiagonals(lines, kinds, bpp):
+    '''
+    This function undoes the PNG filters of an image with average or paeth rows.
+
+    A byte of those filters depends on the decoded bytes left of it, above it and
+    above left of it, so the pixels are decoded one anti-diagonal at a time: all
+    pixels of a diagonal only need the two diagonals before it, and each step
+    works on a whole diagonal with numpy.
+
+    Args:
+        lines: filtered scanlines without their filter type bytes, shape (height, stride)
+        kinds: filter type of every scanline
+        bpp: bytes of one pixel
+
+    Returns:
+        uint8 array of shape (height, stride)
+    '''
+    height, stride = lines.shape
+    width = stride // bpp
+    filtered = lines.reshape(height, width, bpp).astype(np.int16)
+    ### decoded bytes with a row and a column of zeros before the image, the left and up of its border
+    decoded = np.zeros((height + 1, width + 1, bpp), dtype = np.int16)
+    for diagonal in range(height + width - 1):
+        y = np.arange(max(0, diagonal - width + 1), min(height - 1, diagonal) + 1)
+        x = diagonal - y
+        left = decoded[y + 1, x]
+        up = decoded[y, x + 1]
+        upLeft = decoded[y, x]
+        ### paeth takes the neighbour closest to left + up - upLeft, ties go to left, then up
+        pa = np.abs(up - upLeft)
+        pb = np.abs(left - upLeft)
+        pc = np.abs(left + up - 2 * upLeft)
+        paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upLeft))
+        kind = kinds[y][:, None]
+        guess = np.where(kind == 1, left, np.where(kind == 2, up, np.where(kind == 3, (left + up) >> 1,
+                                                                            np.where(kind == 4, paeth, 0))))
+        decoded[y + 1, x + 1] = (filtered[y, x] + guess) & 0xff
+    return decoded[1:, 1:].reshape(height, stride).astype(np.uint8)
+
+def readPng(path):
+    '''
+    This function reads a PNG file of 8 or 16 bit samples, palettes become RGB or RGBA.
+
+    Args:
+        path: the PNG file path
+
+    Returns:
+        uint8 or uint16 array of shape (height, width, channels), first row on top
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError('%s is not a PNG file' % path)
+    chunks = {}
+    position = 8
+    while position < len(data):
+        length, = struct.unpack('>I', data[position:position + 4])
+        kind = data[position + 4:position + 8]
+        chunks.setdefault(kind, []).append(data[position + 8:position + 8 + length])
+        position += length + 12
+    width, height, depth, colorType, compression, filtering, interlace = struct.unpack('>IIBBBBB', chunks[b'IHDR'][0])
+    if depth not in (8, 16) or interlace or colorType not in CHANNELS:
+        raise ValueError('%s: only non interlaced 8 and 16 bit PNG files are supported' % path)
+
+    channels = CHANNELS[colorType]
+    bpp = channels * depth // 8
+    rows = unfilterRows(zlib.decompress(b''.join(chunks[b'IDAT'])), height, width * bpp, bpp)
+    if depth == 16:
+        pixels = rows.view('>u2').astype(np.uint16).reshape(height, width, channels)
+    else:
+        pixels = rows.reshape(height, width, channels)
+    if colorType == 3:
+        palette = np.frombuffer(chunks[b'PLTE'][0], dtype = np.uint8).reshape(-1, 3)
+        if b'tRNS' in chunks:
+            alpha = np.full(len(palette), 255, dtype = np.uint8)
+            transparency = np.frombuffer(chunks[b'tRNS'][0], dtype = np.uint8)
+            alpha[:len(transparency)] = transparency
+            palette = np.concatenate([palette, alpha[:, None]], axis = 1)
+        pixels = palette[pixels[:, :, 0]]
+    return pixels
+
+def writePng(path, pixels):
+    '''
+    This function writes an image as a PNG file.
+
+    Args:
+        path: the PNG file path
+        pixels: uint8 or uint16 array of shape (height, width) or (height, width, channels),
+            with 1 to 4 channels, first row on top
+    '''
+    pixels = np.asarray(pixels)
+    if pixels.dtype not in (np.uint8, np.uint16):
+        raise ValueError('PNG pixels must be uint8 or uint16, not %s' % pixels.dtype)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width, channels = pixels.shape
+    if channels not in COLOR_TYPES:
+        raise ValueError('PNG images have 1 to 4 channels, not %d' % channels)
+
+    ### every row starts with filter type 0, samples are big endian
+    rows = np.ascontiguousarray(pixels, dtype = pixels.dtype.newbyteorder('>')).reshape(height, -1).view(np.uint8)
+    raw = np.zeros((height, rows.shape[1] + 1), dtype = np.uint8)
+    raw[:, 1:] = rows
+    header = struct.pack('>IIBBBBB', width, height, pixels.dtype.itemsize * 8, COLOR_TYPES[channels], 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        f.write(pngChunk(b'IHDR', header))
+        f.write(pngChunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(pngChunk(b'IEND', b''))
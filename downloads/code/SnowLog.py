@@ -0,0 +1,165 @@
+"""
+SnowLog.py
+
+Logging that stays off the Maya UI thread. A log call only puts its record
+on a queue; a background thread takes the records off in batches, writes
+them to a rotating log file and flushes once per batch. The file is opened
+with the first record, so setting the logging up does no I/O.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+LOG_FORMAT = '%(asctime)s, module=%(module)s, message=%(message)s'
+
+class BatchFileHandler(logging.handlers.RotatingFileHandler):
+    '''
+    Rotating log file, opened on the first record, that only flushes when told to.
+
+    Args:
+        filename: the log file
+        maxBytes: size of the file before it rotates
+        backupCount: number of rotated files kept
+    '''
+
+    def __init__(self, filename, maxBytes = 0, backupCount = 0):
+        logging.handlers.RotatingFileHandler.__init__(self, filename, maxBytes = maxBytes, backupCount = backupCount, delay = True)
+
+    def flush(self):
+        ### records are flushed by flushBatch, not one by one
+        pass
+
+    def flushBatch(self):
+        logging.handlers.RotatingFileHandler.flush(self)
+
+    def close(self):
+        self.flushBatch()
+        logging.handlers.RotatingFileHandler.close(self)
+
+class QueueHandler(logging.Handler):
+    '''
+    Handler whose emit only formats the message and queues the record for a background writer thread.
+
+    Args:
+        target: the handler writing the records, a BatchFileHandler
+        batchSize: most records written between two flushes
+    '''
+
+    def __init__(self, target, batchSize = 64):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.batchSize = batchSize
+        self.queue = queue.Queue()
+        self.thread = None
+        self.threadLock = threading.Lock()
+
+    def prepare(self, record):
+        ### format on the calling thread, the args may be Maya objects the writer must not touch
+        message = self.format(record)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def emit(self, record):
+        if self.thread is None:
+            self._startWriter()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        ### wait until the writer has written everything queued so far
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        ### stop the writer after the records still queued
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.target.close()
+        logging.Handler.close(self)
+
+    def _startWriter(self):
+        with self.threadLock:
+            if self.thread is None:
+                thread = threading.Thread(target = self._write, name = 'SnowLogWriter')
+                thread.daemon = True
+                thread.start()
+                self.thread = thread
+                atexit.register(self.close)
+
+    def _write(self):
+        ### block for one record, then take what else is queued and write it all with one flush
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                    continue
+                try:
+                    self.target.handle(record)
+                except Exception:
+                    self.target.handleError(record)
+            try:
+                self.target.flushBatch()
+            except Exception:
+                pass
+            for record in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+def fileLogger(name, filename, level = logging.INFO, maxBytes = 100000):
+    '''
+    This function sets a logger up to write to a file through a QueueHandler.
+
+    Setting the same logger up again, as reloading a module does, replaces its
+    old queue handler instead of adding a second one.
+
+    Args:
+        name: the logger name
+        filename: the log file, opened with the first record
+        level: the logger level, records below it cost only the level check
+        maxBytes: size of the file before it rotates
+
+    Returns:
+        the logger
+    '''
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    target = BatchFileHandler(filename, maxBytes = maxBytes)
+    target.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(QueueHandler(target))
+    logger.setLevel(level)
+    return logger
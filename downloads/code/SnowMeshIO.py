@@ -0,0 +1,104 @@
+"""
+SnowMeshIO.py
+
+Reading and writing SnowGeometry meshes as OBJ and PLY files, so snow pieces
+can be generated and exported without Maya.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabaixuan@gmail.com"
+__status__ = "Practise"
+
+"""
+
+import os
+import numpy as np
+import SnowGeometry
+
+MESH_FORMATS = ('obj', 'ply')
+
+def read_obj(path):
+    '''
+    This function reads the points and faces of an OBJ file.
+
+    Args:
+        path: the OBJ file path
+
+    Returns:
+        SnowMesh
+    '''
+    points = []
+    counts = []
+    connects = []
+    with open(path, 'r') as f:
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == 'v':
+                points.append([float(w) for w in words[1:4]])
+            elif words[0] == 'f':
+                ### keep only the vertex index of 'v/vt/vn', negative indices count from the end
+                face = [int(w.split('/')[0]) for w in words[1:]]
+                counts.append(len(face))
+                connects.extend([i - 1 if i > 0 else len(points) + i for i in face])
+    return SnowGeometry.make_mesh(points, counts, connects)
+
+def write_obj(path, mesh):
+    '''
+    This function writes a mesh as an OBJ file.
+
+    Args:
+        path: the OBJ file path
+        mesh: SnowMesh to write
+    '''
+    starts = np.concatenate([[0], np.cumsum(mesh.counts)])
+    indices = (mesh.connects + 1).astype(str)
+    with open(path, 'w') as f:
+        f.write('# %d vertices, %d faces\n' % (len(mesh.points), len(mesh.counts)))
+        np.savetxt(f, mesh.points, fmt = 'v %.6f %.6f %.6f')
+        f.write(''.join(['f %s\n' % ' '.join(indices[starts[i]:starts[i+1]]) for i in range(len(mesh.counts))]))
+
+def write_ply(path, mesh):
+    '''
+    This function writes a mesh as a binary little endian PLY file.
+
+    Args:
+        path: the PLY file path
+        mesh: SnowMesh to write
+    '''
+    header = ('ply\n'
+              'format binary_little_endian 1.0\n'
+              'element vertex %d\n'
+              'property float x\n'
+              'property float y\n'
+              'property float z\n'
+              'element face %d\n'
+              'property list uchar int vertex_indices\n'
+              'end_header\n' % (len(mesh.points), len(mesh.counts)))
+
+    ### every face is one count byte followed by its 4 byte indices
+    face_sizes = 1 + 4 * mesh.counts
+    face_starts = np.concatenate([[0], np.cumsum(face_sizes)[:-1]])
+    corners = np.arange(len(mesh.connects)) - np.repeat(np.cumsum(mesh.counts) - mesh.counts, mesh.counts)
+    index_starts = np.repeat(face_starts + 1, mesh.counts) + 4 * corners
+    faces = np.zeros(int(face_sizes.sum()), dtype = np.uint8)
+    faces[face_starts] = mesh.counts
+    faces[index_starts[:, None] + np.arange(4)] = mesh.connects.astype('<i4').view(np.uint8).reshape(-1, 4)
+
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(mesh.points.astype('<f4').tobytes())
+        f.write(faces.tobytes())
+
+def write_mesh(path, mesh):
+    ### write a mesh, the format comes from the file extension
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == 'obj':
+        write_obj(path, mesh)
+    elif ext == 'ply':
+        write_ply(path, mesh)
+    else:
+        raise ValueError('Unsupported mesh format: %s' % path)
@@ -0,0 +1,182 @@
+"""
+SnowParticleCache.py
+
+Streaming on-disk cache of baked SnowSim frames. Every particle attribute is
+written to its own raw column file, split into chunks of frames, and a small
+index tells where each frame starts. Baking only ever holds the frame being
+written, and playback memory maps the chunks, so any frame is found with one
+index lookup and read without copying.
+
+layout of a cache folder:
+    header.json: attribute names, dtypes and shapes, frames per chunk
+    index.bin: per frame (chunk, first particle in the chunk, particle count), int64
+    <attribute>.<chunk>.bin: the attribute of all particles of the frames of that chunk
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import json
+import os
+import numpy as np
+
+HEADER_FILE = 'header.json'
+INDEX_FILE = 'index.bin'
+BAKE_ATTRIBUTES = ('particleId', 'position', 'velocity', 'radius', 'spriteTwist', 'spriteNum')
+
+def chunkFile(path, name, chunk):
+    return os.path.join(path, '%s.%d.bin' % (name, chunk))
+
+class CacheWriter(object):
+    '''
+    Writes frames of particle arrays one after the other.
+
+    Args:
+        path: the cache folder
+        attributes: list of (name, shape of one entry, dtype)
+        framesPerChunk: number of frames in one chunk file
+    '''
+
+    def __init__(self, path, attributes, framesPerChunk = 100):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.attributes = [(name, tuple(shape), np.dtype(dtype)) for name, shape, dtype in attributes]
+        self.framesPerChunk = int(framesPerChunk)
+        self.frameCount = 0
+        self.chunk = -1
+        self.chunkParticles = 0
+        self.files = {}
+
+        header = {'framesPerChunk': self.framesPerChunk,
+                  'attributes': [[name, list(shape), dtype.str] for name, shape, dtype in self.attributes]}
+        with open(os.path.join(path, HEADER_FILE), 'w') as f:
+            json.dump(header, f, indent = 2)
+        self.index = open(os.path.join(path, INDEX_FILE), 'wb')
+
+    def writeFrame(self, arrays):
+        '''
+        This function appends one frame to the cache.
+
+        Args:
+            arrays: dictionary of attribute name to array, all with the same particle count
+        '''
+        if self.frameCount % self.framesPerChunk == 0:
+            self._startChunk(self.frameCount // self.framesPerChunk)
+
+        count = None
+        for name, shape, dtype in self.attributes:
+            data = np.ascontiguousarray(arrays[name], dtype = dtype)
+            if data.shape[1:] != shape:
+                raise ValueError('Attribute %s has shape %s, expected %s' % (name, data.shape[1:], shape))
+            if count is None:
+                count = len(data)
+            elif len(data) != count:
+                raise ValueError('Attribute %s has %d particles, expected %d' % (name, len(data), count))
+            self.files[name].write(data.tobytes())
+
+        ### the frame data reaches the files before its index entry does
+        for f in self.files.values():
+            f.flush()
+        self.index.write(np.array([self.chunk, self.chunkParticles, count], dtype = '<i8').tobytes())
+        self.index.flush()
+        self.chunkParticles += count
+        self.frameCount += 1
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self.index.close()
+
+    def _startChunk(self, chunk):
+        for f in self.files.values():
+            f.close()
+        self.chunk = chunk
+        self.chunkParticles = 0
+        self.files = dict([(name, open(chunkFile(self.path, name, chunk), 'wb')) for name, shape, dtype in self.attributes])
+
+class CacheReader(object):
+    '''
+    Plays a cache back through memory maps.
+
+    Args:
+        path: the cache folder
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE), 'r') as f:
+            header = json.load(f)
+        self.framesPerChunk = header['framesPerChunk']
+        self.attributes = [(name, tuple(shape), np.dtype(dtype)) for name, shape, dtype in header['attributes']]
+        ### the index only holds complete frames, so a bake still running can be read
+        indexSize = os.path.getsize(os.path.join(path, INDEX_FILE)) // 24
+        if indexSize:
+            self.index = np.memmap(os.path.join(path, INDEX_FILE), dtype = '<i8', mode = 'r', shape = (indexSize, 3))
+        else:
+            self.index = np.zeros((0, 3), dtype = np.int64)
+        self.maps = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, frame):
+        '''
+        This function gets the particles of one frame.
+
+        Args:
+            frame: frame number, from 0
+
+        Returns:
+            dictionary of attribute name to a read only view into the cache files
+        '''
+        chunk, first, count = [int(v) for v in self.index[frame]]
+        arrays = {}
+        for name, shape, dtype in self.attributes:
+            arrays[name] = self._map(name, shape, dtype, chunk, first + count)[first:first + count]
+        return arrays
+
+    def _map(self, name, shape, dtype, chunk, rowsNeeded):
+        ### a chunk still being baked is mapped again once it has grown
+        key = (name, chunk)
+        if key not in self.maps or len(self.maps[key]) < rowsNeeded:
+            path = chunkFile(self.path, name, chunk)
+            entry = dtype.itemsize * int(np.prod(shape))
+            rows = os.path.getsize(path) // entry
+            if rows == 0:
+                self.maps[key] = np.zeros((0,) + shape, dtype = dtype)
+            else:
+                self.maps[key] = np.memmap(path, dtype = dtype, mode = 'r', shape = (rows,) + shape)
+        return self.maps[key]
+
+def bakeSimulation(simulator, path, frames, attributes = BAKE_ATTRIBUTES, framesPerChunk = 100):
+    '''
+    This function steps a SnowSim simulator and streams every frame to a cache.
+
+    Args:
+        simulator: SnowSim.SnowSimulator
+        path: the cache folder
+        frames: number of frames to bake
+        attributes: names of the particle arrays to bake
+        framesPerChunk: number of frames in one chunk file
+
+    Returns:
+        list of the frame stats of the simulator
+    '''
+    particles = simulator.particles()
+    spec = [(name, particles[name].shape[1:], particles[name].dtype) for name in attributes]
+    writer = CacheWriter(path, spec, framesPerChunk)
+    stats = []
+    try:
+        for i in range(frames):
+            stats.append(simulator.step())
+            writer.writeFrame(simulator.particles())
+    finally:
+        writer.close()
+    return stats
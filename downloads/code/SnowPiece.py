@@ -12,7 +12,92 @@ __status__ = "Practise"
 
 """
 
+import os
+import numpy as np
 import pymel.core as pm
+import maya.OpenMaya as om
+import SnowCache
+import SnowCommandBuffer
+import SnowGeometry
+
+### cache of built snow pieces, created on the first run
+snow_cache = None
+
+### level buffers of the last whole snow piece, reused when only the level changes
+snow_builder = None
+
+### the mesh of the last whole snow piece and the builder it came from, updated in place when only the level changes
+snow_piece = None
+snow_piece_builder = None
+### its levels of detail and their group, the levels of detail are replaced by the next run
+snow_piece_lods = []
+snow_piece_group = None
+
+def get_snow_cache():
+    ### the disk tier lives in the maya temp folder
+    global snow_cache
+    if snow_cache is None:
+        snow_cache = SnowCache.SnowCache(os.path.join(pm.internalVar(userTmpDir = True), 'snowPieceCache'))
+    return snow_cache
+
+def get_seed_mesh(obj):
+    ### read the seed points relative to its world position, and its face topology
+    obj = pm.PyNode(obj)
+    shape = obj.getShape()
+    origin = obj.getTranslation(space = 'world')
+    points = [(p.x - origin.x, p.y - origin.y, p.z - origin.z) for p in shape.getPoints(space = 'world')]
+    counts, connects = shape.getVertices()
+    return SnowGeometry.make_mesh(points, list(counts), list(connects)), (origin.x, origin.y, origin.z)
+
+def build_snow_mesh(seed, origin, snow_scale, snow_angle, snow_level):
+    ### build only the levels the last run did not have, a new snow piece is looked up in the cache first
+    ### the mesh is ordered level by level like FlakeBuilder, cached as 'flake_levels'
+    global snow_builder
+    if snow_builder is None or not snow_builder.matches(seed, to_point_index, snow_scale, snow_angle, origin):
+        snow_builder = SnowGeometry.FlakeBuilder(seed, to_point_index, snow_scale, snow_angle, origin)
+        key = SnowCache.mesh_key('flake_levels', seed, to_point_index, snow_scale, snow_angle, snow_level, origin)
+        cached = get_snow_cache().get(key)
+        if cached is None:
+            snow_builder.set_level(snow_level)
+            get_snow_cache().put(key, SnowGeometry.SnowMesh(*[a.copy() for a in snow_builder.mesh()]))
+        else:
+            snow_builder.adopt(cached, snow_level)
+    snow_builder.set_level(snow_level)
+    return snow_builder.mesh()
+
+def float_point_array(points):
+    ### an MFloatPointArray of an (n, 3) array, filled in one step instead of point by point
+    homogeneous = np.ones((len(points), 4))
+    homogeneous[:, :3] = points
+    util = om.MScriptUtil()
+    util.createFromList(homogeneous.ravel().tolist(), homogeneous.size)
+    return om.MFloatPointArray(util.asFloat4Ptr(), len(points))
+
+def int_array(values):
+    ### an MIntArray of an int array, filled in one step
+    util = om.MScriptUtil()
+    util.createFromList(values.tolist(), len(values))
+    return om.MIntArray(util.asIntPtr(), len(values))
+
+def create_mesh(mesh, name, cmds = None):
+    ### create one mesh from the vertex and face buffers in a single step, its shading is assigned through cmds if given
+    mesh_fn = om.MFnMesh()
+    mesh_obj = mesh_fn.create(len(mesh.points), len(mesh.counts), float_point_array(mesh.points),
+                              int_array(mesh.counts), int_array(mesh.connects))
+    node = pm.rename(om.MFnDagNode(mesh_obj).fullPathName(), name)
+    ### an empty buffer is falsy, so it is checked against None
+    (pm if cmds is None else cmds).sets('initialShadingGroup', e = True, forceElement = node)
+    return node
+
+def update_mesh(node, mesh):
+    ### replace the geometry of an existing mesh, its node, name, transform and shading stay
+    selection = om.MSelectionList()
+    selection.add(str(node))
+    path = om.MDagPath()
+    selection.getDagPath(0, path)
+    path.extendToShape()
+    om.MFnMesh(path).createInPlace(len(mesh.points), len(mesh.counts), float_point_array(mesh.points),
+                                   int_array(mesh.counts), int_array(mesh.connects))
 
 def select_obj(selType):
     ### global varibles
@@ -31,61 +116,117 @@ def select_obj(selType):
     ### select object
     if selType == 0:
         snow_obj = sel_obj
-        print 'obj OK'
-        print snow_obj
+        print('obj OK')
+        print(snow_obj)
         return snow_obj
 
     ### select destination point
     elif selType == 2:
         to_point = sel_obj[0]
         to_point_index = to_point.index()
-        print to_point_index
+        print(to_point_index)
         return to_point_index
 
     
-def on_click_run(slider_scale, slider_angle, slider_level, snow_win):
+@SnowCommandBuffer.undoable
+def on_click_run(slider_scale, slider_angle, slider_level, check_instance, check_weld, check_lod, snow_win):
+    global snow_piece, snow_piece_builder, snow_piece_lods, snow_piece_group
     ### get values from sliders
     snow_scale = slider_scale.getValue()
     snow_angle = slider_angle.getValue()
     snow_level = slider_level.getValue()       
+    snow_instance = check_instance.getValue()
+    snow_weld = check_weld.getValue()
+    snow_lod = check_lod.getValue()
 
-    ### list for 1/6 snow piece
-    snow_list = []
-    snow_list.append(snow_obj)
-    
-    ### list for 6 parts of the snow piece
-    snow_joint_list = []
-    
     ### rename the origin object
-    pm.rename(snow_obj, 's0')
-
-    ### draw 1/6 snow piece
-    for i in range(1, snow_level):
-        tmp = pm.duplicate(snow_list[i-1])
-        snow_list.append(tmp[0])
-        pm.rotate(snow_list[i], 0, snow_angle, 0, r = True)
-        pm.scale(snow_list[i], snow_scale, 1, snow_scale, r = True)
-        pos = pm.xform('%s.vtx[%d]'%(snow_list[i], to_point_index), q = 1, t = 1, ws = 1)
-        pm.xform(snow_list[i], t = (pos[0], 0, pos[2]), ws = 1)
-
-    ### unite the 1/6 snow piece
-    tmpunit = snow_list[0]
-    for i in range(1, snow_level):
-        print tmpunit, i
-        tmpunit = pm.polyUnite(tmpunit, snow_list[i])
-        
-    ### draw all 6 parts
-    snow_joint_list.append(tmpunit[0])
-    for i in range(1, 6):
-        tmp = pm.duplicate(tmpunit[0])
-        snow_joint_list.append(tmp)
-        pm.rotate(tmp, 0, 60*i, 0, r = True)     
-        
-    ### unite the whole snow piece
-    snow_final = snow_joint_list[0]
-    for i in range(1,6):
-        snow_final = pm.polyUnite(snow_final, snow_joint_list[i])
-    
+    pm.rename(snow_obj[0], 's0')
+
+    ### build the whole snow piece outside of the scene
+    seed, origin = get_seed_mesh(snow_obj[0])
+
+    ### changes to the new nodes are recorded and run together at the end
+    cmds = SnowCommandBuffer.CommandBuffer()
+
+    if snow_instance:
+        ### create the 1/6 snow piece once and instance it for the other 5 parts
+        snow_mesh = None
+        branch = get_snow_cache().build('branch', seed, to_point_index, snow_scale, snow_angle, snow_level, origin)
+        if snow_weld:
+            branch, report = SnowGeometry.weld_mesh(branch)
+            print('welded vertices: %(vertices_before)d -> %(vertices_after)d, degenerate faces: %(degenerate_faces)d, '
+                  'non manifold edges: %(non_manifold_edges)d' % report)
+        scene_triangles = SnowGeometry.triangle_count(branch) * SnowGeometry.ARM_COUNT
+        snow_joint_list = [create_mesh(branch, 'snow_branch', cmds)]
+        for i in range(1, SnowGeometry.ARM_COUNT):
+            tmp = pm.instance(snow_joint_list[0])
+            snow_joint_list.append(tmp[0])
+            cmds.rotate(tmp[0], 0, 360.0/SnowGeometry.ARM_COUNT*i, 0, r = True)
+        ### recorded commands name the nodes, so they run before the nodes are grouped
+        cmds.flush()
+        snow_final = pm.group(snow_joint_list, name = 'snow_piece')
+        updated = False
+    else:
+        ### create the whole snow piece as one mesh, only the new levels are built and welded
+        snow_mesh = build_snow_mesh(seed, origin, snow_scale, snow_angle, snow_level)
+        scene_mesh = snow_mesh
+        if snow_weld:
+            scene_mesh, report = snow_builder.welded_mesh()
+            print('welded vertices: %(vertices_before)d -> %(vertices_after)d, degenerate faces: %(degenerate_faces)d, '
+                  'non manifold edges: %(non_manifold_edges)d' % report)
+        ### the snow piece of the last run is updated in place if only the level changed, else a new one is created
+        updated = snow_piece is not None and snow_piece_builder is snow_builder and pm.objExists(snow_piece)
+        if updated:
+            update_mesh(snow_piece, scene_mesh)
+            if snow_piece_lods:
+                cmds.delete(snow_piece_lods)
+        else:
+            snow_piece = create_mesh(scene_mesh, 'snow_piece', cmds)
+            snow_piece_builder = snow_builder
+            snow_piece_group = None
+        snow_piece_lods = []
+        snow_final = snow_piece
+        scene_triangles = SnowGeometry.triangle_count(scene_mesh)
+
+    ### create the reduced and billboard levels of detail next to the snow piece
+    if snow_lod:
+        ### the levels of detail come from the level ordered snow piece, already built in whole mode
+        if snow_mesh is None:
+            snow_mesh = build_snow_mesh(seed, origin, snow_scale, snow_angle, snow_level)
+        lods = SnowGeometry.lod_chain(snow_mesh, seed, to_point_index, snow_level)
+        lod_list = [snow_final]
+        lod_triangles = [scene_triangles]
+        for lod in lods[1:]:
+            ### the reduced level is welded like the snow piece, as SnowBatch does
+            lod_mesh = lod.mesh
+            if snow_weld and lod.name == 'reduced':
+                lod_mesh, report = SnowGeometry.weld_mesh(lod_mesh)
+            lod_list.append(create_mesh(lod_mesh, 'snow_piece_%s' % lod.name, cmds))
+            lod_triangles.append(SnowGeometry.triangle_count(lod_mesh))
+        for lod_obj, lod, triangles in zip(lod_list, lods, lod_triangles):
+            ### an updated snow piece in a group already has the attributes of the last run
+            if lod_obj is snow_final and updated and snow_piece_group is not None:
+                cmds.setAttr('%s.lodTriangles' % lod_obj, triangles)
+                cmds.setAttr('%s.lodError' % lod_obj, lod.error)
+            else:
+                cmds.addAttr(lod_obj, ln = 'lodTriangles', at = 'long', dv = triangles)
+                cmds.addAttr(lod_obj, ln = 'lodError', at = 'double', dv = lod.error)
+
+    ### keep the origin object for the next run
+    cmds.hide(snow_obj[0])
+
+    ### run the recorded commands in one batch and one undo chunk
+    cmds.flush()
+    if snow_lod:
+        if updated and snow_piece_group is not None:
+            pm.parent(lod_list[1:], snow_piece_group)
+        else:
+            lod_group = pm.group(lod_list, name = 'snow_piece_lod')
+            if not snow_instance:
+                snow_piece_group = lod_group
+        if not snow_instance:
+            snow_piece_lods = lod_list[1:]
+
     ### delete the menu window
     snow_win.delete()
     
@@ -95,7 +236,7 @@ def ui():
     win_title = 'Draw A Snowpiece'
     win_name = 'snow_window'
     win_width = 300
-    win_height = 160
+    win_height = 220
 
     if pm.window(win_name, exists = True):
         pm.deleteUI(win_name)
@@ -159,6 +300,21 @@ def ui():
                                      adj = 3,
                                      parent = col_layout1
                                      ) 
+    ### checkbox for instancing the 6 parts
+    check_instance = pm.checkBox(label = 'Instance the 6 parts',
+                                 value = False,
+                                 parent = col_layout1
+                                 )
+    ### checkbox for welding the seams
+    check_weld = pm.checkBox(label = 'Weld vertices',
+                             value = True,
+                             parent = col_layout1
+                             )
+    ### checkbox for the levels of detail
+    check_lod = pm.checkBox(label = 'Build LOD chain',
+                            value = False,
+                            parent = col_layout1
+                            )
     ### layout for run button and cancel button
     row_layout2 = pm.rowLayout(nc = 2,
                                cw2 = ((win_width/2), (win_width/2)),
@@ -172,6 +328,9 @@ def ui():
                                       slider_scale = slider_scale,
                                       slider_angle = slider_angle,
                                       slider_level = slider_level,
+                                      check_instance = check_instance,
+                                      check_weld = check_weld,
+                                      check_lod = check_lod,
                                       snow_win = snow_win
                                       )
                           )
@@ -0,0 +1,81 @@
+"""
+SnowRandom.py
+
+Counter based random numbers for the particle attributes of SnowWorld and
+SnowSim. A number is not drawn from a generator in birth order, it is the
+splitmix64 hash of (seed, particle id, attribute), so the size, twist and
+sprite of any particle can be worked out again from its id alone, in any
+order, and give the same values on every run and every machine.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import numpy as np
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+GOLDEN = 0x9E3779B97F4A7C15  # 2^64 / golden ratio, the splitmix64 counter step
+
+## the random stream of every particle attribute, a new attribute takes a new number
+STREAMS = {'size': 1, 'spriteTwist': 2, 'spriteNum': 3}
+
+def mix64(x):
+    '''
+    This function is the splitmix64 finalizer, it scrambles every bit of x into every bit of the result.
+
+    Args:
+        x: uint64 array
+
+    Returns:
+        uint64 array
+    '''
+    x = np.asarray(x, dtype = np.uint64)
+    ### the products wrap around on purpose, numpy only warns about it for a single id
+    with np.errstate(over = 'ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def streamKey(seed, attribute):
+    ### one key for a seed and an attribute name or stream number
+    stream = STREAMS[attribute] if attribute in STREAMS else int(attribute)
+    key = mix64(np.array([(int(seed) * GOLDEN) & MASK64], dtype = np.uint64))
+    return mix64(key ^ np.uint64((stream * GOLDEN) & MASK64))[0]
+
+def randomBits(seed, ids, attribute):
+    '''
+    This function gives the 64 random bits of some particles for one attribute.
+
+    Args:
+        seed: seed of the random numbers
+        ids: particle ids
+        attribute: name in STREAMS or a stream number
+
+    Returns:
+        uint64 array, one per id
+    '''
+    counter = np.asarray(ids, dtype = np.int64).astype(np.uint64)
+    with np.errstate(over = 'ignore'):
+        return mix64(mix64(counter ^ streamKey(seed, attribute)) + np.uint64(GOLDEN))
+
+def uniform(seed, ids, attribute, low = 0.0, high = 1.0):
+    '''
+    This function gives every particle a uniform random number, like rand(low, high) of MEL.
+
+    Args:
+        seed: seed of the random numbers
+        ids: particle ids
+        attribute: name in STREAMS or a stream number
+        low, high: range of the numbers, high excluded
+
+    Returns:
+        float64 array, one per id
+    '''
+    ### the top 53 bits fill the mantissa of a double in [0, 1)
+    unit = (randomBits(seed, ids, attribute) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+    return low + (high - low) * unit
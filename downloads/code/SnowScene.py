@@ -0,0 +1,332 @@
+"""
+SnowScene.py
+
+Snow setups of SnowWorld as plain parameters, and a batch runner for
+manifests of many setups. A manifest is a JSON or YAML file listing setups
+with the same values as the SnowWorld window; every setup is checked before
+any is run, then they are simulated with SnowSim, or built as Maya scenes
+with mayapy, across a process pool.
+
+manifest:
+    {"defaults": {"frames": 240},
+     "setups": [{"name": "yard", "start": "sky.obj", "size": 0.5, "density": 20,
+                 "direction": [0, -1, 0.2], "cover": ["house.obj", "tree.obj"]}]}
+
+usage:
+    python SnowScene.py manifest.json -o out                simulate every setup and bake it
+    python SnowScene.py manifest.json -o out --mode build   save a Maya scene of every setup, with mayapy
+    python SnowScene.py manifest.json --check               only check the manifest
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+MODES = ('simulate', 'build')
+
+## text read from a manifest is unicode in python 2
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
+
+class SnowParams(object):
+    '''
+    One snow setup, the values the SnowWorld window gives run().
+
+    Args:
+        name: name of the setup, used for its output files
+        start: the start plane, a Maya object in Maya, an OBJ file in a manifest
+        size: the Avg Size of the snow
+        density: the Density of the snow
+        height: the Max Height, the snow dies after falling that far below the start plane
+        direction: direction vector of the gravity field
+        texture: first image of the snowflake texture, '' for cloud particles
+        sequence: number of files of the texture sequence, 0 for a single image
+        cover: objects the snow collides with, Maya objects or OBJ files, none for no collision
+        batchAttrs: whether the per particle attributes are set in batches instead of creation expressions
+        frames: number of frames to simulate, for the simulate mode
+        seed: seed of the random numbers, and of the batched particle attributes in Maya
+    '''
+
+    FIELDS = ('name', 'start', 'size', 'density', 'height', 'direction', 'texture', 'sequence',
+              'cover', 'batchAttrs', 'frames', 'seed')
+
+    def __init__(self, name = 'snow', start = None, size = 1.0, density = 1.0, height = 10.0,
+                 direction = (0.0, -1.0, 0.0), texture = '', sequence = 0, cover = (),
+                 batchAttrs = False, frames = 240, seed = 0):
+        self.name = name
+        self.start = start
+        self.size = size
+        self.density = density
+        self.height = height
+        ### values of the wrong type are kept as they are, for validate to report
+        self.direction = tuple(direction) if isinstance(direction, (list, tuple)) else direction
+        self.texture = texture or ''
+        self.sequence = sequence
+        if cover is None:
+            cover = []
+        self.cover = list(cover) if isinstance(cover, (list, tuple)) else cover
+        self.batchAttrs = batchAttrs
+        self.frames = frames
+        self.seed = seed
+
+    def __repr__(self):
+        return 'SnowParams(%s)' % ', '.join(['%s = %r' % (field, getattr(self, field)) for field in self.FIELDS])
+
+    @classmethod
+    def fromDict(cls, entry):
+        ### a setup from a manifest entry, unknown keys are mistakes
+        unknown = sorted(set(entry) - set(cls.FIELDS))
+        if unknown:
+            raise ValueError('unknown keys %s' % ', '.join(unknown))
+        return cls(**dict([(str(key), value) for key, value in entry.items()]))
+
+    def toDict(self):
+        return collections.OrderedDict([(field, getattr(self, field)) for field in self.FIELDS])
+
+    def validate(self, checkFiles = False):
+        '''
+        This function checks the values of the setup.
+
+        Args:
+            checkFiles: also check that the start, cover and texture files exist
+
+        Returns:
+            list of problems, empty if the setup is fine
+        '''
+        problems = []
+        if self.start is None:
+            problems.append('no start plane')
+        elif checkFiles and not isinstance(self.start, STRING_TYPES):
+            problems.append('start must be a file name, not %r' % (self.start,))
+        if not isinstance(self.texture, STRING_TYPES):
+            problems.append('texture must be a file name, not %r' % (self.texture,))
+        if not isinstance(self.cover, list):
+            problems.append('cover must be a list of objects, not %r' % (self.cover,))
+        elif checkFiles:
+            problems.extend(['cover must be a list of file names, not %r' % (path,) for path in self.cover
+                             if not isinstance(path, STRING_TYPES)])
+        for field, low in (('size', 0.0), ('density', 0.0), ('height', 0.0)):
+            value = getattr(self, field)
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= low:
+                problems.append('%s must be a number above %g, not %r' % (field, low, value))
+        if not isinstance(self.direction, tuple) or len(self.direction) != 3 or not all([isinstance(v, (int, float)) for v in self.direction]):
+            problems.append('direction must be 3 numbers, not %r' % (self.direction,))
+        elif not any(self.direction):
+            problems.append('direction must not be 0 0 0')
+        for field, low in (('sequence', 0), ('frames', 1)):
+            value = getattr(self, field)
+            if not isinstance(value, int) or isinstance(value, bool) or value < low:
+                problems.append('%s must be a whole number from %d, not %r' % (field, low, value))
+        if self.sequence and not self.texture:
+            problems.append('a texture sequence needs a texture')
+
+        if checkFiles:
+            files = [('start', self.start)]
+            if isinstance(self.cover, list):
+                files += [('cover', path) for path in self.cover]
+            if self.texture and isinstance(self.texture, STRING_TYPES):
+                files += [('texture', path) for path in self.textureFiles()]
+            for field, path in files:
+                if isinstance(path, STRING_TYPES) and not os.path.isfile(path):
+                    problems.append('%s file not found: %s' % (field, path))
+        return problems
+
+    def textureFiles(self):
+        ### the image files the texture of the setup uses
+        if not self.sequence:
+            return [self.texture]
+        import SnowAtlas
+        try:
+            return SnowAtlas.sequenceFiles(self.texture, self.sequence)
+        except ValueError:
+            return [self.texture]
+
+def readManifest(path):
+    '''
+    This function reads and checks all setups of a JSON or YAML manifest.
+
+    Files named in the manifest are relative to the manifest, and the values of
+    "defaults" are used by every setup that does not set them.
+
+    Args:
+        path: the manifest file
+
+    Returns:
+        list of SnowParams
+
+    Raises:
+        ValueError: any setup has a problem, all problems of all setups are listed
+    '''
+    with open(path, 'r') as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ValueError('Reading %s needs the yaml module' % path)
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    defaults = {}
+    if isinstance(manifest, dict):
+        defaults = manifest.get('defaults', {})
+        manifest = manifest.get('setups', [])
+
+    folder = os.path.dirname(os.path.abspath(path))
+    def resolve(value):
+        ### values that are not file names are left for validate to report
+        return os.path.join(folder, value) if value and isinstance(value, STRING_TYPES) else value
+
+    setups = []
+    problems = []
+    names = set()
+    for i, entry in enumerate(manifest):
+        if not isinstance(entry, dict):
+            problems.append('setup %d: must be a mapping of values, not %r' % (i, entry))
+            continue
+        values = dict(defaults)
+        values.update(entry)
+        values.setdefault('name', 'snow_%04d' % i)
+        ### unknown keys are a problem, the known ones are still checked
+        unknown = sorted([str(key) for key in values if key not in SnowParams.FIELDS])
+        if unknown:
+            problems.append('setup %d: unknown keys %s' % (i, ', '.join(unknown)))
+        params = SnowParams(**dict([(str(key), value) for key, value in values.items() if key in SnowParams.FIELDS]))
+        params.start = resolve(params.start)
+        params.texture = resolve(params.texture)
+        if isinstance(params.cover, list):
+            params.cover = [resolve(cover) for cover in params.cover]
+        if params.name in names:
+            problems.append('setup %d: the name %s is used twice' % (i, params.name))
+        names.add(params.name)
+        problems.extend(['setup %d (%s): %s' % (i, params.name, problem) for problem in params.validate(checkFiles = True)])
+        setups.append(params)
+    if problems:
+        raise ValueError('%s has %d problems:\n    %s' % (path, len(problems), '\n    '.join(problems)))
+    return setups
+
+def initMaya():
+    ### every build worker runs its own Maya
+    import maya.standalone
+    maya.standalone.initialize(name = 'python')
+
+def importObject(path):
+    ### import an OBJ file into the Maya scene, returns its transform
+    import pymel.core as pm
+    nodes = pm.importFile(path, returnNewNodes = True)
+    return pm.ls(nodes, type = 'transform')[0]
+
+def runSetup(task):
+    '''
+    This function simulates or builds one setup in a worker.
+
+    Args:
+        task: (SnowParams values, mode, output folder)
+
+    Returns:
+        (name, output path, particle count or None)
+    '''
+    values, mode, outDir = task
+    params = SnowParams.fromDict(values)
+    if mode == 'build':
+        import pymel.core as pm
+        import SnowWorld
+        pm.newFile(force = True)
+        params.start = importObject(params.start)
+        params.cover = [importObject(path) for path in params.cover]
+        SnowWorld.buildScene(params)
+        path = os.path.join(outDir, '%s.ma' % params.name)
+        pm.saveAs(path, type = 'mayaAscii')
+        return params.name, path, None
+
+    import SnowMeshIO
+    import SnowParticleCache
+    import SnowSim
+    start = SnowSim.meshTriangles(SnowMeshIO.read_obj(params.start))
+    cover = None
+    if params.cover:
+        cover = collections.OrderedDict([(os.path.basename(path), SnowSim.meshTriangles(SnowMeshIO.read_obj(path))) for path in params.cover])
+    direction = params.direction
+    simulator = SnowSim.fromSnowWorld(start, params.size, params.density, direction[0], direction[1], direction[2],
+                                      coverTriangles = cover, snowSequence = max(params.sequence, 1), seed = params.seed,
+                                      snowHeight = params.height)
+    path = os.path.join(outDir, params.name)
+    SnowParticleCache.bakeSimulation(simulator, path, params.frames)
+    with open(os.path.join(path, 'setup.json'), 'w') as f:
+        json.dump(params.toDict(), f, indent = 2)
+    return params.name, path, simulator.count
+
+def runSetups(setups, outDir, mode = 'simulate', workers = None):
+    '''
+    This function runs all setups across a process pool.
+
+    Args:
+        setups: list of SnowParams, already checked
+        outDir: the folder the results are written to
+        mode: 'simulate' to bake a SnowSim particle cache, 'build' to save a Maya scene
+        workers: number of processes, all cores by default, 1 runs in this process
+
+    Returns:
+        list of (name, output path, particle count or None), in the order of setups
+    '''
+    if mode not in MODES:
+        raise ValueError('Unknown mode: %s' % mode)
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    tasks = [(params.toDict(), mode, outDir) for params in setups]
+    initializer = initMaya if mode == 'build' else None
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        if initializer:
+            initializer()
+        return [runSetup(task) for task in tasks]
+
+    pool = multiprocessing.Pool(min(workers, max(len(tasks), 1)), initializer = initializer)
+    try:
+        return pool.map(runSetup, tasks, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Simulate or build many SnowWorld setups from a manifest.')
+    parser.add_argument('manifest', help = 'JSON or YAML manifest of the setups')
+    parser.add_argument('-o', '--out', default = 'snow_scenes', help = 'output folder')
+    parser.add_argument('--mode', default = 'simulate', choices = MODES)
+    parser.add_argument('-j', '--workers', type = int, default = None, help = 'number of processes')
+    parser.add_argument('--check', action = 'store_true', help = 'only check the manifest')
+    args = parser.parse_args(argv)
+
+    try:
+        setups = readManifest(args.manifest)
+    except ValueError as e:
+        print(e)
+        return 1
+    if args.check:
+        print('%d setups are fine' % len(setups))
+        return 0
+
+    start = time.time()
+    results = runSetups(setups, args.out, args.mode, args.workers)
+    for name, path, count in results:
+        print('%s: %s%s' % (name, path, '' if count is None else ', %d particles' % count))
+    print('%d setups done in %.2fs' % (len(results), time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
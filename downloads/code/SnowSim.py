@@ -0,0 +1,576 @@
+"""
+SnowSim.py
+
+Headless snow particle simulation, following the same model as the Maya setup
+of SnowWorld.run: a surface emitter on the start plane, a gravity field and
+collisions with the cover objects. All particles live in flat numpy arrays and
+are stepped together with a fixed time step, so snow can be simulated and
+tuned without Maya. Particles that fall past a kill plane or outlive their
+lifespan free their slots, which later births take over, so a pool of fixed
+capacity keeps memory and the cost of a frame flat over any length of shot.
+The random size, twist and sprite of a particle are not stored, they are
+worked out from its id by SnowRandom whenever they are asked for.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import math
+import numpy as np
+from SnowCollision import CollisionScene, triangleNormals
+from SnowDeposit import SnowAccumulator
+from SnowWind import WindField
+import SnowRandom
+
+FPS = 24.0
+POISSON_OVERSAMPLE = 2  # candidates drawn per birth when births keep a minimum spacing
+POISSON_ROUNDS = 8  # rounds of new candidates for the births the spacing turned down
+POOL_HEADROOM = 2.0  # pool capacity of fromSnowWorld, in particles alive at once while falling
+
+## per particle arrays of the simulator: (name, shape of one entry, dtype)
+PARTICLE_ARRAYS = (('position', (3,), np.float64),
+                   ('velocity', (3,), np.float64),
+                   ('age', (), np.float64),
+                   ('particleId', (), np.int64))
+
+## per particle attributes worked out from the particle ids instead of stored: (name, dtype)
+ATTRIBUTE_ARRAYS = (('radius', np.float64),
+                    ('spriteTwist', np.float64),
+                    ('spriteNum', np.int64))
+
+def planeTriangles(width, depth, height = 0.0, center = (0.0, 0.0)):
+    '''
+    This function makes the two triangles of a horizontal plane, like a polyPlane.
+
+    Args:
+        width: size of the plane along x
+        depth: size of the plane along z
+        height: y of the plane
+        center: (x, z) of the plane center
+
+    Returns:
+        array of shape (2, 3, 3), facing up
+    '''
+    x0 = center[0] - width / 2.0
+    x1 = center[0] + width / 2.0
+    z0 = center[1] - depth / 2.0
+    z1 = center[1] + depth / 2.0
+    return np.array([[(x0, height, z0), (x0, height, z1), (x1, height, z1)],
+                     [(x0, height, z0), (x1, height, z1), (x1, height, z0)]], dtype = np.float64)
+
+def fallTime(height, speed = 0.0, magnitude = 1.0):
+    '''
+    This function gives the seconds a particle takes to fall a height under gravity.
+
+    Args:
+        height: distance to fall along the gravity direction
+        speed: start speed along the gravity direction, negative against it
+        magnitude: strength of the gravity field
+
+    Returns:
+        seconds, inf if the particle never gets there
+    '''
+    if magnitude <= 0:
+        return height / speed if speed > 0 else float('inf')
+    return (-speed + math.sqrt(speed * speed + 2.0 * magnitude * height)) / magnitude
+
+def meshTriangles(mesh):
+    '''
+    This function splits the faces of a SnowGeometry mesh into triangle fans.
+
+    Args:
+        mesh: SnowMesh
+
+    Returns:
+        array of shape (t, 3, 3)
+    '''
+    starts = np.concatenate([[0], np.cumsum(mesh.counts)[:-1]])
+    fans = [(start, start + i, start + i + 1) for start, count in zip(starts.tolist(), mesh.counts.tolist()) for i in range(1, count - 1)]
+    if not fans:
+        return np.zeros((0, 3, 3))
+    return mesh.points[mesh.connects[np.array(fans)]]
+
+def triangleAreas(triangles):
+    return 0.5 * np.sqrt((np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]) ** 2).sum(axis = 1))
+
+def particleAttributes(count, minSize, maxSize, snowSequence = 1, rng = None, ids = None, seed = 0):
+    '''
+    This function gives a batch of new particles their random attributes at once.
+
+    It computes the same values as the creation expressions of SnowWorld.run:
+    spriteScaleXPP = spriteScaleYPP = radiusPP = rand(minSize, maxSize),
+    spriteTwistPP = rand(0, 30) and spriteNumPP = (rand(0, snowSequence) + 1) % (snowSequence + 1).
+
+    Args:
+        count: number of particles
+        minSize, maxSize: range of the size
+        snowSequence: number of images in the texture sequence
+        rng: numpy RandomState, the global numpy random numbers by default
+        ids: particle ids, to key the values by seed, id and attribute with SnowRandom instead of using rng
+        seed: seed of SnowRandom, used with ids
+
+    Returns:
+        dictionary of 'size', 'spriteTwist' and 'spriteNum' arrays
+    '''
+    if ids is not None:
+        spriteNum = (SnowRandom.uniform(seed, ids, 'spriteNum', 0, snowSequence) + 1) % (snowSequence + 1)
+        return {'size': SnowRandom.uniform(seed, ids, 'size', minSize, maxSize),
+                'spriteTwist': SnowRandom.uniform(seed, ids, 'spriteTwist', 0, 30),
+                'spriteNum': spriteNum.astype(np.int64)}
+    if rng is None:
+        rng = np.random
+    spriteNum = (rng.uniform(0, snowSequence, count) + 1) % (snowSequence + 1)
+    return {'size': rng.uniform(minSize, maxSize, count),
+            'spriteTwist': rng.uniform(0, 30, count),
+            'spriteNum': spriteNum.astype(np.int64)}
+
+def buildAliasTable(weights):
+    '''
+    This function builds Vose's alias table, for drawing weighted indices in O(1) each.
+
+    Args:
+        weights: non negative weights, shape (n,)
+
+    Returns:
+        (probability, alias), both of shape (n,)
+    '''
+    weights = np.asarray(weights, dtype = np.float64)
+    count = len(weights)
+    scaled = weights * (count / weights.sum())
+    probability = np.ones(count)
+    alias = np.arange(count)
+    small = [i for i in range(count) if scaled[i] < 1.0]
+    large = [i for i in range(count) if scaled[i] >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = scaled[more] + scaled[less] - 1.0
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+    return probability, alias
+
+def sampleAlias(probability, alias, count, rng):
+    ### draw count indices from an alias table
+    column = rng.randint(0, len(probability), count)
+    return np.where(rng.random_sample(count) < probability[column], column, alias[column])
+
+def poissonDiskFilter(points, minSpacing, limit, occupied = None):
+    '''
+    This function keeps the points that are at least minSpacing away from all kept points.
+
+    The kept points are hashed into a grid of minSpacing sized cells, so each point
+    is only compared with the kept points of its 27 neighbour cells.
+
+    Args:
+        points: candidate points in the order they are tried, shape (n, 3)
+        minSpacing: the smallest distance between two kept points
+        limit: the most points to keep
+        occupied: points kept before, the candidates keep minSpacing away from them too, shape (m, 3)
+
+    Returns:
+        indices of the kept points
+    '''
+    spacing2 = minSpacing * minSpacing
+    neighbours = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+    cells = {}
+    if occupied is not None and len(occupied):
+        for point, cell in zip(occupied.tolist(), np.floor(occupied / minSpacing).astype(np.int64).tolist()):
+            cells.setdefault(tuple(cell), []).append(tuple(point))
+    kept = []
+    grid = np.floor(points / minSpacing).astype(np.int64).tolist()
+    for index, (x, y, z) in enumerate(points.tolist()):
+        cx, cy, cz = grid[index]
+        free = True
+        for i, j, k in neighbours:
+            for ox, oy, oz in cells.get((cx + i, cy + j, cz + k), ()):
+                if (x - ox) ** 2 + (y - oy) ** 2 + (z - oz) ** 2 < spacing2:
+                    free = False
+                    break
+            if not free:
+                break
+        if free:
+            cells.setdefault((cx, cy, cz), []).append((x, y, z))
+            kept.append(index)
+            if len(kept) == limit:
+                break
+    return np.array(kept, dtype = np.int64)
+
+class SnowSimulator(object):
+    '''
+    Snow particles stored as a structure of arrays.
+
+    Every particle owns a slot of the arrays. Births take free slots from the
+    front of a ring buffer and deaths give theirs back at its end, so no live
+    particle is ever moved; the live particles are the slots in liveSlots.
+
+    Args:
+        startTriangles: triangles of the start plane, shape (t, 3, 3)
+        rate: particles born per second and per unit area of the start plane, the
+            density of SnowWorld, like the surface emitter with scaleRateByObjectSize on
+        minDistance, maxDistance: particles are born at a random distance in this
+            range from the start plane, along its normal
+        speed: start speed along the start plane normal
+        direction: direction of the gravity field
+        magnitude: strength of the gravity field
+        avgSize: average radius, the radius of every particle is within 30% of it
+        snowSequence: number of images in the texture sequence, for spriteNum
+        coverTriangles: triangles the particles collide with, one array of shape (c, 3, 3),
+            or a list or dictionary with one array per cover object
+        collisionMode: 'bounce', 'kill', or 'deposit' to let the particles settle as snow on
+            the cover objects, steep surfaces still bounce them
+        accumulator: SnowDeposit.SnowAccumulator collecting the deposits, a default one if None
+        wind: SnowWind.WindField the particles drift in, no wind if None
+        resilience, friction: response of a bounce, like pm.collision r and f
+        fps, substeps: frames per second and integration steps per frame
+        minSpacing: the smallest distance between a birth and the other births of its time step or
+            the particles born in the step before, 0 for none; births that fail it are drawn again
+        killHeight: particles that fall this far below the lowest point of the start plane, along
+            the gravity direction, die, the Max Height of SnowWorld, None for no kill plane
+        lifespan: seconds a particle lives, None to live until it is killed
+        capacity: fixed number of slots of the pool, births are dropped while it is full,
+            None to let the arrays grow; dropped counts them, with the births minSpacing found no room for
+        seed: seed of the random numbers
+        attributeSeed: seed of the particle attributes, keyed with the particle ids, seed by default
+        firstId: particleId of the first particle born
+    '''
+
+    def __init__(self, startTriangles, rate = 1.0, minDistance = 0.5, maxDistance = 1.0, speed = 1.0,
+                 direction = (0.0, -1.0, 0.0), magnitude = 1.0, avgSize = 1.0, snowSequence = 1,
+                 coverTriangles = None, collisionMode = 'bounce', resilience = 0.0, friction = 1.0,
+                 accumulator = None, wind = None, fps = FPS, substeps = 1, minSpacing = 0.0,
+                 killHeight = None, lifespan = None, capacity = None, seed = 0, attributeSeed = None, firstId = 0):
+        if collisionMode not in ('bounce', 'kill', 'deposit'):
+            raise ValueError('Unknown collision mode: %s' % collisionMode)
+        self.startTriangles = np.asarray(startTriangles, dtype = np.float64).reshape(-1, 3, 3)
+        self.startNormals = triangleNormals(self.startTriangles)
+        areas = triangleAreas(self.startTriangles)
+        self.startArea = float(areas.sum())
+        self.startAlias = buildAliasTable(areas)
+        self.minSpacing = float(minSpacing)
+        self.rate = float(rate)
+        self.minDistance = float(minDistance)
+        self.maxDistance = float(maxDistance)
+        self.speed = float(speed)
+        direction = np.asarray(direction, dtype = np.float64)
+        self.fallDirection = direction / max(np.sqrt((direction ** 2).sum()), 1e-12)
+        self.gravity = self.fallDirection * float(magnitude)
+        ### the kill plane faces up against gravity, killHeight below the lowest start point
+        self.killLevel = None
+        if killHeight is not None:
+            self.killLevel = float(np.dot(self.startTriangles.reshape(-1, 3), self.fallDirection).max()) + float(killHeight)
+        self.lifespan = None if lifespan is None else float(lifespan)
+        self.minSize = avgSize * 0.7
+        self.maxSize = avgSize * 1.3
+        self.snowSequence = int(snowSequence)
+        if coverTriangles is None:
+            coverTriangles = []
+        elif isinstance(coverTriangles, np.ndarray):
+            coverTriangles = [coverTriangles]
+        self.collisionScene = CollisionScene(coverTriangles)
+        self.collisionMode = collisionMode
+        self.resilience = float(resilience)
+        self.friction = float(friction)
+        if accumulator is None and collisionMode == 'deposit':
+            accumulator = SnowAccumulator(cellSize = avgSize)
+        self.accumulator = accumulator
+        self.wind = wind
+        self.dt = 1.0 / (float(fps) * int(substeps))
+        self.substeps = int(substeps)
+        self.random = np.random.RandomState(seed)
+        self.attributeSeed = seed if attributeSeed is None else attributeSeed
+
+        self.frame = 0
+        self.time = 0.0
+        self.count = 0
+        self.dropped = 0
+        self.nextId = int(firstId)
+        self.birthDebt = 0.0
+        self.capacity = None if capacity is None else int(capacity)
+        for name, shape, dtype in PARTICLE_ARRAYS:
+            setattr(self, name, np.zeros((0,) + shape, dtype = dtype))
+        self.alive = np.zeros(0, dtype = bool)
+        self.liveSlots = np.zeros(0, dtype = np.int64)
+        self.freeSlots = np.zeros(0, dtype = np.int64)
+        self.freeHead = 0
+        self.freeCount = 0
+        self.recentSlots = np.zeros(0, dtype = np.int64)
+        self.reserve(1024 if self.capacity is None else self.capacity)
+
+    def reserve(self, capacity):
+        ### particle arrays grow by doubling, the new slots join the end of the free ring
+        size = len(self.age)
+        if capacity <= size:
+            return
+        if self.capacity is not None and size:
+            raise ValueError('The pool has a fixed capacity of %d particles' % self.capacity)
+        capacity = max(capacity, 2 * size)
+        for name, shape, dtype in PARTICLE_ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype = old.dtype)
+            new[:size] = old
+            setattr(self, name, new)
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - size, dtype = bool)])
+        free = self.freeSlots[(self.freeHead + np.arange(self.freeCount)) % max(size, 1)]
+        self.freeSlots = np.concatenate([free, np.arange(size, capacity), np.zeros(size - self.freeCount, dtype = np.int64)])
+        self.freeHead = 0
+        self.freeCount += capacity - size
+
+    def allocate(self, count):
+        ### take free slots from the front of the ring, fewer than count if a fixed pool is full
+        if count > self.freeCount and self.capacity is None:
+            self.reserve(len(self.age) - self.freeCount + count)
+        count = min(count, self.freeCount)
+        slots = self.freeSlots[(self.freeHead + np.arange(count)) % len(self.freeSlots)]
+        self.freeHead = (self.freeHead + count) % len(self.freeSlots)
+        self.freeCount -= count
+        self.alive[slots] = True
+        self.liveSlots = np.flatnonzero(self.alive)
+        self.count = len(self.liveSlots)
+        return slots
+
+    def emit(self, dt):
+        '''
+        This function gives birth to the particles of one time step on the start plane.
+
+        Returns:
+            number of particles born
+        '''
+        self.birthDebt += self.rate * self.startArea * dt
+        births = int(self.birthDebt)
+        self.birthDebt -= births
+        if births == 0:
+            return 0
+
+        if self.minSpacing > 0:
+            positions, normals = self.spacedBirths(births)
+            self.dropped += births - len(positions)
+            births = len(positions)
+        else:
+            positions, normals = self.sampleBirths(births)
+
+        ### births beyond the free slots of a full pool are dropped, after all random numbers are drawn
+        new = self.allocate(births)
+        kept = len(new)
+        self.dropped += births - kept
+        self.position[new] = positions[:kept]
+        self.velocity[new] = (normals * self.speed)[:kept]
+        self.age[new] = 0.0
+        self.particleId[new] = np.arange(self.nextId, self.nextId + kept)
+        self.nextId += kept
+        self.recentSlots = new
+        return kept
+
+    def sampleBirths(self, count):
+        ### area weighted triangle from the alias table, a uniform point inside it, then a random distance off it
+        tri = sampleAlias(self.startAlias[0], self.startAlias[1], count, self.random)
+        r1 = np.sqrt(self.random.random_sample(count))
+        r2 = self.random.random_sample(count)
+        corners = self.startTriangles[tri]
+        points = (corners[:, 0] * (1 - r1)[:, None] +
+                  corners[:, 1] * (r1 * (1 - r2))[:, None] +
+                  corners[:, 2] * (r1 * r2)[:, None])
+        normals = self.startNormals[tri]
+        distance = self.random.uniform(self.minDistance, self.maxDistance, count)
+        return points + normals * distance[:, None], normals
+
+    def spacedBirths(self, births):
+        '''
+        This function draws births that keep minSpacing away from each other and from
+        the particles of the previous birth step that are still alive.
+
+        The candidates the spacing turns down are drawn again, for at most POISSON_ROUNDS
+        rounds, so a start plane too crowded for the rate gives fewer births instead of
+        looping forever.
+
+        Returns:
+            positions and start plane normals of the births, births or fewer of them
+        '''
+        occupied = self.position[self.recentSlots[self.alive[self.recentSlots]]]
+        positions = []
+        normals = []
+        kept = 0
+        for round in range(POISSON_ROUNDS):
+            candidates, candidateNormals = self.sampleBirths((births - kept) * POISSON_OVERSAMPLE)
+            keep = poissonDiskFilter(candidates, self.minSpacing, births - kept, occupied)
+            positions.append(candidates[keep])
+            normals.append(candidateNormals[keep])
+            occupied = np.concatenate([occupied, candidates[keep]])
+            kept += len(keep)
+            if kept == births:
+                break
+        return np.concatenate(positions), np.concatenate(normals)
+
+    def integrate(self, dt):
+        ### semi implicit euler on the live slots, returns the positions before the move
+        live = self.liveSlots
+        previous = self.position[live]
+        velocity = self.velocity[live] + self.gravity * dt
+        if self.wind is not None:
+            self.wind.apply(previous, velocity, self.time, dt)
+        self.velocity[live] = velocity
+        self.position[live] = previous + velocity * dt
+        self.age[live] += dt
+        self.time += dt
+        return previous
+
+    def collide(self, previous):
+        '''
+        This function stops the particles whose last move crossed a cover triangle.
+
+        Returns:
+            number of collisions
+        '''
+        if self.count == 0 or self.collisionScene.triangleCount() == 0:
+            return 0
+        hitIndex, hitT = self.collisionScene.query(previous, self.position[self.liveSlots])
+        found = np.nonzero(hitIndex >= 0)[0]
+        if len(found) == 0:
+            return 0
+        hits = self.liveSlots[found]
+
+        if self.collisionMode == 'kill':
+            self.kill(hits)
+            return len(hits)
+
+        ### move back onto the surface, then bounce with resilience and friction
+        hitIndex = hitIndex[found]
+        hitT = hitT[found]
+        normals = self.collisionScene.normals[hitIndex]
+        start = previous[found]
+        path = self.position[hits] - start
+        normals = np.where(((path * normals).sum(axis = 1) > 0)[:, None], -normals, normals)
+        self.position[hits] = start + path * hitT[:, None] + normals * 1e-4
+        velocity = self.velocity[hits]
+        normalSpeed = (velocity * normals).sum(axis = 1)[:, None]
+        tangent = velocity - normals * normalSpeed
+        self.velocity[hits] = tangent * (1.0 - self.friction) - normals * normalSpeed * self.resilience
+
+        if self.collisionMode == 'deposit':
+            ### settled particles become part of the deposit maps
+            settled = self.accumulator.addHits(self.collisionScene, start + path * hitT[:, None],
+                                               hitIndex, self.attributes(hits)['radius'])
+            self.kill(hits[settled])
+        return len(hits)
+
+    def kill(self, slots):
+        ### free the slots of dead particles at the end of the ring, the other particles stay where they are
+        slots = np.unique(np.asarray(slots, dtype = np.int64))
+        slots = slots[self.alive[slots]]
+        if len(slots) == 0:
+            return
+        self.alive[slots] = False
+        size = len(self.freeSlots)
+        self.freeSlots[(self.freeHead + self.freeCount + np.arange(len(slots))) % size] = slots
+        self.freeCount += len(slots)
+        self.liveSlots = np.flatnonzero(self.alive)
+        self.count = len(self.liveSlots)
+
+    def expire(self):
+        '''
+        This function kills the particles below the kill plane or past their lifespan.
+
+        Returns:
+            number of particles killed
+        '''
+        if self.count == 0 or (self.killLevel is None and self.lifespan is None):
+            return 0
+        live = self.liveSlots
+        dead = np.zeros(len(live), dtype = bool)
+        if self.killLevel is not None:
+            dead |= np.dot(self.position[live], self.fallDirection) > self.killLevel
+        if self.lifespan is not None:
+            dead |= self.age[live] > self.lifespan
+        dead = live[dead]
+        self.kill(dead)
+        return len(dead)
+
+    def step(self):
+        '''
+        This function advances the simulation by one frame.
+
+        Returns:
+            dictionary of the frame number, particle count, births, collisions and expired particles
+        '''
+        births = 0
+        collisions = 0
+        expired = 0
+        for i in range(self.substeps):
+            births += self.emit(self.dt)
+            previous = self.integrate(self.dt)
+            collisions += self.collide(previous)
+            expired += self.expire()
+        self.frame += 1
+        return {'frame': self.frame, 'count': self.count, 'births': births, 'collisions': collisions, 'expired': expired}
+
+    def run(self, frames):
+        ### advance several frames, returns the stats of every frame
+        return [self.step() for i in range(frames)]
+
+    def attributes(self, slots = None):
+        '''
+        This function works the random attributes of particles out from their ids.
+
+        Args:
+            slots: slots of the particles, all live particles by default
+
+        Returns:
+            dictionary of the ATTRIBUTE_ARRAYS
+        '''
+        ids = self.particleId[self.liveSlots if slots is None else slots]
+        values = particleAttributes(len(ids), self.minSize, self.maxSize, self.snowSequence, ids = ids, seed = self.attributeSeed)
+        return {'radius': values['size'], 'spriteTwist': values['spriteTwist'], 'spriteNum': values['spriteNum']}
+
+    def particles(self):
+        ### the live particles in slot order with their attributes, the stored arrays are views while no slot has been freed yet
+        if self.count == 0 or self.liveSlots[-1] == self.count - 1:
+            particles = dict([(name, getattr(self, name)[:self.count]) for name, shape, dtype in PARTICLE_ARRAYS])
+        else:
+            particles = dict([(name, getattr(self, name)[self.liveSlots]) for name, shape, dtype in PARTICLE_ARRAYS])
+        particles.update(self.attributes())
+        return particles
+
+def fromSnowWorld(startTriangles, snowSize, snowDensity, gdX, gdY, gdZ, coverTriangles = None, snowSequence = 1, seed = 0,
+                  windDirection = None, windStrength = 0.0, windTurbulence = 0.5, snowHeight = None, capacity = None):
+    '''
+    This function sets a simulator up with the same values SnowWorld.run gives Maya.
+
+    Args:
+        startTriangles: triangles of the start plane
+        snowSize, snowDensity: the Avg Size and Density sliders
+        snowSequence: the Number of Files field
+        gdX, gdY, gdZ: the direction vector of the gravity field
+        coverTriangles: triangles of the objects to collide with, no collisions by default
+        windDirection, windStrength: the windFlag of SnowWorld, no wind if windStrength is 0
+        windTurbulence: standard deviation of the turbulent wind speed
+        snowHeight: the Max Height slider, the snow dies that far below the start plane or once it lived as long
+            as the slowest fall there takes, like the lifespan SnowWorld.run sets, None for neither
+        capacity: slots of the particle pool, by default POOL_HEADROOM times the particles falling at once
+
+    Returns:
+        SnowSimulator
+    '''
+    wind = None
+    if windStrength:
+        wind = WindField(windDirection or (1.0, 0.0, 0.0), windStrength, windTurbulence, seed = seed)
+    lifespan = None
+    if snowHeight is not None:
+        ### the slowest fall starts 1 unit up at speed 1 against gravity, like the emitter in Maya,
+        ### snow resting on a cover object above the kill plane dies of age instead
+        lifespan = fallTime(snowHeight + 1.0, -1.0, 1.0)
+    if snowHeight is not None and capacity is None:
+        falling = snowDensity * triangleAreas(np.asarray(startTriangles, dtype = np.float64).reshape(-1, 3, 3)).sum() * lifespan
+        capacity = int(math.ceil(falling * POOL_HEADROOM)) + 1024
+    return SnowSimulator(startTriangles, rate = snowDensity, minDistance = 0.5, maxDistance = 1.0,
+                         direction = (gdX, gdY, gdZ), magnitude = 1.0, avgSize = snowSize, snowSequence = snowSequence,
+                         coverTriangles = coverTriangles, collisionMode = 'bounce',
+                         resilience = 0.0, friction = 1.0, wind = wind, killHeight = snowHeight, lifespan = lifespan,
+                         capacity = capacity, seed = seed)
@@ -0,0 +1,164 @@
+"""
+SnowTiles.py
+
+Multi-core SnowSim simulation of large start planes. The start plane is cut
+into tiles on the x-z plane and each tile is simulated by its own SnowSimulator
+in a process pool. Snow particles never act on each other, so the tiles are
+independent. Every tile takes its random seed and its particle ids from its
+tile number only, and writes its particles into shared memory at a fixed slot,
+so the merged result is bit-identical for any number of workers.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import multiprocessing
+import numpy as np
+import SnowSim
+
+## ctypes codes of the shared particle arrays
+SHARED_TYPES = {np.dtype(np.float64): 'd', np.dtype(np.int64): 'q'}
+
+## shared arrays of a worker process, set once by initWorker
+_worker = {}
+
+def clipPolygon(points, axis, value, keepBelow):
+    ### Sutherland-Hodgman clip of a 3d polygon against the plane points[axis] = value
+    clipped = []
+    for i in range(len(points)):
+        current = points[i]
+        previous = points[i-1]
+        currentIn = (current[axis] <= value) if keepBelow else (current[axis] >= value)
+        previousIn = (previous[axis] <= value) if keepBelow else (previous[axis] >= value)
+        if currentIn != previousIn:
+            t = (value - previous[axis]) / (current[axis] - previous[axis])
+            clipped.append(previous + (current - previous) * t)
+        if currentIn:
+            clipped.append(current)
+    return clipped
+
+def clipTriangles(triangles, x0, x1, z0, z1):
+    '''
+    This function cuts triangles to a rectangle of the x-z plane.
+
+    Args:
+        triangles: shape (t, 3, 3)
+        x0, x1, z0, z1: the rectangle
+
+    Returns:
+        triangles inside the rectangle, shape (k, 3, 3)
+    '''
+    result = []
+    for triangle in triangles:
+        polygon = list(triangle)
+        for axis, value, keepBelow in ((0, x0, False), (0, x1, True), (2, z0, False), (2, z1, True)):
+            polygon = clipPolygon(polygon, axis, value, keepBelow)
+            if len(polygon) < 3:
+                break
+        for i in range(1, len(polygon) - 1):
+            result.append((polygon[0], polygon[i], polygon[i+1]))
+    if not result:
+        return np.zeros((0, 3, 3))
+    return np.array(result, dtype = np.float64)
+
+def splitTiles(startTriangles, tilesX, tilesZ):
+    '''
+    This function cuts the start plane into tilesX by tilesZ tiles of its x-z bounding box.
+
+    Returns:
+        list of triangle arrays, one per tile, row by row, empty tiles included
+    '''
+    startTriangles = np.asarray(startTriangles, dtype = np.float64).reshape(-1, 3, 3)
+    low = startTriangles.reshape(-1, 3).min(axis = 0)
+    high = startTriangles.reshape(-1, 3).max(axis = 0)
+    xs = np.linspace(low[0], high[0], tilesX + 1)
+    zs = np.linspace(low[2], high[2], tilesZ + 1)
+    return [clipTriangles(startTriangles, xs[i], xs[i+1], zs[j], zs[j+1]) for j in range(tilesZ) for i in range(tilesX)]
+
+def birthBound(triangles, rate, frames, fps = SnowSim.FPS):
+    ### the most particles a tile can give birth to in frames, for its slot in the shared arrays
+    if len(triangles) == 0:
+        return 0
+    return int(np.ceil(SnowSim.triangleAreas(triangles).sum() * rate * frames / fps)) + 1
+
+def initWorker(buffers, capacity):
+    ### wrap the shared memory of the parent as numpy arrays, once per worker
+    for name, shape, dtype in SnowSim.PARTICLE_ARRAYS:
+        _worker[name] = np.frombuffer(buffers[name], dtype = dtype).reshape((capacity,) + shape)
+
+def simulateTile(task):
+    '''
+    This function simulates one tile and writes its particles into its shared slot.
+
+    Args:
+        task: (tile number, start triangles, slot start, frames, base seed, simulator arguments)
+
+    Returns:
+        (tile number, particle count)
+    '''
+    tile, triangles, slot, frames, seed, simArgs = task
+    if len(triangles) == 0:
+        return tile, 0
+    simulator = SnowSim.SnowSimulator(triangles, seed = [seed, tile], attributeSeed = seed, firstId = slot, **simArgs)
+    simulator.run(frames)
+    particles = simulator.particles()
+    for name, shape, dtype in SnowSim.PARTICLE_ARRAYS:
+        _worker[name][slot:slot + simulator.count] = particles[name]
+    return tile, simulator.count
+
+def simulateTiles(startTriangles, frames, tilesX = 4, tilesZ = 4, workers = None, seed = 0, **simArgs):
+    '''
+    This function simulates a start plane tile by tile across a process pool.
+
+    Args:
+        startTriangles: triangles of the start plane
+        frames: number of frames to simulate
+        tilesX, tilesZ: number of tiles along x and z
+        workers: number of processes, all cores by default, 1 runs in this process
+        seed: base seed, each tile seeds its random numbers with (seed, tile number)
+        simArgs: other arguments of SnowSim.SnowSimulator, like rate or coverTriangles
+
+    Returns:
+        dictionary of the particle arrays of all tiles, in tile order
+    '''
+    tiles = splitTiles(startTriangles, tilesX, tilesZ)
+    rate = simArgs.get('rate', 1.0)
+    fps = simArgs.get('fps', SnowSim.FPS)
+    bounds = [birthBound(triangles, rate, frames, fps) for triangles in tiles]
+    slots = np.concatenate([[0], np.cumsum(bounds)]).astype(np.int64)
+    capacity = max(int(slots[-1]), 1)
+
+    ### one shared buffer per particle array, every tile owns the slot of its birth bound
+    buffers = {}
+    for name, shape, dtype in SnowSim.PARTICLE_ARRAYS:
+        buffers[name] = multiprocessing.RawArray(SHARED_TYPES[np.dtype(dtype)], capacity * int(np.prod(shape)))
+    tasks = [(tile, tiles[tile], int(slots[tile]), frames, seed, simArgs) for tile in range(len(tiles))]
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        initWorker(buffers, capacity)
+        counts = [simulateTile(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(workers, initializer = initWorker, initargs = (buffers, capacity))
+        try:
+            counts = pool.map(simulateTile, tasks, chunksize = 1)
+        finally:
+            pool.close()
+            pool.join()
+
+    ### merge the slots in tile order
+    keep = np.concatenate([np.arange(slots[tile], slots[tile] + count) for tile, count in counts]).astype(np.int64)
+    merged = {}
+    for name, shape, dtype in SnowSim.PARTICLE_ARRAYS:
+        merged[name] = np.frombuffer(buffers[name], dtype = dtype).reshape((capacity,) + shape)[keep]
+    ### the attributes only depend on the particle ids, they are worked out once for all tiles
+    avgSize = simArgs.get('avgSize', 1.0)
+    attributes = SnowSim.particleAttributes(len(keep), avgSize * 0.7, avgSize * 1.3, simArgs.get('snowSequence', 1),
+                                            ids = merged['particleId'], seed = seed)
+    merged.update({'radius': attributes['size'], 'spriteTwist': attributes['spriteTwist'], 'spriteNum': attributes['spriteNum']})
+    return merged
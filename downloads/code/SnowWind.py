@@ -0,0 +1,128 @@
+"""
+SnowWind.py
+
+Wind and turbulence for SnowSim, the windFlag(windDirection, windStrength) of
+SnowWorld. The turbulence is a tileable lattice of random vectors made once
+and shared by every field with the same settings. A step looks all particles
+up in it together with trilinear interpolation, so a particle costs the same
+eight lattice reads whatever the particle count, and no noise is evaluated
+per particle. The lattice drifts with the mean wind, so gusts travel through
+the scene instead of standing still.
+
+__author__ = "Vega Bai"
+__copyright__ = "Copyright 2015, Vega Bai"
+__version__ = "1.0.0"
+__maintainer__ = "Vega Bai"
+__email__ = "vegabeyond@gmail.com"
+__status__ = "Updating"
+
+"""
+
+import numpy as np
+
+## lattices made so far, by (resolution, octaves, seed)
+_lattices = {}
+
+def upsampleLattice(lattice, resolution):
+    ### trilinear upsampling of a tileable lattice to a finer resolution that it divides
+    factor = resolution // lattice.shape[0]
+    steps = (np.arange(resolution) + 0.5) / factor - 0.5
+    low = np.floor(steps).astype(np.int64)
+    weight = steps - low
+    size = lattice.shape[0]
+    for axis in range(3):
+        shape = [1, 1, 1, 1]
+        shape[axis] = resolution
+        w = weight.reshape(shape)
+        lattice = (np.take(lattice, low % size, axis = axis) * (1 - w) +
+                   np.take(lattice, (low + 1) % size, axis = axis) * w)
+    return lattice
+
+def noiseLattice(resolution = 32, octaves = 3, seed = 0):
+    '''
+    This function gets the tileable noise lattice, made once for every set of arguments.
+
+    Every octave is a lattice of random vectors half as fine and twice as strong as
+    the one before, upsampled so all octaves tile over the same resolution.
+
+    Args:
+        resolution: lattice points along each axis, a power of 2
+        octaves: number of noise octaves
+        seed: seed of the random vectors
+
+    Returns:
+        read only array of shape (resolution, resolution, resolution, 3), unit variance
+    '''
+    key = (int(resolution), int(octaves), int(seed))
+    if key in _lattices:
+        return _lattices[key]
+    random = np.random.RandomState(seed)
+    lattice = np.zeros((resolution, resolution, resolution, 3))
+    size = resolution
+    amplitude = 1.0
+    for octave in range(octaves):
+        if size < 2:
+            break
+        layer = random.standard_normal((size, size, size, 3))
+        lattice += upsampleLattice(layer, resolution) * amplitude if size < resolution else layer * amplitude
+        size //= 2
+        amplitude *= 2.0
+    lattice /= max(lattice.std(), 1e-12)
+    lattice.flags.writeable = False
+    _lattices[key] = lattice
+    return lattice
+
+class WindField(object):
+    '''
+    Mean wind plus lattice turbulence, pulling the particle velocities towards it.
+
+    Args:
+        direction: direction of the mean wind
+        strength: speed of the mean wind
+        turbulence: standard deviation of the turbulent speed
+        scale: world size of one tile of the lattice
+        drag: how fast the particles take the wind speed, per second, it also brakes the
+            fall, so the snow falls at the gravity magnitude over drag at most
+        resolution, octaves, seed: see noiseLattice
+    '''
+
+    def __init__(self, direction = (1.0, 0.0, 0.0), strength = 1.0, turbulence = 0.5, scale = 20.0,
+                 drag = 2.0, resolution = 32, octaves = 3, seed = 0):
+        direction = np.asarray(direction, dtype = np.float64)
+        self.mean = direction / max(np.sqrt((direction ** 2).sum()), 1e-12) * float(strength)
+        self.turbulence = float(turbulence)
+        self.drag = float(drag)
+        self.lattice = noiseLattice(resolution, octaves, seed)
+        self.resolution = self.lattice.shape[0]
+        self.cellsPerUnit = self.resolution / float(scale)
+
+    def sample(self, points, time):
+        '''
+        This function looks the wind up at some points.
+
+        Args:
+            points: shape (n, 3)
+            time: seconds since the start, the lattice has drifted with the mean wind
+
+        Returns:
+            wind velocities, shape (n, 3)
+        '''
+        if len(points) == 0 or self.turbulence == 0:
+            return np.tile(self.mean, (len(points), 1))
+        ### trilinear weights of the eight lattice points around every point
+        coords = (points - self.mean * time) * self.cellsPerUnit
+        low = np.floor(coords)
+        f = coords - low
+        low = low.astype(np.int64) % self.resolution
+        high = (low + 1) % self.resolution
+        gust = np.zeros((len(points), 3))
+        for ix, wx in ((low[:, 0], 1 - f[:, 0]), (high[:, 0], f[:, 0])):
+            for iy, wy in ((low[:, 1], 1 - f[:, 1]), (high[:, 1], f[:, 1])):
+                for iz, wz in ((low[:, 2], 1 - f[:, 2]), (high[:, 2], f[:, 2])):
+                    gust += self.lattice[ix, iy, iz] * (wx * wy * wz)[:, None]
+        return self.mean + gust * self.turbulence
+
+    def apply(self, position, velocity, time, dt):
+        ### exact drag towards the wind over one time step, in place
+        blend = 1.0 - np.exp(-self.drag * dt)
+        velocity += (self.sample(position, time) - velocity) * blend
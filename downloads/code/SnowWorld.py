@@ -5,12 +5,18 @@ Using particles to generate a beautiful snowy scene.
 
 __author__ = "Vega Bai"
 __copyright__ = "Copyright 2015, Vega Bai"
-__version__ = "1.0.5"
+__version__ = "1.0.11"
 __maintainer__ = "Vega Bai"
 __email__ = "vegabeyond@gmail.com"
 __status__ = "Updating"
 
 logs: 
+    v1.0.11: 10-18-2026, key the batched particle attributes by particle id
+    v1.0.10: 10-18-2026, the snow dies after falling Max Height
+    v1.0.9: 10-18-2026, split the scene generation from the UI, for manifests
+    v1.0.8: 10-18-2026, run the scene setup commands in one batch
+    v1.0.7: 10-18-2026, write the log from a background thread
+    v1.0.6: 10-18-2026, add batched particle attributes
     v1.0.5: 12-19-2015, add error captions
     v1.0.4: 12-19-2015, add collisions; delete animation length option
     v1.0.3: 12-16-2015, add particle render type - cloud
@@ -30,33 +36,35 @@ instructions:
 """
 
 import pymel.core as pm
+import maya.OpenMaya as om
+import maya.OpenMayaFX as omfx
 import random
-import logging
+import math
 import os
+import SnowLog
+import SnowCommandBuffer
+import SnowScene
 
 FILE_PATH_OV = 'filePathOv'  # save the file path
 snowPath = ''
+particleValues = {}  # ids and batched attribute values of the particles at the last call, for every particle shape
 
-# setup a logger
-logger = logging.getLogger(__name__)
-hdlr = logging.handlers.RotatingFileHandler('SnowWorldLog.txt', maxBytes = 100000)
-hdlr.setLevel(logging.DEBUG)
-format = ('%(asctime)s, module=%(module)s, message=%(message)s')
-formatter = logging.Formatter(format)
-hdlr.setFormatter(formatter)
-logger.addHandler(hdlr)
+# setup a logger, the level can be set with the SNOWWORLD_LOG_LEVEL environment variable
+LOG_LEVEL = os.environ.get('SNOWWORLD_LOG_LEVEL', 'INFO').upper()
+logger = SnowLog.fileLogger(__name__, 'SnowWorldLog.txt', level = LOG_LEVEL, maxBytes = 100000)
 
 
-def run(sliderSize, sliderDensity, sliderHeight, textSequence, ckboxTexture, ckboxSequence, ckboxCover, directionX, directionY, directionZ, snowPieceBrowser):
+def run(sliderSize, sliderDensity, sliderHeight, textSequence, ckboxTexture, ckboxSequence, ckboxCover, ckboxBatch, directionX, directionY, directionZ, snowPieceBrowser):
     '''
     This function is the main function to generate the snowy scene.
     
     Args:
         avgSize from sliderSize: The average size of all snow piece
         density from sliderDensity: The density of the snow
-        maxDistance from sliderHeight: The highest distance the user want the snow to fall
+        maxDistance from sliderHeight: The highest distance the user want the snow to fall, the snow dies below it
         snowTexture from ckboxTexture: Whether using the texture for snowflakes
         snowSequence from textSequence: The length of the sequence of images as texture
+        batchAttrs from ckboxBatch: Whether the per particle attributes are set in batches instead of creation expressions
         directionX: directionX of gravity field
         directionY: directionX of gravity field
         directionZ: directionX of gravity field
@@ -95,96 +103,226 @@ def run(sliderSize, sliderDensity, sliderHeight, textSequence, ckboxTexture, ckb
             pm.PopupError('Please select the images for textures!')
             return            
         
+    ## read the controls into one plain parameter object
+    params = SnowScene.SnowParams(start = startArea,
+                                  size = sliderSize.getValue(),
+                                  density = sliderDensity.getValue(),
+                                  height = sliderHeight.getValue(),
+                                  direction = (float(directionX.getText()), float(directionY.getText()), float(directionZ.getText())),
+                                  texture = snowPath if ckboxTexture.getValue() else '',
+                                  sequence = int(textSequence.getText()) if ckboxSequence.getValue() else 0,
+                                  cover = coverObj if ckboxCover.getValue() else [],
+                                  batchAttrs = ckboxBatch.getValue())
+    buildScene(params)
+
+@SnowCommandBuffer.undoable
+def buildScene(params):
+    '''
+    This function generates the snowy scene of a snow setup, without the UI.
+    
+    Args:
+        params: SnowScene.SnowParams, with the start plane and the cover objects as Maya objects
+        
+    Result: 
+        a generated snowy scene animation
+        
+    Return: 
+        none
+    
+    '''
     logger.info('Start generating the snowy scene')
 
-    snowSize = sliderSize.getValue()
-    snowDensity = sliderDensity.getValue()
-    snowHeight = sliderHeight.getValue()
-    
-    snowTexture = ckboxTexture.getValue()
-    snowSequenceTmp = textSequence.getText()
-    snowSequence = int(snowSequenceTmp)
-    gdXs = directionX.getText()
-    gdYs = directionY.getText()
-    gdZs = directionZ.getText()
-    
-    gdX = float(gdXs)
-    gdY = float(gdYs)
-    gdZ = float(gdZs)
+    snowSize = params.size
+    snowDensity = params.density
+    snowHeight = params.height
+    
+    snowPath = params.texture
+    snowTexture = bool(snowPath)
+    useSequence = params.sequence > 0
+    batchAttrs = params.batchAttrs
+    snowSequence = params.sequence
+    gdX, gdY, gdZ = [float(d) for d in params.direction]
 
-    pm.playbackOptions(ps = 0.4)
+    ## changes to existing nodes are recorded and run together at the end
+    cmds = SnowCommandBuffer.CommandBuffer()
+    cmds.playbackOptions(ps = 0.4)
     
     offsetSize = snowSize * 0.3
     minSize = snowSize - offsetSize
     maxSize = snowSize + offsetSize
     
     
-    startFace = startArea
+    startFace = params.start
     emitter1 = pm.emitter(startFace, sro = True, type = 'surface', rate = snowDensity, minDistance = 0.5, mxd = 1)
     particle_snow2 = pm.particle()
-    pm.connectDynamic(particle_snow2, em = emitter1)
+    cmds.connectDynamic(particle_snow2, em = emitter1)
     
     ## using image textures for particles
-    if ckboxTexture.getValue():
+    if snowTexture:
         logger.info(' particle render type: sprite ')
-        pm.setAttr('%s.particleRenderType'%particle_snow2[0], 5)
-        pm.addAttr(particle_snow2[1], internalSet = True, longName = 'spriteTwist', attributeType = 'float', minValue = -180, maxValue = 180, defaultValue = 0.0)
-        pm.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteScaleX', dv = 0.2)
-        pm.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteScaleY', dv = 0.2)
-        pm.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteNum', at = 'long', dv = 1)
-        pm.addAttr(particle_snow2[1], internalSet = True, ln = 'useLighting', at = 'bool',dv = False)
+        cmds.setAttr('%s.particleRenderType'%particle_snow2[0], 5)
+        cmds.addAttr(particle_snow2[1], internalSet = True, longName = 'spriteTwist', attributeType = 'float', minValue = -180, maxValue = 180, defaultValue = 0.0)
+        cmds.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteScaleX', dv = 0.2)
+        cmds.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteScaleY', dv = 0.2)
+        cmds.addAttr(particle_snow2[1], internalSet = True, ln = 'spriteNum', at = 'long', dv = 1)
+        cmds.addAttr(particle_snow2[1], internalSet = True, ln = 'useLighting', at = 'bool',dv = False)
     
         shader2 = pm.shadingNode('lambert', asShader = True)
         file_node2 = pm.shadingNode('file', asTexture = True)
-        pm.setAttr('%s.fileTextureName'%file_node2, snowPath, type = 'string')
+        cmds.setAttr('%s.fileTextureName'%file_node2, snowPath, type = 'string')
         shading_group2 = pm.sets(renderable = True, noSurfaceShader = True, empty = True)
-        pm.setAttr('%s.ambientColor'%shader2, 1.0, 1.0, 1.0, type = 'double3')
-        pm.connectAttr('%s.outColor'%shader2, '%s.surfaceShader'%shading_group2, force = True)
-        pm.connectAttr('%s.outColor'%file_node2, '%s.color'%shader2, force = True)
-        pm.connectAttr('%s.outTransparency'%shader2, '%s.surfaceShader'%shading_group2, force = True)
-        pm.connectAttr('%s.outTransparency'%file_node2, '%s.transparency'%shader2, force = True)
-        pm.sets(shading_group2, e = True, forceElement = '%s'%particle_snow2[0])
+        cmds.setAttr('%s.ambientColor'%shader2, 1.0, 1.0, 1.0, type = 'double3')
+        cmds.connectAttr('%s.outColor'%shader2, '%s.surfaceShader'%shading_group2, force = True)
+        cmds.connectAttr('%s.outColor'%file_node2, '%s.color'%shader2, force = True)
+        cmds.connectAttr('%s.outTransparency'%shader2, '%s.surfaceShader'%shading_group2, force = True)
+        cmds.connectAttr('%s.outTransparency'%file_node2, '%s.transparency'%shader2, force = True)
+        cmds.sets(shading_group2, e = True, forceElement = '%s'%particle_snow2[0])
         
-        if ckboxSequence.getValue():
-            pm.setAttr('%s.useFrameExtension'%file_node2, 1)
-            pm.setAttr('%s.useHardwareTextureCycling'%file_node2, 1)
-            pm.setAttr('%s.endCycleExtension'%file_node2, snowSequence)
+        if useSequence:
+            cmds.setAttr('%s.useFrameExtension'%file_node2, 1)
+            cmds.setAttr('%s.useHardwareTextureCycling'%file_node2, 1)
+            cmds.setAttr('%s.endCycleExtension'%file_node2, snowSequence)
          
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleXPP')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleXPP0')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleYPP')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleYPP0')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteTwistPP')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteTwistPP0') 
-        pm.dynExpression(particle_snow2[1], s = 'spriteScaleXPP = rand(%f,%f);\nspriteScaleYPP = spriteScaleXPP;\nspriteTwistPP = rand(0,30);'%(minSize, maxSize), c = True)
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleXPP')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleXPP0')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleYPP')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteScaleYPP0')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteTwistPP')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteTwistPP0') 
+        if not batchAttrs:
+            cmds.dynExpression(particle_snow2[1], s = 'spriteScaleXPP = rand(%f,%f);\nspriteScaleYPP = spriteScaleXPP;\nspriteTwistPP = rand(0,30);'%(minSize, maxSize), c = True)
         
-        if ckboxSequence.getValue():
-            pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteNumPP')
-            pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteNumPP0')
-            pm.dynExpression(particle_snow2[1], s = 'spriteScaleXPP = rand(%f,%f);\nspriteScaleYPP = spriteScaleXPP;\nspriteTwistPP = rand(0,30);\nspriteNumPP = rand(0,%f);\nspriteNumPP = (spriteNumPP+1)%%%f;'%(minSize, maxSize, snowSequence, snowSequence+1), c = True) 
+        if useSequence:
+            cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteNumPP')
+            cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'spriteNumPP0')
+            if not batchAttrs:
+                cmds.dynExpression(particle_snow2[1], s = 'spriteScaleXPP = rand(%f,%f);\nspriteScaleYPP = spriteScaleXPP;\nspriteTwistPP = rand(0,30);\nspriteNumPP = rand(0,%f);\nspriteNumPP = (spriteNumPP+1)%%%f;'%(minSize, maxSize, snowSequence, snowSequence+1), c = True) 
     ## don't using textures
     else:
         logger.info(' particle render type: cloud ')
-        pm.setAttr('%s.particleRenderType'%particle_snow2[0], 8)
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'radiusPP')
-        pm.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'radiusPP0')
-        pm.addAttr(particle_snow2[1], dataType = 'vectorArray', ln = 'rgbPP')
-        pm.addAttr(particle_snow2[1], dataType = 'vectorArray', ln = 'rgbPP0')        
-        pm.dynExpression(particle_snow2[1], s = 'radiusPP = rand(%f,%f);\nrgbPP = <<1,1,1>>;'%(minSize, maxSize), c = True)
+        cmds.setAttr('%s.particleRenderType'%particle_snow2[0], 8)
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'radiusPP')
+        cmds.addAttr(particle_snow2[1], dataType = 'doubleArray', ln = 'radiusPP0')
+        if not batchAttrs:
+            cmds.addAttr(particle_snow2[1], dataType = 'vectorArray', ln = 'rgbPP')
+            cmds.addAttr(particle_snow2[1], dataType = 'vectorArray', ln = 'rgbPP0')        
+            cmds.dynExpression(particle_snow2[1], s = 'radiusPP = rand(%f,%f);\nrgbPP = <<1,1,1>>;'%(minSize, maxSize), c = True)
+        else:
+            ## every particle is white, so a per object color does instead of a per particle array
+            for channel in ('colorRed', 'colorGreen', 'colorBlue'):
+                cmds.addAttr(particle_snow2[1], ln = channel, at = 'double', dv = 1.0)
+    
+    ## give the newborn particles their attributes once per frame, in one batch
+    ## reading the particle count makes the expression run after the emission of the frame
+    if batchAttrs:
+        logger.info(' particle attributes: batched ')
+        if not (snowTexture and useSequence):
+            snowSequence = 0
+        cmds.expression(s = 'python("import SnowWorld; SnowWorld.initNewborns(\'%s\', %f, %f, %d, %d, " + frame + ", " + %s.count + ", seed = %d)");'%(particle_snow2[1], minSize, maxSize, snowSequence, snowTexture, particle_snow2[1], params.seed), ae = True)
     
     ## if make collision
-    if ckboxCover.getValue():
-        for j in range(len(coverObj)):
-            pm.collision(coverObj[j], particle_snow2[1], r = 0, f = 1)
+    for j in range(len(params.cover)):
+        cmds.collision(params.cover[j], particle_snow2[1], r = 0, f = 1)
     
     ## add gravity
     snowGravity = pm.gravity('%s'%particle_snow2[0], dx = gdX, dy = gdY, dz = gdZ, magnitude = 1.0)
-    pm.connectDynamic('%s'%particle_snow2[0], f = snowGravity)    
+    cmds.connectDynamic('%s'%particle_snow2[0], f = snowGravity)
+    
+    ## the snow dies once it fell Max Height below the start plane, so the particle count stays bounded
+    ## the slowest fall starts 1 unit up at speed 1 against gravity, like SnowSim.fallTime(snowHeight + 1, -1, 1)
+    lifespan = 1.0 + math.sqrt(1.0 + 2.0 * (snowHeight + 1.0))
+    logger.info(' particle lifespan: %f ' % lifespan)
+    cmds.setAttr('%s.lifespanMode'%particle_snow2[1], 1)
+    cmds.setAttr('%s.lifespan'%particle_snow2[1], lifespan)
+    
+    ## run the recorded scene commands in one batch and one undo chunk
+    cmds.flush()
     
     
     logger.info('Scene generation finished!')
     return
 
+def initNewborns(particleShape, minSize, maxSize, snowSequence, useSprite, frame, count, seed = 0):
+    '''
+    This function gives the particles born since its last call their attributes in one batch.
+    
+    It is called once per frame by the expression run() sets up in batch mode, and replaces the 
+    creation expressions that call rand() once for every newborn particle. The expression reads the 
+    particle count of the shape, so it runs after the emission of the frame and no newborn particle 
+    is drawn without its attributes. The values are keyed by the seed and the particle ids with 
+    SnowRandom, so every rerun gives every particle the same ones. Only the newborn particles get new 
+    values, the others keep theirs from the last call, and every array goes to Maya whole, built 
+    from numpy in one MScriptUtil call, so a frame costs the same few calls however many are born.
+    
+    Args:
+        particleShape: the name of the particle shape
+        minSize, maxSize: range of the sprite scale or cloud radius
+        snowSequence: the length of the texture sequence, 0 for no spriteNumPP
+        useSprite: 1 for sprite attributes, 0 for cloud attributes
+        frame: the current frame
+        count: the particle count of the shape
+        seed: seed of the attributes
+        
+    Returns:
+        none
+    '''
+    import numpy as np
+    import SnowSim
+    
+    if count == 0:
+        particleValues.pop(particleShape, None)
+        return
+    ids = np.asarray(pm.getAttr('%s.particleId'%particleShape) or [], dtype = np.int64)
+    lastIds, lastValues = particleValues.get(particleShape, (np.zeros(0, dtype = np.int64), {}))
+    ## newborn particles are appended after the older ones, whose ids are smaller
+    first = int(np.searchsorted(ids, lastIds[-1], 'right')) if len(lastIds) else 0
+    older = np.minimum(np.searchsorted(lastIds, ids[:first]), max(len(lastIds) - 1, 0))
+    ## the simulation went back to its start or jumped, every particle is new again
+    if first and not np.array_equal(lastIds[older], ids[:first]):
+        first = 0
+    born = len(ids) - first
+    if born <= 0:
+        return
+    
+    attrs = SnowSim.particleAttributes(born, minSize, maxSize, max(snowSequence, 1), ids = ids[first:], seed = seed)
+    if useSprite:
+        names = [('spriteScaleXPP', 'size'), ('spriteScaleYPP', 'size'), ('spriteTwistPP', 'spriteTwist')]
+        if snowSequence:
+            names.append(('spriteNumPP', 'spriteNum'))
+    else:
+        names = [('radiusPP', 'size')]
+    
+    selection = om.MSelectionList()
+    selection.add(particleShape)
+    node = om.MObject()
+    selection.getDependNode(0, node)
+    particles = omfx.MFnParticleSystem(node)
+    values = {}
+    arrays = {}
+    for name, attr in names:
+        newValues = attrs[attr].astype(np.float64)
+        values[name] = np.concatenate([lastValues[name][older], newValues]) if first else newValues
+        ## the x and y sprite scales share one array
+        if attr not in arrays:
+            arrays[attr] = doubleArray(values[name])
+        particles.setPerParticleAttribute(name, arrays[attr])
+    particleValues[particleShape] = (ids, values)
+    logger.debug('frame %s: attributes set for %d newborn particles', frame, born)
+
+def doubleArray(values):
+    '''
+    This function makes an MDoubleArray of a numpy array without setting its elements one by one.
+    
+    Args:
+        values: float64 array
+        
+    Returns:
+        MDoubleArray
+    '''
+    util = om.MScriptUtil()
+    util.createFromList(values.tolist(), len(values))
+    return om.MDoubleArray(util.asDoublePtr(), len(values))
+
 def  isset(v):
     '''
     This function is for check whether a variable is available.
@@ -309,7 +447,7 @@ def ui():
     winTitle = 'Snow World'
     winName = 'winSnowWorld'
     winWidth = 300
-    winHeight = 260
+    winHeight = 280
     
     if pm.window(winName, exists = True):
         pm.deleteUI(winName)
@@ -379,6 +517,12 @@ def ui():
                                 parent = rowLayoutCkBox2
                                 )      
     
+    ### checkbox for setting the particle attributes in batches
+    ckboxBatch = pm.checkBox(label = 'Batch particle attributes',
+                             value = False,
+                             parent = colLayoutMain
+                             )
+    
     ### slider for average size of snowpiece
     sliderSize = pm.floatSliderGrp(label = 'Avg Size',
                                    field = True,
@@ -478,6 +622,7 @@ def ui():
                                        ckboxTexture = ckboxTexture,
                                        ckboxSequence = ckboxSequence,
                                        ckboxCover = ckboxCover,
+                                       ckboxBatch = ckboxBatch,
                                        directionX = directionX,
                                        directionY = directionY,
                                        directionZ = directionZ,
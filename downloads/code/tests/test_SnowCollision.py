@@ -0,0 +1,51 @@
+"""
+test_SnowCollision.py
+
+Regression tests of the triangle hierarchy of SnowCollision against brute force.
+
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowCollision
+
+class TriangleBVHTest(unittest.TestCase):
+
+    def assertSameHits(self, triangles, starts, ends):
+        index, t = SnowCollision.TriangleBVH(triangles).query(starts, ends)
+        expected, expected_t = SnowCollision.segmentTriangleHits(starts, ends, triangles)
+        self.assertTrue(np.array_equal(index, expected))
+        self.assertTrue(np.allclose(t[index >= 0], expected_t[expected >= 0]))
+        return index
+
+    def test_random_segments_hit_like_brute_force(self):
+        rs = np.random.RandomState(1)
+        triangles = rs.uniform(-5, 5, (400, 3, 3))
+        starts = rs.uniform(-6, 6, (3000, 3))
+        ends = starts + rs.uniform(-3, 3, (3000, 3))
+        ### falling snow moves along the y axis only, its slab test divides by zero
+        ends[:1000, 0] = starts[:1000, 0]
+        ends[:1000, 2] = starts[:1000, 2]
+        index = self.assertSameHits(triangles, starts, ends)
+        self.assertTrue((index[:1000] >= 0).any())
+
+    def test_scene_of_several_objects(self):
+        rs = np.random.RandomState(2)
+        plane = np.array([[(-10, 0, -10), (10, 0, -10), (10, 0, 10)], [(-10, 0, -10), (10, 0, 10), (-10, 0, 10)]], dtype = float)
+        scene = SnowCollision.CollisionScene({'ground': plane, 'rocks': rs.uniform(-5, 5, (50, 3, 3))})
+        starts = np.column_stack([rs.uniform(-9, 9, 500), np.full(500, 6.0), rs.uniform(-9, 9, 500)])
+        ends = starts - (0, 7.0, 0)
+        index, t = scene.query(starts, ends)
+        expected, expected_t = SnowCollision.segmentTriangleHits(starts, ends, np.concatenate(list(scene.objects.values())))
+        self.assertTrue(np.array_equal(index, expected))
+        self.assertTrue(np.allclose(t[index >= 0], expected_t[expected >= 0]))
+        ### every move crosses the ground, so every one hits something
+        self.assertTrue((index >= 0).all())
+
+if __name__ == '__main__':
+    unittest.main()
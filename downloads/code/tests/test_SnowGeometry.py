@@ -0,0 +1,57 @@
+"""
+test_SnowGeometry.py
+
+Regression tests of the level buffers of FlakeBuilder.
+
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowGeometry
+
+### a thin box, its point 6 is the destination point
+SEED = SnowGeometry.make_mesh([(0.0, 0.0, -0.1), (1.0, 0.0, -0.1), (1.0, 0.2, -0.1), (0.0, 0.2, -0.1),
+                               (0.0, 0.0, 0.1), (1.0, 0.0, 0.1), (1.0, 0.2, 0.1), (0.0, 0.2, 0.1)],
+                              [4] * 6,
+                              [0, 3, 2, 1, 4, 5, 6, 7, 0, 1, 5, 4, 1, 2, 6, 5, 2, 3, 7, 6, 3, 0, 4, 7])
+PARAMETERS = (SEED, 6, 0.8, 15.0)
+LEVELS = (3, 8, 2, 12, 5, 12, 1, 20)
+
+class FlakeBuilderTest(unittest.TestCase):
+
+    def assertSameMesh(self, mesh, expected):
+        ### the points of grown levels follow the level before, so they may differ in the last bits
+        self.assertTrue(np.allclose(mesh.points, expected.points, rtol = 0, atol = 1e-9))
+        self.assertTrue(np.array_equal(mesh.counts, expected.counts))
+        self.assertTrue(np.array_equal(mesh.connects, expected.connects))
+
+    def test_grow_and_trim_match_a_new_build(self):
+        for origin in (None, (1.0, 2.0, 3.0)):
+            builder = SnowGeometry.FlakeBuilder(*PARAMETERS, origin = origin)
+            for level in LEVELS:
+                builder.set_level(level)
+                self.assertSameMesh(builder.mesh(), SnowGeometry.build_flake_levels(*PARAMETERS, level = level, origin = origin))
+
+    def test_welded_levels_match_a_full_weld(self):
+        for origin in (None, (1.0, 2.0, 3.0)):
+            builder = SnowGeometry.FlakeBuilder(*PARAMETERS, origin = origin)
+            for level in LEVELS:
+                builder.set_level(level)
+                mesh, report = builder.welded_mesh()
+                expected, expected_report = SnowGeometry.weld_mesh(SnowGeometry.build_flake_levels(*PARAMETERS, level = level, origin = origin))
+                self.assertSameMesh(mesh, expected)
+                self.assertEqual(report, expected_report)
+
+    def test_adopted_levels_grow_like_built_ones(self):
+        builder = SnowGeometry.FlakeBuilder(*PARAMETERS)
+        builder.adopt(SnowGeometry.build_flake_levels(*PARAMETERS, level = 7), 7)
+        builder.set_level(11)
+        self.assertSameMesh(builder.mesh(), SnowGeometry.build_flake_levels(*PARAMETERS, level = 11))
+
+if __name__ == '__main__':
+    unittest.main()
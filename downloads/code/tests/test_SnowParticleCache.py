@@ -0,0 +1,64 @@
+"""
+test_SnowParticleCache.py
+
+Regression tests of baking SnowSim frames to a cache and reading them back.
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowParticleCache
+import SnowSim
+
+def simulator():
+    return SnowSim.fromSnowWorld(SnowSim.planeTriangles(20, 20, 10), 50.0, 1.0, 0, -1, 0,
+                                 coverTriangles = SnowSim.planeTriangles(40, 40, 0), snowHeight = 12)
+
+class CacheRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_baked_frames_read_back(self):
+        ### the same simulation run again gives the frames the cache should hold
+        frames = 25
+        SnowParticleCache.bakeSimulation(simulator(), self.path, frames, framesPerChunk = 7)
+        sim = simulator()
+        reader = SnowParticleCache.CacheReader(self.path)
+        self.assertEqual(len(reader), frames)
+        for frame in range(frames):
+            sim.step()
+            particles = sim.particles()
+            arrays = reader.frame(frame)
+            for name in SnowParticleCache.BAKE_ATTRIBUTES:
+                self.assertTrue(np.array_equal(arrays[name], particles[name]), (frame, name))
+
+    def test_a_bake_still_running_can_be_read(self):
+        writer = SnowParticleCache.CacheWriter(self.path, [('position', (3,), np.float32), ('particleId', (), np.int64)], 2)
+        for frame, count in enumerate((4, 0, 3)):
+            writer.writeFrame({'position': np.full((count, 3), frame), 'particleId': np.arange(count)})
+            reader = SnowParticleCache.CacheReader(self.path)
+            self.assertEqual(len(reader), frame + 1)
+            self.assertTrue(np.array_equal(reader.frame(frame)['position'], np.full((count, 3), frame, dtype = np.float32)))
+            self.assertTrue(np.array_equal(reader.frame(frame)['particleId'], np.arange(count)))
+        writer.close()
+
+    def test_wrong_shape_is_refused(self):
+        writer = SnowParticleCache.CacheWriter(self.path, [('position', (3,), np.float32)])
+        try:
+            self.assertRaises(ValueError, writer.writeFrame, {'position': np.zeros((4, 2))})
+        finally:
+            writer.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+test_SnowRandom.py
+
+Regression tests of SnowRandom: the same seed, id and attribute always give
+the same number, whatever order or batch the ids come in.
+
+"""
+
+import os
+import sys
+import unittest
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowRandom
+
+class SnowRandomTest(unittest.TestCase):
+
+    def test_same_values_in_any_order(self):
+        ids = np.arange(1000)
+        values = SnowRandom.uniform(7, ids, 'size', 0.7, 1.3)
+        order = np.random.RandomState(0).permutation(len(ids))
+        self.assertTrue(np.array_equal(SnowRandom.uniform(7, ids[order], 'size', 0.7, 1.3), values[order]))
+        self.assertTrue(np.array_equal(SnowRandom.uniform(7, ids[500:], 'size', 0.7, 1.3), values[500:]))
+
+    def test_known_values(self):
+        ### the values must never change, a change rerolls every cached scene
+        self.assertEqual(int(SnowRandom.randomBits(0, [0], 'size')[0]), int(SnowRandom.randomBits(0, [0], 1)[0]))
+        self.assertAlmostEqual(float(SnowRandom.uniform(0, 5, 'size')), 0.9215445503481156)
+
+    def test_single_id_does_not_warn(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            value = SnowRandom.uniform(3, 123456789, 'spriteTwist', 0, 30)
+        self.assertEqual(float(value), float(SnowRandom.uniform(3, [123456789], 'spriteTwist', 0, 30)[0]))
+
+    def test_streams_and_seeds_differ(self):
+        ids = np.arange(256)
+        size = SnowRandom.uniform(1, ids, 'size')
+        self.assertFalse(np.array_equal(size, SnowRandom.uniform(1, ids, 'spriteTwist')))
+        self.assertFalse(np.array_equal(size, SnowRandom.uniform(2, ids, 'size')))
+        self.assertTrue(((size >= 0) & (size < 1)).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+test_SnowScene.py
+
+Regression tests of the manifest checks of SnowScene.
+
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowScene
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, 'sky.obj'), 'w') as f:
+            f.write('v 0 10 0\nv 1 10 0\nv 0 10 1\nf 1 2 3\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writeManifest(self, manifest):
+        path = os.path.join(self.folder, 'manifest.json')
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+        return path
+
+    def problems(self, manifest):
+        ### the problem lines of the error readManifest raises
+        try:
+            SnowScene.readManifest(self.writeManifest(manifest))
+        except ValueError as e:
+            return str(e).splitlines()[1:]
+        self.fail('the manifest was accepted')
+
+    def test_a_good_manifest_is_read(self):
+        setups = SnowScene.readManifest(self.writeManifest({'defaults': {'frames': 48},
+                                                            'setups': [{'name': 'yard', 'start': 'sky.obj', 'density': 20}]}))
+        self.assertEqual(len(setups), 1)
+        self.assertEqual(setups[0].frames, 48)
+        self.assertEqual(setups[0].start, os.path.join(self.folder, 'sky.obj'))
+
+    def test_all_problems_of_all_setups_are_listed(self):
+        problems = self.problems({'setups': [{'name': 'a', 'start': 'sky.obj', 'size': 0, 'colour': 'red'},
+                                             {'name': 'a', 'start': 'sky.obj', 'direction': [0, 0, 0]},
+                                             {'start': 'missing.obj', 'cover': 'house.obj', 'sequence': 2},
+                                             'not a setup']})
+        expected = ['setup 0: unknown keys colour',
+                    'setup 0 (a): size must be a number above 0, not 0',
+                    'setup 1: the name a is used twice',
+                    'setup 1 (a): direction must not be 0 0 0',
+                    'setup 2 (snow_0002): cover must be a list of objects, not',
+                    'setup 2 (snow_0002): a texture sequence needs a texture',
+                    'setup 2 (snow_0002): start file not found',
+                    'setup 3: must be a mapping of values, not']
+        self.assertEqual(len(problems), len(expected))
+        for problem, start in zip(problems, expected):
+            self.assertTrue(problem.strip().startswith(start), (problem, start))
+
+    def test_unknown_keys_of_a_setup_are_refused(self):
+        self.assertRaises(ValueError, SnowScene.SnowParams.fromDict, {'start': 'sky.obj', 'speed': 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+test_SnowSim.py
+
+Regression tests of the particle pool of SnowSim.
+
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowSim
+
+class ParticlePoolTest(unittest.TestCase):
+
+    def test_pool_stays_bounded_with_a_cover(self):
+        ### snow resting on the cover never reaches the kill plane, it has to die of age
+        start = SnowSim.planeTriangles(20, 20, 10)
+        cover = SnowSim.planeTriangles(40, 40, 0)
+        sim = SnowSim.fromSnowWorld(start, 1.0, 1.0, 0, -1, 0, coverTriangles = cover, snowHeight = 12)
+        falling = 400 * SnowSim.fallTime(13.0, -1.0, 1.0)
+        counts = [sim.step()['count'] for frame in range(400)]
+        self.assertEqual(sim.dropped, 0)
+        self.assertLess(max(counts), falling * 1.1)
+        self.assertGreater(counts[-1], falling * 0.9)
+
+    def test_pool_stays_bounded_without_a_cover(self):
+        sim = SnowSim.fromSnowWorld(SnowSim.planeTriangles(20, 20, 10), 1.0, 1.0, 0, -1, 0, snowHeight = 12)
+        counts = [sim.step()['count'] for frame in range(400)]
+        self.assertEqual(sim.dropped, 0)
+        self.assertLess(max(counts[200:]) - min(counts[200:]), 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+test_SnowTiles.py
+
+Regression tests of the tiled SnowSim simulation across worker counts.
+
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SnowSim
+import SnowTiles
+
+def simulate(workers):
+    return SnowTiles.simulateTiles(SnowSim.planeTriangles(40, 40, 10), 30, tilesX = 3, tilesZ = 2, workers = workers,
+                                   seed = 7, rate = 5.0, coverTriangles = SnowSim.planeTriangles(60, 60, 0))
+
+class TileDeterminismTest(unittest.TestCase):
+
+    def test_any_number_of_workers_gives_the_same_particles(self):
+        single = simulate(1)
+        self.assertGreater(len(single['particleId']), 0)
+        self.assertEqual(len(np.unique(single['particleId'])), len(single['particleId']))
+        for workers in (2, 3):
+            merged = simulate(workers)
+            self.assertEqual(sorted(merged.keys()), sorted(single.keys()))
+            for name in single:
+                self.assertTrue(np.array_equal(merged[name], single[name]), (workers, name))
+
+if __name__ == '__main__':
+    unittest.main()